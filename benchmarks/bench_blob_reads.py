@@ -0,0 +1,112 @@
+"""Measure peak memory (RSS) and time when loading stored dataframes.
+
+Compares reading each blob into a Python `bytes` object (the old read path) with
+incremental blob I/O, for full reads and for reading a single column.
+
+Run with `python benchmarks/bench_blob_reads.py [--size-mb 1024] [--frames 8]`.
+Linux or macOS only, as it uses `resource` for peak RSS."""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.config import storage_options
+from sentier_data_tools.local_storage.db import MMAP_SIZE, STORE_MODELS, Dataset
+from sentier_data_tools.local_storage.serialization import deserialize
+
+MODES = ("bytes", "blob", "blob-one-column")
+COLUMNS = 16
+
+
+def database(path: Path) -> SqliteExtDatabase:
+    return SqliteExtDatabase(
+        path, pragmas={"mmap_size": MMAP_SIZE}, check_same_thread=False
+    )
+
+
+def create(path: Path, size_mb: int, frames: int) -> None:
+    rows = size_mb * 1024**2 // frames // (COLUMNS * 8)
+    rng = np.random.default_rng(42)
+    db = database(path)
+    with db.bind_ctx(STORE_MODELS), storage_options(compression="none"):
+        db.create_tables(STORE_MODELS)
+        for index in range(frames):
+            df = pd.DataFrame(
+                rng.random((rows, COLUMNS)), columns=[str(i) for i in range(COLUMNS)]
+            )
+            Dataset(
+                name=f"frame {index}",
+                dataframe=df,
+                columns=[{} for _ in range(COLUMNS)],
+                metadata={},
+                version=1,
+                valid_from=date(2020, 1, 1),
+                valid_to=date(2030, 1, 1),
+            ).save()
+    db.close()
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return usage / 1024**2 if sys.platform == "darwin" else usage / 1024
+
+
+def worker(path: Path, mode: str) -> None:
+    db = database(path)
+    with db.bind_ctx(STORE_MODELS):
+        datasets = list(Dataset.select())
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == "bytes":
+            frames = []
+            for dataset in datasets:
+                cursor = db.execute_sql(
+                    "SELECT dataframe FROM dataset WHERE id = ?", (dataset.id,)
+                )
+                frames.append(deserialize(pa.BufferReader(cursor.fetchone()[0])))
+        elif mode == "blob":
+            frames = [dataset.dataframe for dataset in datasets]
+        else:
+            frames = [dataset.read(columns=["0"]) for dataset in datasets]
+        elapsed = time.perf_counter() - start
+        loaded = sum(df.memory_usage().sum() for df in frames) / 1024**2
+    print(
+        f"{mode:<16} {loaded:>10.0f} {peak_rss_mb() - baseline:>14.0f} {elapsed:>8.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(Path(args.worker[0]), args.worker[1])
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "datasets.db"
+        create(path, args.size_mb, args.frames)
+        print(f"{'mode':<16} {'loaded MB':>10} {'peak RSS +MB':>14} {'seconds':>8}")
+        for mode in MODES:
+            # Separate processes, so each mode starts from the same peak RSS
+            subprocess.run(
+                [sys.executable, __file__, "--worker", str(path), mode], check=True
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compare stored dataframe size and read/write time for each compression codec.
+
+Run with `python benchmarks/bench_compression.py`."""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from sentier_data_tools.local_storage.config import Compression, storage_options
+from sentier_data_tools.local_storage.serialization import deserialize, serialize
+
+REPEATS = 5
+
+
+def long_parameter_table(rows: int = 200_000) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    companies = [f"Company {i}" for i in range(50)]
+    products = [f"Electrolyzer model {i}" for i in range(400)]
+    terms = "https://vocab.sentier.dev/model-terms/"
+    return pd.DataFrame(
+        {
+            f"{terms}generic/company": rng.choice(companies, rows),
+            f"{terms}generic/product": rng.choice(products, rows),
+            f"{terms}generic/year": rng.integers(2000, 2050, rows),
+            f"{terms}energy/nom_power_cons": rng.choice(
+                [100.0, 250.0, 1000.0, 2500.0], rows
+            ),
+            f"{terms}energy/energy_conv_eff_lhv": rng.normal(0.65, 0.05, rows).round(3),
+        }
+    )
+
+
+def wide_numeric_table(rows: int = 20_000, columns: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    return pd.DataFrame(
+        {
+            f"https://vocab.sentier.dev/model-terms/example/term_{i}": rng.normal(
+                10, 2, rows
+            ).round(2)
+            for i in range(columns)
+        }
+    )
+
+
+def timed(func) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    frames = {
+        "long parameters": long_parameter_table(),
+        "wide numeric": wide_numeric_table(),
+    }
+    print(
+        f"{'frame':<16} {'codec':<6} {'MB':>8} {'ratio':>6} "
+        f"{'write ms':>9} {'read ms':>8}"
+    )
+    for label, df in frames.items():
+        baseline = None
+        for compression in Compression:
+            with storage_options(compression=compression):
+                write_time, payload = timed(lambda: serialize(df))
+            read_time, _ = timed(lambda: deserialize(pa.BufferReader(payload)))
+            baseline = baseline or len(payload)
+            print(
+                f"{label:<16} {compression.value:<6} {len(payload) / 1e6:>8.2f} "
+                f"{baseline / len(payload):>6.1f} {write_time * 1e3:>9.1f} "
+                f"{read_time * 1e3:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
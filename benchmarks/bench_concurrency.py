@@ -0,0 +1,125 @@
+"""Reader and writer throughput on one local store, for each pragma profile.
+
+One writer process saves datasets while several reader processes query datasets and
+load their dataframes. Run with
+`python benchmarks/bench_concurrency.py [--readers 4] [--seconds 5]`."""
+
+import argparse
+import multiprocessing
+import sqlite3
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from peewee import OperationalError
+from playhouse.pool import PooledSqliteExtDatabase
+
+from sentier_data_tools.local_storage.db import (
+    STORE_MODELS,
+    Dataset,
+    configure_local_database,
+)
+
+PRODUCT = "https://vocab.sentier.dev/products/pem-electrolyzer"
+
+
+def database(path: Path, profile: str) -> PooledSqliteExtDatabase:
+    db = PooledSqliteExtDatabase(path, check_same_thread=False)
+    configure_local_database(profile, db=db)
+    return db
+
+
+def make_dataset(index: int) -> Dataset:
+    rng = np.random.default_rng(index)
+    return Dataset(
+        name=f"dataset {index}",
+        dataframe=pd.DataFrame(rng.random((10_000, 8)), columns=list("abcdefgh")),
+        product=PRODUCT,
+        columns=[{} for _ in range(8)],
+        metadata={},
+        version=1,
+        valid_from=date(2020, 1, 1),
+        valid_to=date(2030, 1, 1),
+    )
+
+
+def writer(path: Path, profile: str, seconds: float, results) -> None:
+    db = database(path, profile)
+    count, errors, deadline = 0, 0, time.perf_counter() + seconds
+    with db.bind_ctx(STORE_MODELS):
+        while time.perf_counter() < deadline:
+            try:
+                make_dataset(count).save()
+                count += 1
+            except (OperationalError, sqlite3.OperationalError):
+                errors += 1
+    results.put(("writer", count, errors))
+
+
+def reader(path: Path, profile: str, seconds: float, results) -> None:
+    db = database(path, profile)
+    count, errors, deadline = 0, 0, time.perf_counter() + seconds
+    with db.bind_ctx(STORE_MODELS):
+        while time.perf_counter() < deadline:
+            try:
+                for dataset in (
+                    Dataset.select().where(Dataset.product == PRODUCT).limit(5)
+                ):
+                    dataset.dataframe
+                count += 1
+            except (OperationalError, sqlite3.OperationalError):
+                errors += 1
+    results.put(("reader", count, errors))
+
+
+def run(profile: str, readers: int, seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "datasets.db"
+        db = database(path, profile)
+        with db.bind_ctx(STORE_MODELS):
+            db.create_tables(STORE_MODELS)
+            for index in range(20):
+                make_dataset(index).save()
+        db.close_all()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=writer, args=(path, profile, seconds, results)
+            )
+        ] + [
+            multiprocessing.Process(
+                target=reader, args=(path, profile, seconds, results)
+            )
+            for _ in range(readers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    writes = sum(count for role, count, _ in outcomes if role == "writer")
+    reads = sum(count for role, count, _ in outcomes if role == "reader")
+    errors = sum(errors for _, _, errors in outcomes)
+    print(
+        f"{profile:<12} {writes / seconds:>10.1f} {reads / seconds:>10.1f} {errors:>8}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'writes/s':>10} {'queries/s':>10} {'errors':>8}")
+    for profile in ("default", "concurrent"):
+        run(profile, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
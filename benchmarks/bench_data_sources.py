@@ -0,0 +1,97 @@
+"""Compare the storage backends of `RunConfig.data_source`: time to save datasets,
+to query them by product and kind, and to load their dataframes.
+
+The in-memory source has no storage cost, so the difference to it is the cost of
+the storage itself. Run with
+`python benchmarks/bench_data_sources.py [--datasets 200] [--rows 10000]`."""
+
+import argparse
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.data_source_base import DatasetRecord, DataSourceBase
+from sentier_data_tools.local_storage.cache import dataframe_cache
+from sentier_data_tools.local_storage.datasource import (
+    DefaultDataSource,
+    MemoryDataSource,
+    ParquetDataSource,
+)
+from sentier_data_tools.local_storage.db import MMAP_SIZE, STORE_MODELS
+from sentier_data_tools.local_storage.fields import DatasetKind
+
+PRODUCTS = [f"https://vocab.sentier.dev/products/product-{i}" for i in range(10)]
+COLUMNS = 8
+
+
+def make_records(count: int, rows: int) -> list[DatasetRecord]:
+    rng = np.random.default_rng(42)
+    return [
+        DatasetRecord(
+            name=f"dataset {index}",
+            kind=DatasetKind.BOM if index % 2 else DatasetKind.PARAMETERS,
+            product=PRODUCTS[index % len(PRODUCTS)],
+            dataframe=pd.DataFrame(
+                rng.random((rows, COLUMNS)), columns=[str(i) for i in range(COLUMNS)]
+            ),
+            columns=[{} for _ in range(COLUMNS)],
+            valid_from=date(2020, 1, 1),
+            valid_to=date(2030, 1, 1),
+        )
+        for index in range(count)
+    ]
+
+
+def measure(name: str, source: DataSourceBase, records: list[DatasetRecord]) -> None:
+    start = time.perf_counter()
+    source.bulk_save(records)
+    saved = time.perf_counter()
+    found = [
+        record
+        for product in PRODUCTS
+        for record in source.query(product=product, kind=DatasetKind.BOM)
+    ]
+    queried = time.perf_counter()
+    for record in found:
+        record.dataframe
+    loaded = time.perf_counter()
+    print(
+        f"{name:<10} {saved - start:>8.2f} {(queried - saved) * 1000:>10.1f}"
+        f" {loaded - queried:>8.2f} {len(found):>8}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'source':<10} {'save s':>8} {'query ms':>10} {'load s':>8} {'loaded':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteExtDatabase(
+            Path(tmp) / "datasets.db",
+            pragmas={"mmap_size": MMAP_SIZE},
+            check_same_thread=False,
+        )
+        with db.bind_ctx(STORE_MODELS):
+            db.create_tables(STORE_MODELS)
+        # Measure loading from storage, not from the dataframe cache
+        dataframe_cache.clear()
+        sources = {
+            "memory": MemoryDataSource(),
+            "sqlite": DefaultDataSource(db),
+            "parquet": ParquetDataSource(Path(tmp) / "parquet"),
+        }
+        for name, source in sources.items():
+            measure(name, source, make_records(args.datasets, args.rows))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
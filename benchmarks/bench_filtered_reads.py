@@ -0,0 +1,94 @@
+"""Time selective reads of a wide, long stored dataframe: loading the whole frame
+and filtering in pandas, against `Dataset.read(filter=...)` with an Arrow
+expression and with dict predicates, which can skip record batches by their
+stored value ranges.
+
+The frame is sorted by year, as time series usually are, so a filter on the year
+rules out most batches. Run with
+`python benchmarks/bench_filtered_reads.py [--rows 2000000] [--columns 32]`."""
+
+import argparse
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.config import storage_options
+from sentier_data_tools.local_storage.db import MMAP_SIZE, STORE_MODELS, Dataset
+
+COMPANIES = ["Nel", "ITM", "Siemens", "Plug", "Sunfire"]
+
+
+def make_dataframe(rows: int, columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(
+        rng.random((rows, columns)), columns=[f"value {i}" for i in range(columns)]
+    )
+    df["year"] = np.sort(rng.integers(2000, 2030, rows))
+    df["company"] = rng.choice(COMPANIES, rows)
+    return df
+
+
+def timed(function) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, len(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--columns", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteExtDatabase(
+            Path(tmp) / "datasets.db",
+            pragmas={"mmap_size": MMAP_SIZE},
+            check_same_thread=False,
+        )
+        with db.bind_ctx(STORE_MODELS), storage_options(compression="none"):
+            db.create_tables(STORE_MODELS)
+            df = make_dataframe(args.rows, args.columns)
+            Dataset(
+                name="electrolyzers",
+                dataframe=df,
+                columns=[{} for _ in df.columns],
+                metadata={},
+                version=1,
+                valid_from=date(2020, 1, 1),
+                valid_to=date(2030, 1, 1),
+            ).save()
+            dataset = Dataset.select().get()
+
+            def pandas():
+                frame = dataset.read()
+                return frame[(frame["year"] == 2025) & (frame["company"] == "Nel")]
+
+            cases = {
+                "pandas": pandas,
+                "expression": lambda: dataset.read(
+                    filter=(pc.field("year") == 2025) & (pc.field("company") == "Nel")
+                ),
+                "predicates": lambda: dataset.read(
+                    filter={"year": 2025, "company": "Nel"}
+                ),
+                "predicates, 2 columns": lambda: dataset.read(
+                    columns=["value 0", "value 1"],
+                    filter={"year": 2025, "company": "Nel"},
+                ),
+            }
+            print(f"{'read':<24} {'seconds':>8} {'rows':>8}")
+            for name, function in cases.items():
+                seconds, rows = timed(function)
+                print(f"{name:<24} {seconds:>8.3f} {rows:>8}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measure peak memory (RSS) and time when saving a large dataframe.
+
+Compares serializing the whole payload in memory, spooling it to a temporary file,
+and saving a stream of record batches which is never held in memory as a whole.
+
+Run with `python benchmarks/bench_streaming_writes.py [--size-mb 1024]`.
+Linux or macOS only, as it uses `resource` for peak RSS."""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.config import storage_options
+from sentier_data_tools.local_storage.db import MMAP_SIZE, STORE_MODELS, Dataset
+
+MODES = ("memory", "spool", "stream")
+COLUMNS = 16
+BATCH_ROWS = 64 * 1024
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return usage / 1024**2 if sys.platform == "darwin" else usage / 1024
+
+
+def batches(rows: int):
+    rng = np.random.default_rng(42)
+    for start in range(0, rows, BATCH_ROWS):
+        yield pa.record_batch(
+            {str(i): rng.random(min(BATCH_ROWS, rows - start)) for i in range(COLUMNS)}
+        )
+
+
+def worker(path: Path, mode: str, size_mb: int) -> None:
+    rows = size_mb * 1024**2 // (COLUMNS * 8)
+    db = SqliteExtDatabase(path, pragmas={"mmap_size": MMAP_SIZE})
+    with db.bind_ctx(STORE_MODELS):
+        db.create_tables(STORE_MODELS)
+        if mode == "stream":
+            dataframe = batches(rows)
+        else:
+            dataframe = pa.Table.from_batches(list(batches(rows))).to_pandas()
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        spool_min_bytes = 2**62 if mode == "memory" else 0
+        with storage_options(compression="none", spool_min_bytes=spool_min_bytes):
+            Dataset(
+                name=mode,
+                dataframe=dataframe,
+                columns=[{} for _ in range(COLUMNS)],
+                metadata={},
+                version=1,
+                valid_from=date(2020, 1, 1),
+                valid_to=date(2030, 1, 1),
+            ).save()
+        elapsed = time.perf_counter() - start
+    print(f"{mode:<8} {peak_rss_mb() - baseline:>14.0f} {elapsed:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(Path(args.worker[0]), args.worker[1], args.size_mb)
+        return
+
+    print(f"{'mode':<8} {'peak RSS +MB':>14} {'seconds':>8}")
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Separate processes, so each mode starts from the same peak RSS
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--size-mb",
+                    str(args.size_mb),
+                    "--worker",
+                    str(Path(tmp) / "datasets.db"),
+                    mode,
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@
 
 __all__ = (
     "__version__",
+    "collect_garbage",
+    "Compression",
     "Dataset",
+    "dataframe_cache",
+    "datasets_with_column",
+    "datasets_with_columns",
+    "datasets_with_values",
     "DatasetKind",
     "Datapackage",
     "DefaultDataSource",
@@ -10,13 +16,23 @@ __all__ = (
     "Flow",
     "FlowIRI",
     "GeonamesIRI",
+    "MemoryDataSource",
     "ModelTermIRI",
+    "ParquetDataSource",
     "ProductIRI",
+    "ReadMode",
+    "RemoteDataSource",
     "reset_local_database",
+    "ShardedStore",
     "RunConfig",
     "SentierModel",
+    "storage_config",
+    "storage_executor",
+    "storage_options",
+    "StorageMode",
     "UnitIRI",
     "get_conversion_factor",
+    "unit_aware_operation",
 )
 
 __version__ = "0.5.2"
@@ -31,10 +47,28 @@ from sentier_data_tools.iri import (
     UnitIRI,
 )
 from sentier_data_tools.local_storage import (
+    Compression,
     Dataset,
     DatasetKind,
     DefaultDataSource,
+    MemoryDataSource,
+    ParquetDataSource,
+    ReadMode,
+    RemoteDataSource,
+    ShardedStore,
+    StorageMode,
+    collect_garbage,
+    dataframe_cache,
+    datasets_with_column,
+    datasets_with_columns,
+    datasets_with_values,
     reset_local_database,
+    storage_config,
+    storage_executor,
+    storage_options,
 )
 from sentier_data_tools.model import Demand, Flow, RunConfig, SentierModel
-from sentier_data_tools.unit_conversion import get_conversion_factor
+from sentier_data_tools.unit_conversion import (
+    get_conversion_factor,
+    unit_aware_operation,
+)
@@ -1,4 +1,173 @@
 from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, Iterable, Optional, Union
 
+import pandas as pd
+import pyarrow as pa
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
-class DataSourceBase(ABC): ...
+from sentier_data_tools.local_storage.db import global_location_default
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import apply_aliases
+
+Products = Union[str, Iterable[str], None]
+
+
+class DatasetRecord(BaseModel):
+    """A dataset as stored in a `DataSourceBase`: its attributes, and its dataframe,
+    which is loaded from the data source when first accessed.
+
+    ```python
+    record = DatasetRecord(name="...", valid_from=..., valid_to=..., dataframe=df)
+    ```
+
+    """
+
+    name: str
+    kind: DatasetKind = DatasetKind.PARAMETERS
+    product: Optional[str] = None
+    location: str = Field(default_factory=global_location_default)
+    valid_from: date
+    valid_to: date
+    columns: list[dict] = []
+    metadata: dict = {}
+    version: int = 1
+    # Identifies the dataset in its data source; set when saved
+    key: Optional[Any] = None
+
+    _dataframe: Union[pd.DataFrame, pa.Table, None] = PrivateAttr(default=None)
+    _source: Optional["DataSourceBase"] = PrivateAttr(default=None)
+    _aliases: dict = PrivateAttr(default_factory=dict)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def __init__(
+        self, dataframe: Union[pd.DataFrame, pa.Table, None] = None, **data: Any
+    ):
+        super().__init__(**data)
+        self._dataframe = dataframe
+
+    @classmethod
+    def stored(cls, source: "DataSourceBase", **data: Any) -> "DatasetRecord":
+        """A record of a dataset in `source`, whose dataframe isn't loaded yet."""
+        record = cls(**data)
+        record._source = source
+        return record
+
+    @property
+    def dataframe(self) -> Union[pd.DataFrame, pa.Table, None]:
+        if self._dataframe is None and self._source is not None:
+            dataframe = self._source.load(self)
+            if self._aliases:
+                dataframe = apply_aliases(dataframe, self._aliases)
+            self._dataframe = dataframe
+        return self._dataframe
+
+    @dataframe.setter
+    def dataframe(self, value: Union[pd.DataFrame, pa.Table, None]) -> None:
+        self._dataframe = value
+
+    @property
+    def loaded(self) -> bool:
+        return self._dataframe is not None
+
+    def apply_aliases(self, aliases: dict) -> None:
+        """Rename columns with `aliases`, now or when the dataframe is loaded."""
+        self._aliases = aliases
+        if self._dataframe is not None:
+            self._dataframe = apply_aliases(self._dataframe, aliases)
+
+    def read(
+        self, columns: Optional[list[str]] = None
+    ) -> Union[pd.DataFrame, pa.Table]:
+        """Load only some `columns`, which can be given as IRIs or aliases. Data
+        sources which store columns separately don't read the other columns."""
+        if self._source is None or self._dataframe is not None:
+            return select_columns(self.dataframe, columns)
+        aliases = {str(key): value for key, value in self._aliases.items()}
+        if columns is not None:
+            reverse = {value: key for key, value in aliases.items()}
+            columns = [reverse.get(column, str(column)) for column in columns]
+        dataframe = self._source.read(self, columns)
+        if aliases:
+            dataframe = apply_aliases(dataframe, aliases)
+        return dataframe
+
+
+def select_columns(
+    dataframe: Union[pd.DataFrame, pa.Table], columns: Optional[list[str]]
+) -> Union[pd.DataFrame, pa.Table]:
+    if columns is None:
+        return dataframe
+    if isinstance(dataframe, pa.Table):
+        return dataframe.select([str(column) for column in columns])
+    return dataframe[columns]
+
+
+def as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _as_set(values: Union[str, Iterable[str]]) -> set[str]:
+    return {str(values)} if isinstance(values, str) else {str(obj) for obj in values}
+
+
+def record_matches(
+    record: DatasetRecord,
+    product: Products = None,
+    kind: Optional[DatasetKind] = None,
+    location: Products = None,
+    begin: Union[date, datetime, None] = None,
+    end: Union[date, datetime, None] = None,
+) -> bool:
+    """Check `record` against the filters of `DataSourceBase.query`."""
+    return (
+        (product is None or record.product in _as_set(product))
+        and (kind is None or record.kind == kind)
+        and (location is None or record.location in _as_set(location))
+        and (begin is None or record.valid_to >= as_date(begin))
+        and (end is None or record.valid_from <= as_date(end))
+    )
+
+
+class DataSourceBase(ABC):
+    """Storage backend which models get their data from; set with
+    `RunConfig.data_source`.
+
+    Implementations: `DefaultDataSource` (the local SQLite store),
+    `ParquetDataSource` (a directory of Parquet files), `RemoteDataSource` (Parquet
+    or Arrow files over HTTP) and `MemoryDataSource`."""
+
+    @abstractmethod
+    def query(
+        self,
+        product: Products = None,
+        kind: Optional[DatasetKind] = None,
+        location: Products = None,
+        begin: Union[date, datetime, None] = None,
+        end: Union[date, datetime, None] = None,
+    ) -> list[DatasetRecord]:
+        """Find datasets without loading their dataframes.
+
+        `product` and `location` are an IRI or a list of IRIs, of which the dataset
+        must have one. With `begin` and/or `end`, the validity period of the dataset
+        must overlap `[begin, end]`. Filters which are `None` match everything."""
+
+    @abstractmethod
+    def load(self, record: DatasetRecord) -> Union[pd.DataFrame, pa.Table]:
+        """Load the dataframe of a record returned by `query`. Called when
+        `record.dataframe` is first accessed."""
+
+    def read(
+        self, record: DatasetRecord, columns: Optional[list[str]] = None
+    ) -> Union[pd.DataFrame, pa.Table]:
+        """Load some `columns` of a record's dataframe; loads the whole dataframe
+        unless overridden."""
+        return select_columns(self.load(record), columns)
+
+    @abstractmethod
+    def bulk_save(self, records: Iterable[DatasetRecord]) -> int:
+        """Store new datasets, setting their `key`. Returns the number saved."""
+
+    def save(self, record: DatasetRecord) -> None:
+        self.bulk_save([record])
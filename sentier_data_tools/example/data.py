@@ -34,41 +34,48 @@ def create_example_local_datastorage(reset: bool = True):
     ).metadata()
     metadata.pop("version")
 
+    datasets = []
     for kind, iri in TYPES:
         filtered = df[df["Electrolysis type"] == kind].copy()
         logger.info("Adding {} records for type {}", len(filtered), kind)
         filtered.drop(labels=["Electrolysis type"], axis="columns", inplace=True)
         filtered.columns = COLUMNS
 
-        sdt.Dataset(
-            name=f"electrolyser model data for {kind.lower()}",
-            dataframe=filtered,
-            product=iri,
-            columns=[{"iri": x, "unit": y} for x, y in zip(COLUMNS, UNITS)],
-            metadata=metadata,
-            location="https://sws.geonames.org/6255148/",
-            version=1,
-            valid_from=date(2018, 1, 1),
-            valid_to=date(2028, 1, 1),
-        ).save()
+        datasets.append(
+            sdt.Dataset(
+                name=f"electrolyser model data for {kind.lower()}",
+                dataframe=filtered,
+                product=iri,
+                columns=[{"iri": x, "unit": y} for x, y in zip(COLUMNS, UNITS)],
+                metadata=metadata,
+                location="https://sws.geonames.org/6255148/",
+                version=1,
+                valid_from=date(2018, 1, 1),
+                valid_to=date(2028, 1, 1),
+            )
+        )
 
     for key, value in LIFETIMES.items():
-        sdt.Dataset(
-            name="Estimated electrolyzer BoP (balance of plant) lifetimes",
-            dataframe=pd.DataFrame([{key: value}]),
-            product=key,
-            columns=[
-                {
-                    "iri": "https://vocab.sentier.dev/model-terms/electrolyser/product_lifetime",
-                    "unit": "https://vocab.sentier.dev/units/unit/YR",
-                }
-            ],
-            location="https://sws.geonames.org/6255148/",
-            metadata=metadata,
-            version=1,
-            valid_from=date(2018, 1, 1),
-            valid_to=date(2028, 1, 1),
-        ).save()
+        datasets.append(
+            sdt.Dataset(
+                name="Estimated electrolyzer BoP (balance of plant) lifetimes",
+                dataframe=pd.DataFrame([{key: value}]),
+                product=key,
+                columns=[
+                    {
+                        "iri": "https://vocab.sentier.dev/model-terms/electrolyser/product_lifetime",
+                        "unit": "https://vocab.sentier.dev/units/unit/YR",
+                    }
+                ],
+                location="https://sws.geonames.org/6255148/",
+                metadata=metadata,
+                version=1,
+                valid_from=date(2018, 1, 1),
+                valid_to=date(2028, 1, 1),
+            )
+        )
+
+    sdt.Dataset.bulk_save(datasets)
 
     sdt.Dataset(
         name="Estimated PEM electrolyzer Stack materials",
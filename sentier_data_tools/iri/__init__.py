@@ -1,9 +1,12 @@
 __all__ = (
+    "check_iris",
+    "is_valid_iri",
     "ProductIRI",
     "UnitIRI",
     "ModelTermIRI",
     "FlowIRI",
     "GeonamesIRI",
+    "validate_iris",
     "VocabIRI",
 )
 
@@ -15,3 +18,4 @@ from sentier_data_tools.iri.main import (
     UnitIRI,
     VocabIRI,
 )
+from sentier_data_tools.iri.validation import check_iris, is_valid_iri, validate_iris
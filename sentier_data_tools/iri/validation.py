@@ -0,0 +1,69 @@
+import re
+from functools import lru_cache
+from typing import Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import rfc3987
+
+# One path segment character: unreserved, percent-encoded, sub-delims, ":" or "@"
+_PCHAR = r"(?:[A-Za-z0-9\-._~!$&'()*+,;=:@]|%[0-9A-Fa-f]{2})"
+# Plain ASCII `http(s)` IRIs without user info or IP literals, which covers nearly
+# all IRIs we see. Everything this matches is also a valid RFC 3987 IRI; anything
+# else is checked with the full grammar. Valid for both `re` and RE2 (Arrow).
+HTTP_IRI_PATTERN = (
+    r"^https?://"
+    r"(?:[A-Za-z0-9\-._~!$&'()*+,;=]|%[0-9A-Fa-f]{2})*"
+    r"(?::[0-9]*)?"
+    rf"(?:/{_PCHAR}*)*"
+    rf"(?:\?(?:{_PCHAR}|[/?])*)?"
+    rf"(?:#(?:{_PCHAR}|[/?])*)?$"
+)
+_http_iri = re.compile(HTTP_IRI_PATTERN)
+
+
+@lru_cache(maxsize=64 * 1024)
+def is_valid_iri(value: str) -> bool:
+    """Check if `value` is a valid IRI (reference), as `rfc3987.match` does, but
+    with a fast path for common `http(s)` IRIs and a cache, since the same product
+    and location IRIs are validated over and over."""
+    return bool(_http_iri.fullmatch(value) or rfc3987.match(value))
+
+
+def validate_iris(
+    values: Union[pa.Array, pa.ChunkedArray, pd.Series, list],
+) -> Union[pa.BooleanArray, pa.ChunkedArray]:
+    """Check a whole column of IRIs at once; returns a boolean mask which is null
+    for null values.
+
+    The fast path regular expression runs in Arrow compute; only the distinct values
+    it doesn't match are checked with the full RFC 3987 grammar in Python."""
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = pa.array(values, from_pandas=True)
+    if not (pa.types.is_string(values.type) or pa.types.is_large_string(values.type)):
+        values = values.cast(pa.large_string())
+
+    valid = pc.match_substring_regex(values, HTTP_IRI_PATTERN)
+    others = pc.unique(pc.filter(values, pc.invert(valid))).to_pylist()
+    slow_valid = [value for value in others if is_valid_iri(value)]
+    if slow_valid:
+        valid = pc.or_(
+            valid, pc.is_in(values, value_set=pa.array(slow_valid, type=values.type))
+        )
+    return valid
+
+
+def check_iris(
+    values: Union[pa.Array, pa.ChunkedArray, pd.Series, list], label: str = "Column"
+) -> None:
+    """Raise a `ValueError` listing some of the invalid IRIs in `values`, if any.
+    Null values are allowed."""
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = pa.array(values, from_pandas=True)
+    invalid = pc.filter(values, pc.invert(validate_iris(values)))
+    if len(invalid):
+        examples = pc.unique(invalid).to_pylist()[:5]
+        raise ValueError(
+            f"{label} has {len(invalid)} invalid IRIs, for example: {examples}"
+        )
@@ -1,18 +1,47 @@
 __all__ = (
     "DefaultDataSource",
+    "collect_garbage",
+    "Compression",
     "Dataset",
+    "dataframe_cache",
     "DatasetKind",
+    "datasets_with_column",
+    "datasets_with_columns",
+    "datasets_with_values",
+    "MemoryDataSource",
+    "ParquetDataSource",
+    "ReadMode",
+    "RemoteDataSource",
     "reset_local_database",
+    "ShardedStore",
+    "storage_config",
+    "storage_executor",
+    "storage_options",
+    "StorageMode",
 )
 
 
-from sentier_data_tools.local_storage.datasource import DefaultDataSource
-from sentier_data_tools.local_storage.db import (
-    Dataset,
-    initialize_local_database,
-    reset_local_database,
-    sqlite_db,
+from sentier_data_tools.local_storage.aio import storage_executor
+from sentier_data_tools.local_storage.cache import dataframe_cache
+from sentier_data_tools.local_storage.column_index import (
+    datasets_with_column,
+    datasets_with_columns,
 )
+from sentier_data_tools.local_storage.column_statistics import datasets_with_values
+from sentier_data_tools.local_storage.config import (
+    Compression,
+    ReadMode,
+    StorageMode,
+    storage_config,
+    storage_options,
+)
+from sentier_data_tools.local_storage.datasource import (
+    DefaultDataSource,
+    MemoryDataSource,
+    ParquetDataSource,
+)
+from sentier_data_tools.local_storage.db import Dataset, collect_garbage, sqlite_db
 from sentier_data_tools.local_storage.fields import DatasetKind
-
-initialize_local_database(sqlite_db)
+from sentier_data_tools.local_storage.maintenance import reset_local_database
+from sentier_data_tools.local_storage.remote import RemoteDataSource
+from sentier_data_tools.local_storage.shards import ShardedStore
@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StorageExecutor:
+    """Bounded thread pool for running blocking storage calls from asyncio code.
+
+    At most `max_workers` calls (SQLite queries, Arrow decoding) run at once, and at
+    most `max_pending` more are queued; further callers wait in the event loop until
+    there is room, so a burst of requests can't queue unbounded work. Storage
+    settings (`storage_options`) of the calling task apply in the worker thread.
+
+    Threads are started on first use."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # `asyncio.Semaphore` can only be used from one event loop
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def configure(
+        self, max_workers: Optional[int] = None, max_pending: Optional[int] = None
+    ) -> None:
+        """Change the limits. Running calls finish on the previous threads."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self._semaphores = weakref.WeakKeyDictionary()
+            if max_workers is not None:
+                self.max_workers = max_workers
+            if max_pending is not None:
+                self.max_pending = max_pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="sdt-storage"
+                )
+            return self._executor
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        with self._lock:
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(
+                    self.max_workers + self.max_pending
+                )
+            return self._semaphores[loop]
+
+    async def run(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call `function(*args, **kwargs)` on a storage thread and wait for it."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, function)
+        async with self._get_semaphore(loop):
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(call, *args, **kwargs)
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+storage_executor = StorageExecutor()
@@ -0,0 +1,72 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, TypeVar
+
+from peewee import Database, Metadata
+
+T = TypeVar("T")
+
+# Database of the store models in the current thread or task; see `use_database`
+_database_override: ContextVar[Optional[Database]] = ContextVar(
+    "sdt_database", default=None
+)
+
+
+class StoreMetadata(Metadata):
+    """Model metadata whose database can be overridden for the current thread or task
+    with `use_database`.
+
+    `Model.bind` and `bind_ctx` change the database of a model for the whole
+    process, so they can't send concurrent queries to different databases, e.g. the
+    shards of a `ShardedStore`."""
+
+    def __init__(self, *args, **kwargs):
+        self._database = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def database(self) -> Optional[Database]:
+        override = _database_override.get()
+        return self._database if override is None else override
+
+    @database.setter
+    def database(self, value: Optional[Database]) -> None:
+        self._database = value
+
+
+@contextmanager
+def use_database(db: Optional[Database]) -> Iterator[None]:
+    """Run the queries of the store models on `db` in the current thread or task.
+    Threads started with a copy of the context (`storage_executor`, `bulk_save`)
+    inherit it. With `None`, the database doesn't change."""
+    if db is None:
+        yield
+        return
+    token = _database_override.set(db)
+    try:
+        yield
+    finally:
+        _database_override.reset(token)
+
+
+def bind_instance(instance, db: Database) -> None:
+    """Keep using `db` for `instance`, e.g. to load its dataframe or save it later,
+    whatever database is in use then."""
+    instance._store_database = db
+
+
+def instance_database(instance) -> Optional[Database]:
+    return instance.__dict__.get("_store_database")
+
+
+def routed(method: Callable[..., T]) -> Callable[..., T]:
+    """Run an instance method on the database the instance is bound to, if any; see
+    `bind_instance`."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs) -> T:
+        with use_database(instance_database(self)):
+            return method(self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,73 @@
+import io
+import sqlite3
+
+import pyarrow as pa
+
+CHUNK_SIZE = 1024**2
+
+
+class SQLiteBlobFile(io.RawIOBase):
+    """Read-only file interface to a `sqlite3.Blob`, for use with `pyarrow.PythonFile`.
+
+    Data is copied straight from the database pages (memory-mapped with the
+    `mmap_size` pragma) into the buffers Arrow reads into, and only for the byte
+    ranges which are actually read."""
+
+    def __init__(self, blob: sqlite3.Blob):
+        self._blob = blob
+
+    @property
+    def size(self) -> int:
+        return len(self._blob)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._blob.read(size)
+
+    def readinto(self, buffer) -> int:
+        data = self._blob.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def copy_to_buffer(self) -> pa.Buffer:
+        """Copy the rest of the blob into a new Arrow buffer, in chunks, so no Python
+        `bytes` object of the full blob size is created."""
+        size = len(self._blob) - self._blob.tell()
+        buffer = pa.allocate_buffer(size)
+        view = memoryview(buffer).cast("B")
+        position = 0
+        while position < size:
+            position += self.readinto(view[position : position + CHUNK_SIZE])
+        return buffer
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._blob.seek(offset, whence)
+        return self._blob.tell()
+
+    def tell(self) -> int:
+        return self._blob.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._blob.close()
+        super().close()
+
+
+def write_blob(
+    connection: sqlite3.Connection, table: str, column: str, rowid: int, data
+) -> None:
+    """Copy `data` into an existing blob of the same size, e.g. inserted as
+    `zeroblob(len(data))`, in chunks.
+
+    Binding `data` as a query parameter would make SQLite copy all of it first;
+    here only one chunk at a time is copied. Use inside the transaction which
+    inserted the blob, so readers never see it unfilled."""
+    view = memoryview(data).cast("B")
+    with connection.blobopen(table, column, rowid) as blob:
+        for start in range(0, len(view), CHUNK_SIZE):
+            blob.write(view[start : start + CHUNK_SIZE])
@@ -0,0 +1,121 @@
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+from peewee import Database
+
+from sentier_data_tools.local_storage.config import ReadMode, get_storage_config
+
+
+def share(value: Union[pd.DataFrame, pa.Table]) -> Union[pd.DataFrame, pa.Table]:
+    """Get a copy of a cached value which can be changed without changing the cache.
+
+    Arrow tables are immutable, and with pandas copy-on-write, a shallow copy only
+    copies data when it is modified. Without copy-on-write (pandas < 3 with the
+    option off), dataframes are copied."""
+    if isinstance(value, pa.Table):
+        return value
+    # In pandas 2.2 the option can also be "warn", which doesn't copy on write
+    copy_on_write = (
+        int(pd.__version__.split(".")[0]) >= 3
+        or pd.get_option("mode.copy_on_write") is True
+    )
+    return value.copy(deep=not copy_on_write)
+
+
+class DataframeCache:
+    """Process-wide LRU cache of loaded dataframes, bounded by their size in bytes.
+
+    Entries are keyed by database, dataset id, dataset version and read mode; the
+    size limit is `cache_max_bytes` in the storage config. Saving or deleting a
+    dataset invalidates its entries, but `Dataset.update()` and `Dataset.delete()`
+    queries don't; call `clear` after those.
+
+    Values are returned as copies which share data with the cached value until
+    modified; see `share`."""
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        # Keys of each (database, dataset id), for invalidation
+        self._by_dataset: dict[tuple, set[tuple]] = defaultdict(set)
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _database_token(self, database: Database) -> int:
+        # Unlike `id(database)`, never reused for another database object
+        token = getattr(database, "_sdt_cache_token", None)
+        if token is None:
+            token = database._sdt_cache_token = next(self._tokens)
+        return token
+
+    def key(
+        self,
+        database: Database,
+        pk: int,
+        version: Optional[int],
+        read_mode: Optional[ReadMode] = None,
+    ) -> tuple:
+        return (
+            self._database_token(database),
+            pk,
+            version,
+            read_mode or get_storage_config().read_mode,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> Union[pd.DataFrame, pa.Table, None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return share(entry[0])
+
+    def put(self, key: tuple, value: Union[pd.DataFrame, pa.Table], size: int) -> None:
+        """Cache `value`, evicting the least recently used entries as needed. Don't
+        modify `value` afterwards; use `share` to get a copy."""
+        max_bytes = get_storage_config().cache_max_bytes
+        with self._lock:
+            self._remove(key)
+            if size > max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._by_dataset[key[:2]].add(key)
+            self.size += size
+            while self.size > max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+            keys = self._by_dataset[key[:2]]
+            keys.discard(key)
+            if not keys:
+                del self._by_dataset[key[:2]]
+
+    def invalidate(self, database: Database, pk: int) -> None:
+        """Remove all entries of dataset `pk` in `database`."""
+        with self._lock:
+            for key in list(
+                self._by_dataset.get((self._database_token(database), pk), ())
+            ):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_dataset.clear()
+            self.size = 0
+
+
+dataframe_cache = DataframeCache()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+from typing import Iterable, Optional
+
+from peewee import ForeignKeyField, IntegerField, TextField, fn
+from playhouse.signals import Model, post_delete, post_save
+
+from sentier_data_tools.local_storage.binding import StoreMetadata
+from sentier_data_tools.local_storage.db import STORE_MODELS, Dataset, sqlite_db
+
+
+class ColumnSchema(Model):
+    """Distinct list of column IRIs and units, shared by all datasets with the same
+    columns. Keyed by the SHA-256 digest of the list, see `schema_digest`."""
+
+    digest = TextField(unique=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+
+
+class SchemaColumn(Model):
+    """One column of a `ColumnSchema`."""
+
+    schema = ForeignKeyField(ColumnSchema, backref="entries")
+    position = IntegerField()
+    iri = TextField(null=True)
+    unit = TextField(null=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+        indexes = (
+            (("schema", "position"), True),
+            # "Which datasets have column X (in unit Y)"
+            (("iri", "unit"), False),
+            (("unit",), False),
+        )
+
+
+class DatasetColumns(Model):
+    """The `ColumnSchema` of each dataset.
+
+    A separate table instead of a `Dataset` column, so that stores created before
+    the column index can be indexed without changing the `dataset` table."""
+
+    dataset = ForeignKeyField(Dataset, unique=True)
+    schema = ForeignKeyField(ColumnSchema, index=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+
+
+STORE_MODELS.extend([ColumnSchema, SchemaColumn, DatasetColumns])
+
+
+def schema_columns(columns: Optional[list[dict]]) -> list[tuple[Optional[str], ...]]:
+    """The `(iri, unit)` of each column in `Dataset.columns`."""
+    return [
+        (
+            str(column["iri"]) if column.get("iri") else None,
+            str(column["unit"]) if column.get("unit") else None,
+        )
+        for column in columns or []
+    ]
+
+
+def schema_digest(columns: list[tuple[Optional[str], ...]]) -> str:
+    return hashlib.sha256(json.dumps(columns).encode()).hexdigest()
+
+
+def index_columns(dataset: Dataset) -> int:
+    """Record the column IRIs and units of a saved dataset; returns the id of its
+    `ColumnSchema`. Called on every save; schemas seen before are looked up by
+    digest, so only new schemas write their columns."""
+    columns = schema_columns(dataset.columns)
+    digest = schema_digest(columns)
+    with Dataset._meta.database.atomic():
+        schema = (
+            ColumnSchema.select(ColumnSchema.id)
+            .where(ColumnSchema.digest == digest)
+            .scalar()
+        )
+        if schema is None:
+            schema = ColumnSchema.insert(digest=digest).execute()
+            SchemaColumn.insert_many(
+                [
+                    {"schema": schema, "position": position, "iri": iri, "unit": unit}
+                    for position, (iri, unit) in enumerate(columns)
+                ]
+            ).execute()
+        DatasetColumns.insert(dataset=dataset._pk, schema=schema).on_conflict(
+            conflict_target=[DatasetColumns.dataset],
+            update={DatasetColumns.schema: schema},
+        ).execute()
+    return schema
+
+
+def rebuild_column_index() -> int:
+    """Index the columns of all datasets, e.g. of stores written before the column
+    index existed or changed with `Dataset.update()` queries. Only the `columns` of
+    each dataset are read. Returns the number of datasets indexed."""
+    count = 0
+    with Dataset._meta.database.atomic():
+        DatasetColumns.delete().execute()
+        for dataset in Dataset.select(Dataset.id, Dataset.columns):
+            index_columns(dataset)
+            count += 1
+        # Schemas of deleted datasets; foreign key actions aren't enabled, so their
+        # columns are deleted first
+        unused = ColumnSchema.select(ColumnSchema.id).where(
+            ColumnSchema.id.not_in(DatasetColumns.select(DatasetColumns.schema))
+        )
+        SchemaColumn.delete().where(SchemaColumn.schema.in_(unused)).execute()
+        ColumnSchema.delete().where(ColumnSchema.id.in_(unused)).execute()
+    return count
+
+
+def datasets_with_column(iri: str, *expressions, unit: Optional[str] = None):
+    """Select the datasets which have a column with the given IRI, and optionally
+    unit, further filtered by `expressions`. Uses the column index; no dataframes
+    or `columns` JSON are read."""
+    entries = SchemaColumn.select(SchemaColumn.schema).where(
+        SchemaColumn.iri == str(iri)
+    )
+    if unit is not None:
+        entries = entries.where(SchemaColumn.unit == str(unit))
+    return Dataset.select().where(
+        Dataset.id.in_(
+            DatasetColumns.select(DatasetColumns.dataset).where(
+                DatasetColumns.schema.in_(entries)
+            )
+        ),
+        *expressions,
+    )
+
+
+def datasets_with_columns(iris: Iterable[str], *expressions):
+    """Select the datasets which have columns with all the given IRIs."""
+    iris = {str(iri) for iri in iris}
+    schemas = (
+        SchemaColumn.select(SchemaColumn.schema)
+        .where(SchemaColumn.iri.in_(iris))
+        .group_by(SchemaColumn.schema)
+        .having(fn.COUNT(SchemaColumn.iri.distinct()) == len(iris))
+    )
+    return Dataset.select().where(
+        Dataset.id.in_(
+            DatasetColumns.select(DatasetColumns.dataset).where(
+                DatasetColumns.schema.in_(schemas)
+            )
+        ),
+        *expressions,
+    )
+
+
+@post_save(sender=Dataset)
+def update_column_index(model_class, instance, created):
+    index_columns(instance)
+
+
+@post_delete(sender=Dataset)
+def remove_from_column_index(model_class, instance):
+    DatasetColumns.delete().where(DatasetColumns.dataset == instance._pk).execute()
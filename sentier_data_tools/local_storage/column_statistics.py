@@ -0,0 +1,476 @@
+from functools import partial
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from peewee import BareField, FloatField, ForeignKeyField, IntegerField, TextField
+from playhouse.signals import Model, post_delete, post_save, pre_save
+from playhouse.sqlite_ext import JSONField
+
+from sentier_data_tools.local_storage.binding import StoreMetadata
+from sentier_data_tools.local_storage.config import get_storage_config
+from sentier_data_tools.local_storage.db import (
+    BATCH_FILTERS,
+    SERIALIZE_HOOKS,
+    STORE_MODELS,
+    Dataset,
+    sqlite_db,
+)
+from sentier_data_tools.local_storage.predicates import could_match
+from sentier_data_tools.local_storage.serialization import (
+    is_record_batch_stream,
+    open_reader,
+)
+
+# Quantiles estimated for numeric columns
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Values used to estimate distinct counts and quantiles of long columns; the rank
+# error of the quantiles is about `1 / sqrt(SAMPLE_SIZE)`
+SAMPLE_SIZE = 64 * 1024
+
+
+class ColumnStatistics(Model):
+    """Summary statistics of one dataframe column, computed when the dataset is
+    saved. Queries can skip datasets by value range or missing values, and Monte
+    Carlo code can read distribution summaries, without loading any dataframes.
+
+    Streamed dataframes are summarized one record batch at a time, so `distinct`
+    and `quantiles` are not available for them."""
+
+    dataset = ForeignKeyField(Dataset, backref="column_statistics")
+    position = IntegerField()
+    label = TextField()
+    # Non-null values
+    count = IntegerField()
+    null_count = IntegerField()
+    # Numbers, booleans or strings; null for other types
+    min = BareField(null=True)
+    max = BareField(null=True)
+    mean = FloatField(null=True)
+    # Estimated for columns longer than `SAMPLE_SIZE`
+    distinct = IntegerField(null=True)
+    # Estimated `QUANTILES`, for numeric columns
+    quantiles = JSONField(null=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+        indexes = (
+            (("dataset", "position"), True),
+            (("label", "min", "max"), False),
+        )
+
+
+class BatchStatistics(Model):
+    """Value range of each orderable column in each stored record batch, so that
+    `Dataset.read` can skip batches which can't match a filter. Only for datasets
+    with more than one batch; `ColumnStatistics` covers the others.
+
+    Like `ColumnStatistics`, recompute with `update_column_statistics` after
+    changing dataframes with `Dataset.update()` queries."""
+
+    dataset = ForeignKeyField(Dataset, backref="batch_statistics")
+    batch = IntegerField()
+    position = IntegerField()
+    # Non-null values
+    count = IntegerField()
+    min = BareField(null=True)
+    max = BareField(null=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+        indexes = ((("dataset", "position", "batch"), True),)
+
+
+STORE_MODELS.extend([ColumnStatistics, BatchStatistics])
+
+
+def _is_numeric(data_type: pa.DataType) -> bool:
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+
+
+def _is_orderable(data_type: pa.DataType) -> bool:
+    return (
+        _is_numeric(data_type)
+        or pa.types.is_boolean(data_type)
+        or pa.types.is_string(data_type)
+        or pa.types.is_large_string(data_type)
+    )
+
+
+def _summarize(array: Union[pa.Array, pa.ChunkedArray]) -> dict:
+    """Statistics which can be merged across record batches."""
+    summary = {
+        "count": len(array) - array.null_count,
+        "null_count": array.null_count,
+        "min": None,
+        "max": None,
+        "sum": None,
+    }
+    if summary["count"] and _is_orderable(array.type):
+        extremes = pc.min_max(array).as_py()
+        summary["min"], summary["max"] = extremes["min"], extremes["max"]
+    if summary["count"] and _is_numeric(array.type):
+        summary["sum"] = pc.sum(array).as_py()
+    return summary
+
+
+def _merge(summary: dict, other: dict) -> dict:
+    merged = {key: summary[key] + other[key] for key in ("count", "null_count")}
+    for key, pick in (("min", min), ("max", max)):
+        values = [value for value in (summary[key], other[key]) if value is not None]
+        merged[key] = pick(values) if values else None
+    sums = [value for value in (summary["sum"], other["sum"]) if value is not None]
+    merged["sum"] = sum(sums) if sums else None
+    return merged
+
+
+def _row(position: int, label: str, summary: dict, **kwargs) -> dict:
+    row = {
+        "position": position,
+        "label": label,
+        "mean": (
+            summary["sum"] / summary["count"] if summary["sum"] is not None else None
+        ),
+        "distinct": None,
+        "quantiles": None,
+    } | {key: summary[key] for key in ("count", "null_count", "min", "max")}
+    return row | kwargs
+
+
+def sample(array: Union[pa.Array, pa.ChunkedArray]) -> Union[pa.Array, pa.ChunkedArray]:
+    """Up to `SAMPLE_SIZE` non-null values of `array`, drawn at random (with a fixed
+    seed, so that statistics are reproducible)."""
+    if array.null_count:
+        array = array.drop_null()
+    if len(array) <= SAMPLE_SIZE:
+        return array
+    rng = np.random.default_rng(0)
+    indices = rng.choice(len(array), SAMPLE_SIZE, replace=False, shuffle=False)
+    return array.take(np.sort(indices))
+
+
+def value_counts(values: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    """How often each distinct value occurs in `values`, which has no nulls."""
+    if not _is_numeric(values.type):
+        return pc.value_counts(values).field("counts").to_numpy()
+    # Sorting numbers is several times faster than hashing them in Arrow
+    ordered = np.sort(values.to_numpy())
+    boundaries = np.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+    return np.diff(np.concatenate([[0], boundaries, [len(ordered)]]))
+
+
+def estimate_distinct(counts: np.ndarray, total: int) -> int:
+    """Estimate the number of distinct values in a column of `total` non-null values
+    from the `value_counts` of a uniform sample, with the Duj1 estimator of Haas and
+    Stokes (1998), which PostgreSQL also uses. Exact if the sample is the whole
+    column."""
+    size, distinct = int(counts.sum()), len(counts)
+    if size >= total:
+        return distinct
+    singletons = int((counts == 1).sum())
+    estimate = size * distinct / (size - singletons + singletons * size / total)
+    return min(total, max(distinct, round(estimate)))
+
+
+def estimate_quantiles(
+    values: Union[pa.Array, pa.ChunkedArray],
+) -> Optional[list[float]]:
+    """`QUANTILES` of a numeric sample without nulls, interpolated linearly."""
+    ordered = np.sort(values.to_numpy().astype(float, copy=False))
+    ordered = ordered[~np.isnan(ordered)]
+    if not len(ordered):
+        return None
+    positions = np.array(QUANTILES) * (len(ordered) - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, len(ordered) - 1)
+    fraction = positions - lower
+    return (ordered[lower] * (1 - fraction) + ordered[upper] * fraction).tolist()
+
+
+def summarize_column(
+    position: int, label: str, array: Union[pa.Array, pa.ChunkedArray]
+) -> dict:
+    """All statistics of one column, as a `ColumnStatistics` row without `dataset`.
+
+    The distinct count and quantiles of columns longer than `SAMPLE_SIZE` are
+    estimated from a sample."""
+    summary = _summarize(array)
+    if pa.types.is_nested(array.type):
+        # Lists and structs can't be counted
+        return _row(position, label, summary)
+    values = sample(array)
+    extra = {"distinct": estimate_distinct(value_counts(values), summary["count"])}
+    if summary["count"] and _is_numeric(array.type):
+        extra["quantiles"] = estimate_quantiles(values)
+    return _row(position, label, summary, **extra)
+
+
+def _arrow_columns(value: Union[pd.DataFrame, pa.Table]):
+    # Dataframe columns are converted one at a time
+    if isinstance(value, pd.DataFrame):
+        return (
+            (str(label), pa.array(series, from_pandas=True))
+            for label, series in value.items()
+        )
+    return zip(value.column_names, value.columns)
+
+
+def batch_offsets(
+    value: Union[pd.DataFrame, pa.Table], batch_size: Optional[int]
+) -> list[tuple[int, int]]:
+    """`(offset, length)` of the record batches `value` is stored in; see
+    `write_ipc`. Tables are split at their chunks, and `batch_size` (which only
+    dataframes need)."""
+    if isinstance(value, pd.DataFrame):
+        return [
+            (start, min(batch_size, len(value) - start))
+            for start in range(0, len(value), batch_size)
+        ]
+    offsets, start = [], 0
+    for batch in value.to_batches(max_chunksize=batch_size):
+        if batch.num_rows:
+            offsets.append((start, batch.num_rows))
+            start += batch.num_rows
+    return offsets
+
+
+def _batch_row(batch: int, position: int, summary: dict) -> dict:
+    return {"batch": batch, "position": position} | {
+        key: summary[key] for key in ("count", "min", "max")
+    }
+
+
+def summarize_batches(
+    position: int,
+    array: Union[pa.Array, pa.ChunkedArray],
+    offsets: list[tuple[int, int]],
+) -> list[dict]:
+    """`BatchStatistics` rows, without `dataset`, of one column stored in the
+    batches at `offsets`."""
+    if len(offsets) <= 1 or not _is_orderable(array.type):
+        return []
+    return [
+        _batch_row(batch, position, _summarize(array.slice(start, length)))
+        for batch, (start, length) in enumerate(offsets)
+    ]
+
+
+def compute_statistics(
+    value: Union[pd.DataFrame, pa.Table], batch_size: Optional[int] = None
+) -> tuple[list[dict], list[dict]]:
+    """The `ColumnStatistics` and `BatchStatistics` rows of a dataframe or Arrow
+    table stored in batches of `batch_size` rows (default from the storage config).
+    Each column is converted to Arrow once for both."""
+    batch_size = batch_size or get_storage_config().record_batch_size
+    offsets = batch_offsets(value, batch_size)
+    column_rows, batch_rows = [], []
+    for position, (label, array) in enumerate(_arrow_columns(value)):
+        column_rows.append(summarize_column(position, label, array))
+        batch_rows.extend(summarize_batches(position, array, offsets))
+    return column_rows, batch_rows
+
+
+def compute_column_statistics(value: Union[pd.DataFrame, pa.Table]) -> list[dict]:
+    """Summarize each column of a dataframe or Arrow table. Dataframe columns are
+    converted to Arrow one at a time."""
+    return [
+        summarize_column(position, label, array)
+        for position, (label, array) in enumerate(_arrow_columns(value))
+    ]
+
+
+class StatisticsAccumulator:
+    """Collect the statistics of a stream of record batches as they are written.
+    Batches are summarized in slices of `batch_size` rows, as `write_ipc` stores
+    them."""
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or get_storage_config().record_batch_size
+        self.labels: list[str] = []
+        self.summaries: list[dict] = []
+        self.batch_summaries: list[list[dict]] = []
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        self.labels = batch.schema.names
+        if not batch.num_rows and not self.summaries:
+            self.summaries = [_summarize(array) for array in batch.columns]
+        for start in range(0, batch.num_rows, self.batch_size):
+            summaries = [
+                _summarize(array)
+                for array in batch.slice(start, self.batch_size).columns
+            ]
+            self.batch_summaries.append(summaries)
+            self.summaries = (
+                [
+                    _merge(summary, other)
+                    for summary, other in zip(self.summaries, summaries)
+                ]
+                if self.summaries
+                else summaries
+            )
+
+    def observe(self, reader: pa.RecordBatchReader) -> pa.RecordBatchReader:
+        """Pass the batches of `reader` on, updating the statistics on the way."""
+
+        def batches():
+            for batch in reader:
+                self.update(batch)
+                yield batch
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def rows(self) -> list[dict]:
+        return [
+            _row(position, label, summary)
+            for position, (label, summary) in enumerate(
+                zip(self.labels, self.summaries)
+            )
+        ]
+
+    def batch_rows(self) -> list[dict]:
+        if len(self.batch_summaries) <= 1:
+            return []
+        return [
+            _batch_row(batch, position, summary)
+            for batch, summaries in enumerate(self.batch_summaries)
+            for position, summary in enumerate(summaries)
+            if summary["min"] is not None or not summary["count"]
+        ]
+
+
+def store_column_statistics(
+    dataset: Dataset, rows: list[dict], batch_rows: Iterable[dict] = ()
+) -> None:
+    with Dataset._meta.database.atomic():
+        for model, entries in ((ColumnStatistics, rows), (BatchStatistics, batch_rows)):
+            model.delete().where(model.dataset == dataset._pk).execute()
+            entries = [row | {"dataset": dataset._pk} for row in entries]
+            if entries:
+                model.insert_many(entries).execute()
+
+
+def update_column_statistics(dataset: Dataset) -> None:
+    """Compute the statistics of a stored dataset, e.g. one saved before column
+    statistics existed. Loads the stored data as an Arrow table."""
+    with Dataset.dataframe.open_stored(dataset.id) as source:
+        table = open_reader(source).read_all()
+    # The chunks of the table are the stored batches
+    store_column_statistics(
+        dataset, *compute_statistics(table, batch_size=max(table.num_rows, 1))
+    )
+
+
+def read_column_statistics(dataset: Dataset) -> dict[str, ColumnStatistics]:
+    """The statistics of each column of a saved dataset, by column label."""
+    return {
+        obj.label: obj
+        for obj in ColumnStatistics.select()
+        .where(ColumnStatistics.dataset == dataset._pk)
+        .order_by(ColumnStatistics.position)
+    }
+
+
+def datasets_with_values(
+    label: str,
+    *expressions,
+    minimum: Optional[Union[float, str]] = None,
+    maximum: Optional[Union[float, str]] = None,
+):
+    """Select the datasets with a column `label` which has non-null values, and
+    whose value range overlaps `[minimum, maximum]`. No dataframes are loaded."""
+    entries = ColumnStatistics.select(ColumnStatistics.dataset).where(
+        ColumnStatistics.label == str(label), ColumnStatistics.count > 0
+    )
+    if minimum is not None:
+        entries = entries.where(ColumnStatistics.max >= minimum)
+    if maximum is not None:
+        entries = entries.where(ColumnStatistics.min <= maximum)
+    return Dataset.select().where(Dataset.id.in_(entries), *expressions)
+
+
+def matching_batches(
+    dataset: Dataset, predicates: list[tuple[int, str, Any]], batches: list[int]
+) -> list[int]:
+    """The `batches` of a saved dataset which can have rows matching all
+    `predicates` (column position, operator, value), judged by the stored column
+    and batch value ranges; see `could_match`."""
+    positions = {position for position, _, _ in predicates}
+    for obj in ColumnStatistics.select().where(
+        ColumnStatistics.dataset == dataset._pk,
+        ColumnStatistics.position.in_(positions),
+    ):
+        for position, op, value in predicates:
+            if position == obj.position and not could_match(
+                op, value, obj.count, obj.min, obj.max
+            ):
+                return []
+    ranges = {
+        (obj.batch, obj.position): obj
+        for obj in BatchStatistics.select().where(
+            BatchStatistics.dataset == dataset._pk,
+            BatchStatistics.position.in_(positions),
+        )
+    }
+    return [
+        batch
+        for batch in batches
+        if all(
+            (entry := ranges.get((batch, position))) is None
+            or could_match(op, value, entry.count, entry.min, entry.max)
+            for position, op, value in predicates
+        )
+    ]
+
+
+BATCH_FILTERS.append(matching_batches)
+
+
+@pre_save(sender=Dataset)
+def collect_column_statistics(model_class, instance, created):
+    # Only for new or replaced dataframes; after `dataframe_translation`, so streams
+    # already carry their column metadata
+    value = instance.__data__.get("dataframe")
+    if value is None or "dataframe" not in instance._dirty:
+        return
+    if not get_storage_config().column_statistics:
+        # Remove the statistics of a replaced dataframe; `Dataset.read` would skip
+        # batches by them
+        instance._pending_statistics = ([], [])
+    elif isinstance(value, (pd.DataFrame, pa.Table)):
+        # Computed in `save_column_statistics`, or by `bulk_save` on its worker
+        # threads, see `compute_pending_statistics`
+        instance._pending_statistics = partial(compute_statistics, value)
+    elif is_record_batch_stream(value):
+        accumulator = StatisticsAccumulator()
+        instance.__data__["dataframe"] = accumulator.observe(value)
+        instance._pending_statistics = accumulator
+
+
+def compute_pending_statistics(dataset: Dataset) -> None:
+    pending = dataset.__dict__.get("_pending_statistics")
+    if isinstance(pending, partial):
+        dataset._pending_statistics = pending()
+
+
+SERIALIZE_HOOKS.append(compute_pending_statistics)
+
+
+@post_save(sender=Dataset)
+def save_column_statistics(model_class, instance, created):
+    pending = instance.__dict__.pop("_pending_statistics", None)
+    if isinstance(pending, partial):
+        pending = pending()
+    elif isinstance(pending, StatisticsAccumulator):
+        pending = (pending.rows(), pending.batch_rows())
+    if pending is not None:
+        store_column_statistics(instance, *pending)
+
+
+@post_delete(sender=Dataset)
+def delete_column_statistics(model_class, instance):
+    for model in (ColumnStatistics, BatchStatistics):
+        model.delete().where(model.dataset == instance._pk).execute()
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import StrEnum
+from typing import Iterator, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class StorageMode(StrEnum):
+    # Arrow IPC payload stored in the `dataframe` column of the `Dataset` table
+    INLINE = "inline"
+    # Arrow IPC file in a content directory next to the database, read with memory
+    # mapping; only a reference is stored in the `dataframe` column. Files are named
+    # after their content hash, so identical dataframes share one file.
+    FILE = "file"
+    # Arrow IPC payload stored once per distinct content in the `DataframePayload`
+    # table, so datasets with identical dataframes share one payload; the `dataframe`
+    # column stores its content hash. Payloads are deleted with their last dataset.
+    CONTENT_ADDRESSED = "content_addressed"
+
+
+class Compression(StrEnum):
+    NONE = "none"
+    LZ4 = "lz4"
+    ZSTD = "zstd"
+    # Choose based on the size and column types of each dataframe
+    AUTO = "auto"
+
+
+class ReadMode(StrEnum):
+    # `pandas.DataFrame` with NumPy-backed columns
+    PANDAS = "pandas"
+    # `pandas.DataFrame` with `pandas.ArrowDtype` columns; avoids converting strings to
+    # Python objects, and doesn't copy data where possible
+    ARROW_DTYPE = "arrow_dtype"
+    # `pyarrow.Table`, without any conversion
+    ARROW = "arrow"
+
+
+class StorageConfig(BaseModel):
+    storage_mode: StorageMode = StorageMode.INLINE
+    # Maximum number of rows per Arrow record batch; batches are the unit of random
+    # access in `Dataset.read`
+    record_batch_size: int = Field(default=64 * 1024, gt=0)
+    # Arrow IPC buffer compression. The codec used is recorded in the schema metadata,
+    # and payloads with any codec (or none) can always be read.
+    compression: Compression = Compression.AUTO
+    compression_level: Optional[int] = None
+    # With `Compression.AUTO`, dataframes smaller than this are not compressed
+    compression_min_bytes: int = Field(default=64 * 1024, ge=0)
+    # Dataframes at least this large, and streams of record batches, are serialized
+    # to a temporary file instead of memory before being stored
+    spool_min_bytes: int = Field(default=64 * 1024**2, ge=0)
+    # Total size of loaded dataframes kept in `dataframe_cache`; 0 disables caching
+    cache_max_bytes: int = Field(default=256 * 1024**2, ge=0)
+    # What stored dataframes are returned as. Applies when the dataframe is
+    # deserialized, i.e. when `Dataset.dataframe` is first accessed.
+    read_mode: ReadMode = ReadMode.PANDAS
+    # Compute per-column summary statistics when saving; see `ColumnStatistics`
+    column_statistics: bool = True
+
+    model_config = ConfigDict(validate_assignment=True)
+
+
+# Global settings; change with e.g. `storage_config.storage_mode = "file"`
+storage_config = StorageConfig()
+
+_overrides: ContextVar[Optional[StorageConfig]] = ContextVar(
+    "sdt_storage_config", default=None
+)
+
+
+def get_storage_config() -> StorageConfig:
+    """Get the storage settings in effect, including any `storage_options` overrides."""
+    return _overrides.get() or storage_config
+
+
+@contextmanager
+def storage_options(**kwargs) -> Iterator[StorageConfig]:
+    """Override storage settings for the current thread or task.
+
+    ```python
+    with storage_options(storage_mode="file"):
+        dataset.save()
+    ```
+
+    """
+    config = StorageConfig(**(get_storage_config().model_dump() | kwargs))
+    token = _overrides.set(config)
+    try:
+        yield config
+    finally:
+        _overrides.reset(token)
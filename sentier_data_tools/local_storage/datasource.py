@@ -1,4 +1,271 @@
-class DefaultDataSource:
-    @classmethod
-    def foo(cls) -> None:
-        pass
+import contextvars
+import itertools
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from peewee import Database
+
+from sentier_data_tools.data_source_base import (
+    DatasetRecord,
+    DataSourceBase,
+    Products,
+    as_date,
+    record_matches,
+)
+from sentier_data_tools.local_storage.binding import bind_instance, use_database
+from sentier_data_tools.local_storage.cache import share
+from sentier_data_tools.local_storage.config import get_storage_config
+from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import (
+    add_column_metadata_to_table,
+    match_column_metadata,
+    table_to_dataframe,
+)
+
+# Key in the Parquet schema metadata for the dataset attributes, as JSON
+DATASET_METADATA_KEY = b"sdt:dataset"
+# Attributes and file names of all datasets in a directory, for remote readers which
+# can't list or open every file; see `RemoteDataSource`
+CATALOG_NAME = "catalog.json"
+
+
+def _as_list(values: Products) -> list[str]:
+    return [str(values)] if isinstance(values, str) else [str(obj) for obj in values]
+
+
+class DefaultDataSource(DataSourceBase):
+    """The local SQLite data store; the default `RunConfig.data_source`.
+
+    Uses `database` instead of the database the models are bound to, if given."""
+
+    def __init__(self, database: Optional[Database] = None):
+        self.database = database
+
+    def query(
+        self,
+        product: Products = None,
+        kind: Optional[DatasetKind] = None,
+        location: Products = None,
+        begin: Union[date, datetime, None] = None,
+        end: Union[date, datetime, None] = None,
+    ) -> list[DatasetRecord]:
+        conditions = []
+        if kind is not None:
+            conditions.append(Dataset.kind == kind)
+        if product is not None:
+            conditions.append(Dataset.product << _as_list(product))
+        if location is not None:
+            conditions.append(Dataset.location << _as_list(location))
+        if begin is not None:
+            conditions.append(Dataset.valid_to >= as_date(begin))
+        if end is not None:
+            conditions.append(Dataset.valid_from <= as_date(end))
+        with use_database(self.database):
+            rows = list(Dataset.catalog(*conditions))
+        for row in rows:
+            row["key"] = row.pop("id")
+            row["product"] = str(row["product"]) if row["product"] else None
+            row["location"] = str(row["location"])
+        return [DatasetRecord.stored(self, **row) for row in rows]
+
+    def _dataset(self, record: DatasetRecord) -> Dataset:
+        dataset = Dataset(id=record.key, version=record.version)
+        if self.database is not None:
+            bind_instance(dataset, self.database)
+        return dataset
+
+    def load(self, record: DatasetRecord) -> Union[pd.DataFrame, pa.Table]:
+        # Cached in `dataframe_cache`, like other stored dataframes
+        return self._dataset(record).dataframe
+
+    def read(
+        self, record: DatasetRecord, columns: Optional[list[str]] = None
+    ) -> Union[pd.DataFrame, pa.Table]:
+        return self._dataset(record).read(columns=columns)
+
+    def bulk_save(self, records: Iterable[DatasetRecord], **kwargs) -> int:
+        """Insert records with `Dataset.bulk_save`, to which keyword arguments are
+        passed."""
+        records = list(records)
+        datasets = [
+            Dataset(**record.model_dump(exclude={"key"}), dataframe=record.dataframe)
+            for record in records
+        ]
+        with use_database(self.database):
+            statistics = Dataset.bulk_save(datasets, **kwargs)
+        for record, dataset in zip(records, datasets):
+            record.key = dataset.id
+        return statistics.count
+
+
+class ParquetDataSource(DataSourceBase):
+    """A directory with one Parquet file per dataset. The dataset attributes are
+    stored in the Parquet schema metadata, and the column metadata in the field
+    metadata, as in the local store.
+
+    Queries read only the file footers, which are cached until the file changes.
+    Files are written to a temporary name and then renamed, so readers never see
+    partial files."""
+
+    def __init__(self, directory: Union[Path, str], workers: Optional[int] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        # File name -> (modification time, dataset attributes)
+        self._catalog: dict[str, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.parquet"
+
+    def _attributes(self, path: Path) -> dict:
+        mtime = path.stat().st_mtime
+        with self._lock:
+            cached = self._catalog.get(path.name)
+        if cached is None or cached[0] != mtime:
+            metadata = pq.read_schema(path).metadata
+            cached = (mtime, json.loads(metadata[DATASET_METADATA_KEY]))
+            with self._lock:
+                self._catalog[path.name] = cached
+        return cached[1]
+
+    def query(
+        self,
+        product: Products = None,
+        kind: Optional[DatasetKind] = None,
+        location: Products = None,
+        begin: Union[date, datetime, None] = None,
+        end: Union[date, datetime, None] = None,
+    ) -> list[DatasetRecord]:
+        records = [
+            DatasetRecord.stored(self, key=path.stem, **self._attributes(path))
+            for path in sorted(self.directory.glob("*.parquet"))
+        ]
+        return [
+            record
+            for record in records
+            if record_matches(record, product, kind, location, begin, end)
+        ]
+
+    def load(self, record: DatasetRecord) -> Union[pd.DataFrame, pa.Table]:
+        return self.read(record)
+
+    def read(
+        self, record: DatasetRecord, columns: Optional[list[str]] = None
+    ) -> Union[pd.DataFrame, pa.Table]:
+        if columns is not None:
+            columns = [str(column) for column in columns]
+        return table_to_dataframe(pq.read_table(self.path(record.key), columns=columns))
+
+    def write(self, record: DatasetRecord) -> None:
+        """Write one dataset to a new file, and set its `key`."""
+        value = record.dataframe
+        table = (
+            pa.Table.from_pandas(value, preserve_index=False)
+            if isinstance(value, pd.DataFrame)
+            else value
+        )
+        table = add_column_metadata_to_table(
+            table, match_column_metadata(table.column_names, record.columns)
+        )
+        table = table.replace_schema_metadata(
+            (table.schema.metadata or {})
+            | {DATASET_METADATA_KEY: record.model_dump_json(exclude={"key"})}
+        )
+        key = uuid.uuid4().hex
+        temporary = self.directory / f".{key}.tmp"
+        pq.write_table(
+            table, temporary, row_group_size=get_storage_config().record_batch_size
+        )
+        os.replace(temporary, self.path(key))
+        record.key = key
+
+    def write_catalog(self) -> Path:
+        """Write the attributes of all datasets to `CATALOG_NAME`, so that the
+        directory can be served from object storage as a `RemoteDataSource`."""
+        entries = [
+            {"file": path.name} | self._attributes(path)
+            for path in sorted(self.directory.glob("*.parquet"))
+        ]
+        temporary = self.directory / f".{CATALOG_NAME}.tmp"
+        temporary.write_text(json.dumps(entries))
+        os.replace(temporary, self.directory / CATALOG_NAME)
+        return self.directory / CATALOG_NAME
+
+    def bulk_save(self, records: Iterable[DatasetRecord]) -> int:
+        """Write the records on a pool of `workers` threads."""
+        records = list(records)
+        # Storage settings are in a context variable, which threads don't inherit
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.write, record)
+                for record in records
+            ]
+            for future in futures:
+                future.result()
+        return len(records)
+
+
+class MemoryDataSource(DataSourceBase):
+    """Datasets kept in memory, e.g. for tests, or to measure model run times
+    without any storage cost. Loaded dataframes share data with the stored ones
+    until modified; see `share`."""
+
+    def __init__(self):
+        self._datasets: dict[int, tuple[dict, Union[pd.DataFrame, pa.Table]]] = {}
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    def query(
+        self,
+        product: Products = None,
+        kind: Optional[DatasetKind] = None,
+        location: Products = None,
+        begin: Union[date, datetime, None] = None,
+        end: Union[date, datetime, None] = None,
+    ) -> list[DatasetRecord]:
+        with self._lock:
+            entries = list(self._datasets.items())
+        records = [
+            DatasetRecord.stored(self, key=key, **attributes)
+            for key, (attributes, _) in entries
+        ]
+        return [
+            record
+            for record in records
+            if record_matches(record, product, kind, location, begin, end)
+        ]
+
+    def load(self, record: DatasetRecord) -> Union[pd.DataFrame, pa.Table]:
+        with self._lock:
+            return share(self._datasets[record.key][1])
+
+    def bulk_save(self, records: Iterable[DatasetRecord]) -> int:
+        count = 0
+        for record in records:
+            attributes = record.model_dump(exclude={"key"})
+            value = share(record.dataframe)
+            if isinstance(value, pa.Table):
+                metadata = match_column_metadata(value.column_names, record.columns)
+                value = add_column_metadata_to_table(value, metadata)
+            else:
+                metadata = match_column_metadata(value.columns, record.columns)
+                value.attrs.setdefault("sdt", {})["columns"] = metadata
+            with self._lock:
+                record.key = next(self._keys)
+                self._datasets[record.key] = (attributes, value)
+            count += 1
+        return count
@@ -1,46 +1,380 @@
+import contextvars
+import itertools
+import os
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from time import time
+from typing import Iterable, Optional, Union
 
+import pandas as pd
 import platformdirs
-from peewee import DateField, IntegerField, TextField
-from playhouse.signals import Model, pre_save
+import pyarrow as pa
+import pyarrow.compute as pc
+from peewee import (
+    SQL,
+    BlobField,
+    DateField,
+    IntegerField,
+    SchemaManager,
+    Select,
+    TextField,
+    fn,
+)
+from playhouse.migrate import SqliteMigrator, migrate
+from playhouse.pool import PooledSqliteExtDatabase
+from playhouse.signals import Model, post_save, pre_save
 from playhouse.sqlite_ext import JSONField, SqliteExtDatabase
+from pydantic import BaseModel
 
+from sentier_data_tools.local_storage.aio import storage_executor
+from sentier_data_tools.local_storage.binding import StoreMetadata, routed
+from sentier_data_tools.local_storage.blobs import write_blob
+from sentier_data_tools.local_storage.cache import dataframe_cache
+from sentier_data_tools.local_storage.config import ReadMode
 from sentier_data_tools.local_storage.enum_field import EnumField
 from sentier_data_tools.local_storage.fields import (
     ColumnsField,
     DatasetKind,
     GeonamesIRIField,
+    JSONPathField,
     PandasFeatherField,
     ProductIRIField,
 )
+from sentier_data_tools.local_storage.predicates import Predicate, filter_expression
+from sentier_data_tools.local_storage.serialization import (
+    MAX_REFERENCE_LENGTH,
+    add_column_metadata_to_schema,
+    add_column_metadata_to_table,
+    apply_aliases,
+    column_metadata_from_schema,
+    is_file_reference,
+    is_record_batch_stream,
+    is_reference,
+    is_spooled,
+    match_column_metadata,
+    open_reader,
+    payload_filename,
+    read_schema,
+    read_table,
+    record_batch_reader,
+    reference_digest,
+    restore_column_iris,
+    select_batches,
+    table_to_dataframe,
+    update_column_metadata,
+)
+from sentier_data_tools.logs import stdout_feedback_logger as logger
+from sentier_data_tools.unit_conversion import (
+    ConversionTable,
+    normalize_to_canonical_units,
+)
 
 base_dir = Path(platformdirs.user_data_dir(appname="sentier.dev", appauthor="DdS"))
 sqlite_dir_platformdirs = base_dir / "local-data-store"
-sqlite_dir_platformdirs.mkdir(exist_ok=True, parents=True)
 
 DB_NAME = "datasets.db"
-sqlite_db = SqliteExtDatabase(sqlite_dir_platformdirs / DB_NAME)
+# Database file, or ":memory:" for an in-memory store; read when the store is opened
+STORE_ENVIRONMENT_VARIABLE = "SDT_DATA_STORE"
+# Name of a `PRAGMA_PROFILES` entry for the process-wide store
+PRAGMA_PROFILE_ENVIRONMENT_VARIABLE = "SDT_PRAGMA_PROFILE"
+MEMORY = ":memory:"
+# Let SQLite read database pages through memory mapping instead of copying them into
+# its page cache; blob reads then copy directly from the mapped file
+MMAP_SIZE = 1024**3
+MAX_CONNECTIONS = 32
+# Seconds to wait for a free pooled connection
+POOL_TIMEOUT = 30
+
+PRAGMA_PROFILES = {
+    # Rollback journal; works everywhere, including network filesystems
+    "default": {
+        "mmap_size": MMAP_SIZE,
+        "busy_timeout": 5000,
+    },
+    # Write-ahead log, so readers don't block the writer or each other. Needs shared
+    # memory, so doesn't work on network filesystems.
+    "concurrent": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -64 * 1024,
+        "mmap_size": MMAP_SIZE,
+        "busy_timeout": 30000,
+    },
+    # Single writer loading lots of data; a crash can lose the latest transactions
+    "bulk_load": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": -256 * 1024,
+        "mmap_size": MMAP_SIZE,
+        "temp_store": "memory",
+        "busy_timeout": 30000,
+    },
+}
+
+
+def _environment_pragma_profile() -> str:
+    # Read on import, so an unknown name falls back instead of failing the import
+    profile = os.environ.get(PRAGMA_PROFILE_ENVIRONMENT_VARIABLE, "default")
+    if profile not in PRAGMA_PROFILES:
+        logger.warning(
+            "Unknown pragma profile %s in %s; using default. Choose from %s",
+            profile,
+            PRAGMA_PROFILE_ENVIRONMENT_VARIABLE,
+            list(PRAGMA_PROFILES),
+        )
+        return "default"
+    return profile
+
+
+def store_location(location: Union[Path, str, None] = None) -> Union[Path, str]:
+    """Resolve the location of the local data store: `location` if given, otherwise
+    the `SDT_DATA_STORE` environment variable, otherwise `datasets.db` in the user
+    data directory. Returns `":memory:"` for an in-memory store."""
+    location = location or os.environ.get(STORE_ENVIRONMENT_VARIABLE)
+    if not location:
+        return sqlite_dir_platformdirs / DB_NAME
+    return MEMORY if str(location) == MEMORY else Path(location)
+
+
+class LocalDatabase(PooledSqliteExtDatabase):
+    """Pooled SQLite database of the local data store, opened on first use.
+
+    Nothing happens on import. When the first connection is opened, the location is
+    resolved with `store_location`, and the directory and tables are created.
+
+    Pooled connections to `:memory:` would each get their own database, so in-memory
+    stores are a named shared-cache database, kept alive by an extra connection until
+    `close_store`."""
+
+    _memory_stores = itertools.count()
+
+    def __init__(self, location: Union[Path, str, None] = None, **kwargs):
+        self.location = location
+        # Reentrant, as creating the tables connects from within `open_store`
+        self._open_lock = threading.RLock()
+        # Only set once the tables exist; other threads wait for it in `connect`
+        self._opened = False
+        self._keeper = None
+        super().__init__(None, **kwargs)
+
+    def connect(self, reuse_if_open: bool = False) -> bool:
+        if not self._opened:
+            self.open_store()
+        return super().connect(reuse_if_open)
+
+    def open_store(self) -> None:
+        """Resolve the location and create the database if needed. Called
+        automatically on first use."""
+        with self._open_lock:
+            if self._opened or not self.deferred:
+                # Already open, or being opened by this thread
+                return
+            location = store_location(self.location)
+            if location == MEMORY:
+                uri = (
+                    f"file:sdt-memory-{next(self._memory_stores)}"
+                    "?mode=memory&cache=shared"
+                )
+                self._keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                self.init(uri, uri=True)
+            else:
+                location.parent.mkdir(parents=True, exist_ok=True)
+                self.init(str(location))
+            try:
+                initialize_local_database(self)
+            except Exception:
+                self.close_store()
+                raise
+            self._opened = True
+
+    @property
+    def in_memory(self) -> bool:
+        return self._keeper is not None
+
+    def close_store(self) -> None:
+        """Close all connections. An in-memory store is discarded. The location is
+        resolved again on next use."""
+        with self._open_lock:
+            self._opened = False
+            self.close_all()
+            if self._keeper is not None:
+                self._keeper.close()
+                self._keeper = None
+            self.init(None)
+
+
+# Thread-safe pool; each thread gets its own connection, which is returned to the pool
+# when closed. `check_same_thread=False` because pooled connections move between
+# threads, and Arrow reads blobs from its I/O threads.
+sqlite_db = LocalDatabase(
+    max_connections=MAX_CONNECTIONS,
+    timeout=POOL_TIMEOUT,
+    pragmas=PRAGMA_PROFILES[_environment_pragma_profile()],
+    check_same_thread=False,
+)
+
+
+def configure_local_database(
+    profile: Optional[str] = None,
+    max_connections: int = MAX_CONNECTIONS,
+    location: Union[Path, str, None] = None,
+    db: PooledSqliteExtDatabase = sqlite_db,
+) -> None:
+    """Apply the pragma `profile` (see `PRAGMA_PROFILES`), pool size and store
+    `location` to `db`. Without a `profile`, the pragmas don't change.
+
+    Open connections are closed; new connections use the new settings. The profile
+    can also be set with the `SDT_PRAGMA_PROFILE` environment variable, and the
+    location with `SDT_DATA_STORE`, e.g. for worker processes with their own
+    replica. Use `location=":memory:"` for an in-memory store."""
+    if profile is not None and profile not in PRAGMA_PROFILES:
+        raise KeyError(
+            f"Unknown pragma profile {profile}; choose from {list(PRAGMA_PROFILES)}"
+        )
+    settings = {"max_connections": max_connections, "timeout": POOL_TIMEOUT}
+    if profile is not None:
+        settings["pragmas"] = PRAGMA_PROFILES[profile]
+    if isinstance(db, LocalDatabase):
+        db.close_store()
+        if location is not None:
+            db.location = location
+        db.init(None, **settings)
+    else:
+        db.close_all()
+        db.init(location or db.database, **settings)
 
 
 def initialize_local_database(db: SqliteExtDatabase) -> None:
     """Initialize the database, creating tables if they do not exist."""
     db.connect(reuse_if_open=True)
-    db.create_tables([Dataset], safe=True)
+    if not db.get_tables():
+        # Can only be set before the first table is created; lets
+        # `maintenance.incremental_vacuum` return free pages to the file system
+        db.pragma("auto_vacuum", "incremental")
+    else:
+        add_missing_columns(db)
+    # Not `db.create_tables`, which uses the database the models are bound to
+    for model in STORE_MODELS:
+        SchemaManager(model, database=db).create_all(safe=True)
     db.close()
 
 
+def add_missing_columns(db: SqliteExtDatabase) -> None:
+    """Add the columns of newer versions to the tables of an existing store. Only
+    nullable and generated columns can be added this way."""
+    tables = set(db.get_tables())
+    migrator = SqliteMigrator(db)
+    for model in STORE_MODELS:
+        table = model._meta.table_name
+        if table not in tables:
+            continue
+        # Unlike `table_info`, `table_xinfo` lists generated columns
+        existing = {row[1] for row in db.execute_sql(f'PRAGMA table_xinfo("{table}")')}
+        missing = [
+            field
+            for field in model._meta.sorted_fields
+            if field.column_name not in existing
+        ]
+        if missing:
+            logger.info("Adding columns %s to %s", [f.name for f in missing], table)
+            migrate(
+                *(
+                    migrator.add_column(table, field.column_name, field)
+                    for field in missing
+                )
+            )
+
+
 def global_location_default() -> str:
     return "https://sws.geonames.org/6295630/"
 
 
-def reset_local_database() -> None:
-    """Initialize the database, creating tables if they do not exist."""
-    Dataset.delete().execute()
+class DataframePayload(Model):
+    """Dataframe payload shared by all datasets with identical Arrow IPC data.
+
+    Datasets reference payloads by the SHA-256 digest of the IPC data, see
+    `StorageMode.CONTENT_ADDRESSED`. Files of `StorageMode.FILE` are counted here too,
+    without `data`. `refcount` is the number of datasets referencing the payload."""
+
+    digest = TextField(unique=True)
+    size = IntegerField()
+    refcount = IntegerField(default=0)
+    # Null for payloads stored as files in the content directory
+    data = BlobField(null=True)
+
+    class Meta:
+        database = sqlite_db
+        model_metadata_class = StoreMetadata
+
+    @classmethod
+    def add_reference(cls, digest: str, size: int, data=None) -> bool:
+        """Count a new reference to the payload `digest`. `data` is only written if
+        the payload isn't stored yet. Returns `True` for new payloads."""
+        with cls._meta.database.atomic():
+            updated = (
+                cls.update(refcount=cls.refcount + 1)
+                .where(cls.digest == digest)
+                .execute()
+            )
+            if updated:
+                return False
+            if is_spooled(data):
+                rowid = cls.insert(
+                    digest=digest, size=size, data=fn.zeroblob(size), refcount=1
+                ).execute()
+                write_blob(
+                    cls._meta.database.connection(),
+                    cls._meta.table_name,
+                    cls.data.column_name,
+                    rowid,
+                    data,
+                )
+            else:
+                cls.insert(digest=digest, size=size, data=data, refcount=1).on_conflict(
+                    conflict_target=[cls.digest],
+                    update={cls.refcount: cls.refcount + 1},
+                ).execute()
+        return True
+
+    @classmethod
+    def release(cls, digest: str) -> bool:
+        """Remove a reference to the payload `digest`, and delete the payload if no
+        references are left. Returns `True` if the payload was deleted."""
+        with cls._meta.database.atomic():
+            cls.update(refcount=cls.refcount - 1).where(cls.digest == digest).execute()
+            deleted = (
+                cls.delete()
+                .where((cls.digest == digest) & (cls.refcount <= 0))
+                .execute()
+            )
+        return bool(deleted)
+
+
+class GarbageCollectionStatistics(BaseModel):
+    payloads_deleted: int = 0
+    files_deleted: int = 0
+    bytes_freed: int = 0
+
+
+class BulkSaveStatistics(BaseModel):
+    count: int = 0
+    # Serialized dataframe size
+    payload_bytes: int = 0
+    seconds: float = 0.0
+    # Summed over worker threads
+    serialize_seconds: float = 0.0
+    insert_seconds: float = 0.0
+
+    @property
+    def datasets_per_second(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.0
 
 
 class Dataset(Model):
     name = TextField()
-    dataframe = PandasFeatherField()
     kind = EnumField(DatasetKind, default=DatasetKind.PARAMETERS)
     product = ProductIRIField(null=True)
     location = GeonamesIRIField(default=global_location_default)
@@ -49,13 +383,531 @@ class Dataset(Model):
     columns = ColumnsField()
     metadata = JSONField()
     version = IntegerField()
+    # Last stored column, so SQLite can read the other columns without walking
+    # through the overflow pages of the blob
+    dataframe = PandasFeatherField(payloads=DataframePayload)
+    # Indexed projections of `metadata` keys; see `Dataset.with_metadata`. Virtual,
+    # so they take no space after the blob.
+    determining_value = JSONPathField("$.determining_value")
+    homepage = JSONPathField("$.homepage")
 
     # TODO: BOM must have "determining_value" column in metadata
 
     class Meta:
         database = sqlite_db
+        model_metadata_class = StoreMetadata
+        indexes = (
+            # Model data lookups: `kind` and `product` equality or `IN`, optionally
+            # narrowed by location and validity dates
+            (("kind", "product", "location", "valid_from", "valid_to"), False),
+            # `BROAD` data often has no product
+            (("kind", "location", "valid_from", "valid_to"), False),
+            # Versions of a dataset; see `Dataset.latest`
+            (("name", "version"), False),
+            (("kind", "determining_value"), False),
+            (("homepage",), False),
+        )
+
+    @classmethod
+    def select(cls, *fields):
+        """Select datasets. Unless requested explicitly, the dataframe column is not
+        selected, and dataframes are only loaded when `.dataframe` is accessed."""
+        if not fields:
+            fields = [
+                field for field in cls._meta.sorted_fields if field is not cls.dataframe
+            ]
+        return super().select(*fields)
+
+    @classmethod
+    def catalog(cls, *expressions):
+        """List dataset attributes as dictionaries, without touching the dataframes.
+
+        ```python
+        Dataset.catalog(Dataset.kind == DatasetKind.BOM)
+        ```
+
+        """
+        query = cls.select()
+        if expressions:
+            query = query.where(*expressions)
+        return query.dicts()
+
+    @classmethod
+    def latest(cls, *expressions):
+        """Select only the highest version of each dataset name.
+
+        Uses the `(name, version)` index to check for a newer version of each row.
+        `expressions` filter the result, but don't change which version is latest."""
+        Newer = cls.alias()
+        newer_exists = fn.EXISTS(
+            Newer.select(SQL("1")).where(
+                (Newer.name == cls.name) & (Newer.version > cls.version)
+            )
+        )
+        return cls.select().where(~newer_exists, *expressions)
+
+    @classmethod
+    def with_metadata(cls, *expressions, contributor: Optional[str] = None, **values):
+        """Select datasets by `metadata` values, further filtered by `expressions`.
+
+        ```python
+        Dataset.with_metadata(
+            Dataset.kind == DatasetKind.BOM,
+            determining_value=nom_power_cons_iri,
+        )
+        ```
+
+        Keys with a `JSONPathField` projection (`determining_value`, `homepage`) are
+        index lookups. Other keys are compared in SQL, which parses the `metadata`
+        of every row, but still doesn't load rows or dataframes into Python. A
+        `contributor` matches the `path` or `title` of any of the `contributors`."""
+        conditions = []
+        for key, value in values.items():
+            field = cls._meta.fields.get(key)
+            if isinstance(field, JSONPathField):
+                conditions.append(field == value)
+            else:
+                conditions.append(cls.metadata[key] == value)
+        if contributor is not None:
+            entries = cls.metadata["contributors"].children().alias("contributor")
+            entry = entries.c.value
+            conditions.append(
+                fn.EXISTS(
+                    Select([entries], [SQL("1")]).where(
+                        (fn.json_extract(entry, "$.path") == contributor)
+                        | (fn.json_extract(entry, "$.title") == contributor)
+                    )
+                )
+            )
+        return cls.select().where(*conditions, *expressions)
+
+    @classmethod
+    async def aselect(cls, *expressions) -> list["Dataset"]:
+        """Select datasets matching `expressions` without blocking the event loop.
+
+        The query runs on `storage_executor`. Dataframes are not loaded; use
+        `aload_dataframe` or `aread`.
+
+        ```python
+        datasets = await Dataset.aselect(Dataset.kind == DatasetKind.BOM)
+        ```
+
+        """
+        query = cls.select()
+        if expressions:
+            query = query.where(*expressions)
+        return await storage_executor.run(list, query)
+
+    async def aload_dataframe(self) -> Union[pd.DataFrame, pa.Table]:
+        """Load the dataframe on `storage_executor`; the same as accessing
+        `.dataframe`, which is instant afterwards."""
+        return await storage_executor.run(getattr, self, "dataframe")
+
+    async def aread(self, *args, **kwargs) -> Union[pd.DataFrame, pa.Table]:
+        """`read` on `storage_executor`."""
+        return await storage_executor.run(self.read, *args, **kwargs)
+
+    async def asave(self, *args, **kwargs) -> int:
+        """`save` on `storage_executor`."""
+        return await storage_executor.run(self.save, *args, **kwargs)
+
+    def apply_aliases(self, aliases: dict) -> None:
+        """Apply column `aliases` to the dataframe, now if already loaded, or
+        otherwise when it is loaded."""
+        self.dataframe_aliases = aliases
+        if "dataframe" in self.__data__:
+            self.__data__["dataframe"] = apply_aliases(self.dataframe, aliases)
+
+    @routed
+    def save(
+        self,
+        *args,
+        normalize_units: bool = False,
+        conversion_table: Optional[ConversionTable] = None,
+        **kwargs,
+    ) -> int:
+        """Save the dataset.
+
+        If `normalize_units`, numeric columns are converted to the canonical unit of
+        their quantity kind before writing, and the original unit and conversion
+        factor are recorded in the column metadata. Pass the same `conversion_table`
+        when saving many datasets to reuse unit lookups.
+
+        The dataframe can also be a `pyarrow.RecordBatchReader` or a generator of
+        record batches, e.g. for data which doesn't fit in memory. It is written one
+        batch at a time, and read back from storage when next accessed."""
+        if normalize_units:
+            self._normalize_units(conversion_table)
+        # Payloads shared through content addressing are counted; replacing the
+        # dataframe releases the previous one
+        previous = None
+        if self._pk is not None and "dataframe" in self.__data__:
+            previous = Dataset.dataframe.stored_reference(self._pk)
+        with self._meta.database.atomic(), Dataset.dataframe.deferred_writes() as large:
+            result = super().save(*args, **kwargs)
+            for payload in large:
+                Dataset.dataframe.write_stored(self._pk, payload)
+        if previous is not None:
+            Dataset.dataframe.release(previous)
+        dataframe_cache.invalidate(self._meta.database, self._pk)
+        self._forget_streamed_dataframe()
+        return result
+
+    def _forget_streamed_dataframe(self) -> None:
+        # A stream of record batches is consumed by saving; load the stored dataframe
+        # on the next access instead
+        if is_record_batch_stream(self.__data__.get("dataframe")):
+            del self.__data__["dataframe"]
+
+    @routed
+    def delete_instance(self, *args, **kwargs) -> int:
+        """Delete the dataset, and its stored payload unless other datasets share it.
+
+        Deleting with `Dataset.delete()` queries doesn't update the payload reference
+        counts; run `collect_garbage` afterwards."""
+        reference = Dataset.dataframe.stored_reference(self._pk)
+        result = super().delete_instance(*args, **kwargs)
+        dataframe_cache.invalidate(self._meta.database, self._pk)
+        if reference is not None:
+            Dataset.dataframe.release(reference)
+        return result
+
+    def _normalize_units(self, conversion_table: Optional[ConversionTable]) -> None:
+        if isinstance(self.__data__.get("dataframe"), pd.DataFrame):
+            self.attach_column_metadata()
+            self.dataframe = normalize_to_canonical_units(
+                self.dataframe, conversion_table
+            )
+            self.columns = update_column_metadata(
+                self.dataframe.columns,
+                self.columns,
+                self.dataframe.attrs["sdt"]["columns"],
+            )
+
+    @classmethod
+    def bulk_save(
+        cls,
+        datasets: Iterable["Dataset"],
+        batch_size: int = 500,
+        workers: Optional[int] = None,
+        normalize_units: bool = False,
+        conversion_table: Optional[ConversionTable] = None,
+    ) -> "BulkSaveStatistics":
+        """Insert many new datasets.
+
+        Dataframes are serialized on a pool of `workers` threads (Arrow releases the
+        GIL), while the previous batch is inserted. Each batch of `batch_size`
+        datasets is inserted in one transaction. `pre_save` and `post_save` signals
+        are sent as for `save`, and `SERIALIZE_HOOKS` run on the worker threads.
+
+        With `normalize_units`, all datasets share one `conversion_table`."""
+        if normalize_units and conversion_table is None:
+            conversion_table = ConversionTable()
+        statistics = BulkSaveStatistics()
+        start = time()
+        database = cls._meta.database
+
+        def serialize(
+            dataset: Dataset,
+        ) -> tuple[Union[bytes, memoryview], Optional[memoryview], float]:
+            try:
+                for hook in SERIALIZE_HOOKS:
+                    hook(dataset)
+                begin = time()
+                payload, referenced = cls.dataframe.serialize(dataset.dataframe)
+                return payload, referenced, time() - begin
+            finally:
+                # Serializing doesn't use the database, but a connection opened on a
+                # worker, e.g. by a hook, would stay checked out of the pool
+                if not database.is_closed():
+                    database.close()
+
+        def prepare(batch: list[Dataset]) -> list[tuple[Dataset, Future]]:
+            for dataset in batch:
+                if dataset._pk is not None:
+                    raise ValueError("`bulk_save` can only insert new datasets")
+                if normalize_units:
+                    dataset._normalize_units(conversion_table)
+                pre_save.send(dataset, created=True)
+            # Storage settings are in a context variable, which threads don't inherit
+            return [
+                (
+                    dataset,
+                    executor.submit(contextvars.copy_context().run, serialize, dataset),
+                )
+                for dataset in batch
+            ]
+
+        def insert(batch: list[tuple[Dataset, Future]]) -> None:
+            rows = []
+            for dataset, future in batch:
+                payload, referenced, seconds = future.result()
+                statistics.serialize_seconds += seconds
+                statistics.payload_bytes += len(payload)
+                rows.append((dataset.__data__ | {"dataframe": payload}, referenced))
+            begin = time()
+            with cls._meta.database.atomic():
+                for (dataset, _), (row, referenced) in zip(batch, rows):
+                    payload = row["dataframe"]
+                    # Counted with the batch, so a failed insert doesn't leave
+                    # references behind
+                    cls.dataframe.add_reference(payload, referenced)
+                    if is_spooled(payload):
+                        row["dataframe"] = fn.zeroblob(len(payload))
+                    dataset._pk = cls.insert(row).execute()
+                    if is_spooled(payload):
+                        cls.dataframe.write_stored(dataset._pk, payload)
+                # In the same transaction, so that side tables maintained by
+                # `post_save` handlers are written with the batch
+                for dataset, _ in batch:
+                    dataset._dirty.clear()
+                    dataset._forget_streamed_dataframe()
+                    # SQLite can reuse the ids of deleted rows
+                    dataframe_cache.invalidate(cls._meta.database, dataset._pk)
+                    post_save.send(dataset, created=True)
+            statistics.insert_seconds += time() - begin
+            statistics.count += len(batch)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending, iterator = None, iter(datasets)
+            while batch := list(itertools.islice(iterator, batch_size)):
+                futures = prepare(batch)
+                if pending:
+                    insert(pending)
+                pending = futures
+            if pending:
+                insert(pending)
+
+        statistics.seconds = time() - start
+        logger.info(
+            "Saved %s datasets (%.1f MB) in %.1f seconds: %.1f datasets per second",
+            statistics.count,
+            statistics.payload_bytes / 1e6,
+            statistics.seconds,
+            statistics.datasets_per_second,
+        )
+        return statistics
+
+    def attach_column_metadata(self) -> None:
+        """Copy the matching `columns` metadata to `dataframe.attrs`."""
+        self.dataframe.restore_column_iris()
+        self.dataframe.attrs.setdefault("sdt", {})["columns"] = match_column_metadata(
+            self.dataframe.columns, self.columns
+        )
+
+    @routed
+    def _raw_dataframe(self) -> bytes:
+        """Get the stored dataframe payload without deserializing it."""
+        query = Dataset.select(Dataset.dataframe).where(Dataset.id == self.id)
+        return self._meta.database.execute_sql(*query.sql()).fetchone()[0]
+
+    @routed
+    def read_schema(self) -> pa.Schema:
+        """Read the Arrow schema of the stored dataframe without loading its data."""
+        with Dataset.dataframe.open_stored(self.id) as source:
+            return read_schema(source)
+
+    @routed
+    def read(
+        self,
+        columns: Optional[list[str]] = None,
+        batches: Union[int, slice, list[int], None] = None,
+        read_mode: Optional[ReadMode] = None,
+        filter: Union[pc.Expression, dict, None] = None,
+    ) -> Union[pd.DataFrame, pa.Table]:
+        """Read only some `columns`, record `batches` and/or rows of the stored
+        dataframe.
+
+        Batches are the chunks of `record_batch_size` rows the dataframe was written
+        in. Columns can be given as IRIs or as aliases applied with `apply_aliases`.
+        `read_mode` overrides the `read_mode` of the storage config.
+
+        `filter` selects rows with a pyarrow compute expression, or a dict of
+        predicates (see `parse_predicates`). It is evaluated on each Arrow record
+        batch, before any conversion to pandas. Dict predicates also skip the batches
+        which their stored value ranges rule out (see `BatchStatistics`), and only
+        decode the columns they use; expressions decode all columns of the batches
+        read, and must use IRIs instead of aliases.
+
+        ```python
+        dataset.read(columns=[company_iri, power_iri], batches=slice(0, 2))
+        dataset.read(filter={company_iri: "Nel", year_iri: (">=", 2020)})
+        dataset.read(filter=pc.field(power_iri) > 1000)
+        ```
+
+        """
+        aliases = {str(k): v for k, v in getattr(self, "dataframe_aliases", {}).items()}
+        reverse = {value: key for key, value in aliases.items()}
+        if columns is not None:
+            columns = [reverse.get(column, str(column)) for column in columns]
+        expression, predicates = None, None
+        if isinstance(filter, dict):
+            filter = {reverse.get(str(key), str(key)): v for key, v in filter.items()}
+        if filter is not None:
+            expression, predicates = filter_expression(filter)
+        with Dataset.dataframe.open_stored(self.id) as source:
+            if predicates:
+                batches = self._matching_batches(source, predicates, batches)
+            table = read_table(
+                source,
+                columns,
+                batches,
+                filter=expression,
+                filter_columns=(
+                    None
+                    if predicates is None
+                    else [column for column, _, _ in predicates]
+                ),
+            )
+        df = table_to_dataframe(table, read_mode)
+        if aliases:
+            df = apply_aliases(df, aliases)
+        return df
+
+    def _matching_batches(
+        self,
+        source: pa.NativeFile,
+        predicates: list[Predicate],
+        batches: Union[int, slice, list[int], None],
+    ) -> Union[list[int], int, slice, None]:
+        """The selected `batches` which can have rows matching `predicates`; see
+        `BATCH_FILTERS`. Payloads in the IPC stream format have no batch index, and
+        their `batches` are returned unchanged."""
+        reader = open_reader(source)
+        if not isinstance(reader, pa.ipc.RecordBatchFileReader):
+            return batches
+        names = reader.schema.names
+        missing = [column for column, _, _ in predicates if column not in names]
+        if missing:
+            raise KeyError(f"Columns not in stored dataframe: {missing}")
+        positioned = [
+            (names.index(column), op, value) for column, op, value in predicates
+        ]
+        selected = select_batches(reader.num_record_batches, batches)
+        for batch_filter in BATCH_FILTERS:
+            selected = batch_filter(self, positioned, selected)
+        return selected
+
+    def column_metadata(self) -> dict[str, dict]:
+        """Get the column metadata (IRI, unit, etc.) stored with the dataframe, keyed
+        by column label, without loading its data."""
+        return column_metadata_from_schema(self.read_schema())
+
+
+# Tables of the local data store, created by `initialize_local_database`. Modules
+# with side tables of `Dataset` add their models.
+STORE_MODELS = [DataframePayload, Dataset]
+# Functions `(dataset, predicates, batches) -> batches` which drop the record batches
+# that can't match the `predicates` of a `Dataset.read` filter. Predicates are
+# `(column position, operator, value)`. Modules which store batch statistics add
+# theirs.
+BATCH_FILTERS = []
+
+# Functions `(dataset) -> None` which `Dataset.bulk_save` calls on its worker threads
+# before serializing each dataframe, after the `pre_save` signal. Modules whose
+# `pre_save` handlers leave expensive work for later add theirs, so that it runs in
+# parallel. Hooks shouldn't use the database; writes belong in `post_save`, in the
+# transaction of the batch.
+SERIALIZE_HOOKS = []
+
+
+def collect_garbage() -> GarbageCollectionStatistics:
+    """Recount the references to content-addressed payloads, and delete payloads and
+    content files which no dataset references.
+
+    Needed after deleting datasets with `Dataset.delete()` queries, or after failed
+    writes, which can leave payloads behind."""
+    statistics = GarbageCollectionStatistics()
+    database = Dataset._meta.database
+    try:
+        directory = Dataset.dataframe.content_directory
+    except ValueError:
+        directory = None
+
+    # `length()` of a blob doesn't read its content, so inline payloads are skipped
+    # without loading them
+    query = Dataset.select(Dataset.dataframe).where(
+        fn.length(Dataset.dataframe) <= MAX_REFERENCE_LENGTH
+    )
+    references = Counter(
+        bytes(value) for (value,) in database.execute_sql(*query.sql())
+    )
+    counts = Counter()
+    files = set()
+    for reference, count in references.items():
+        if is_reference(reference):
+            counts[reference_digest(reference)] += count
+            if is_file_reference(reference):
+                files.add(reference_digest(reference))
+
+    with database.atomic():
+        stored = {
+            digest: (refcount, size)
+            for digest, refcount, size in DataframePayload.select(
+                DataframePayload.digest,
+                DataframePayload.refcount,
+                DataframePayload.size,
+            ).tuples()
+        }
+        for digest, (refcount, size) in stored.items():
+            if not counts[digest]:
+                DataframePayload.delete().where(
+                    DataframePayload.digest == digest
+                ).execute()
+                statistics.payloads_deleted += 1
+                statistics.bytes_freed += size
+            elif counts[digest] != refcount:
+                DataframePayload.update(refcount=counts[digest]).where(
+                    DataframePayload.digest == digest
+                ).execute()
+        # Files written before reference counting
+        for digest in files - set(stored):
+            path = directory / payload_filename(digest)
+            if path.exists():
+                DataframePayload.create(
+                    digest=digest, size=path.stat().st_size, refcount=counts[digest]
+                )
+
+    if directory is not None and directory.exists():
+        for path in directory.glob("*" + payload_filename("")):
+            if path.stem not in files:
+                statistics.bytes_freed += path.stat().st_size
+                path.unlink(missing_ok=True)
+                statistics.files_deleted += 1
+    logger.info(
+        "Deleted %s payloads and %s files, freeing %.1f MB",
+        statistics.payloads_deleted,
+        statistics.files_deleted,
+        statistics.bytes_freed / 1e6,
+    )
+    return statistics
+
+
+@pre_save(sender=Dataset)
+def drop_generated_values(model_class, instance, created):
+    # Computed by SQLite, and can't be written
+    for field in Dataset._meta.sorted_fields:
+        if isinstance(field, JSONPathField):
+            instance.__data__.pop(field.name, None)
+            instance._dirty.discard(field.name)
 
 
 @pre_save(sender=Dataset)
 def dataframe_translation(model_class, instance, created):
-    instance.dataframe.restore_column_iris()
+    # Don't load deferred dataframes; they haven't changed
+    value = instance.__data__.get("dataframe")
+    if isinstance(value, pd.DataFrame):
+        instance.attach_column_metadata()
+    elif isinstance(value, pa.Table):
+        value = restore_column_iris(value)
+        instance.__data__["dataframe"] = add_column_metadata_to_table(
+            value, match_column_metadata(value.column_names, instance.columns)
+        )
+    elif is_record_batch_stream(value):
+        reader = record_batch_reader(value)
+        schema = add_column_metadata_to_schema(
+            reader.schema, match_column_metadata(reader.schema.names, instance.columns)
+        )
+        instance.__data__["dataframe"] = pa.RecordBatchReader.from_batches(
+            schema, reader
+        )
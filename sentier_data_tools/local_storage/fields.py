@@ -1,55 +1,308 @@
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import StrEnum
-from io import BytesIO
-from typing import Union
+from pathlib import Path
+from typing import Iterator, Optional, Union
 
 import pandas as pd
 import pyarrow as pa
-import rfc3987
-from peewee import BlobField, TextField
+from peewee import SQL, BlobField, FieldAccessor, Node, TextField, fn
 from playhouse.sqlite_ext import JSONField
 from rdflib import URIRef
 
 from sentier_data_tools.iri import GeonamesIRI, ProductIRI
+from sentier_data_tools.iri.validation import is_valid_iri
+from sentier_data_tools.local_storage.binding import instance_database, use_database
+from sentier_data_tools.local_storage.blobs import SQLiteBlobFile, write_blob
+from sentier_data_tools.local_storage.cache import dataframe_cache, share
+from sentier_data_tools.local_storage.config import StorageMode, get_storage_config
+from sentier_data_tools.local_storage.serialization import (
+    MAX_REFERENCE_LENGTH,
+    apply_aliases,
+    deserialize,
+    file_reference,
+    hash_reference,
+    is_file_reference,
+    is_hash_reference,
+    is_reference,
+    is_spooled,
+    open_payload,
+    open_reader,
+    payload_digest,
+    payload_filename,
+    reference_digest,
+    serialize_payload,
+    table_to_dataframe,
+    write_file,
+)
+
+# Directory next to the database file for dataframes stored as Arrow IPC files
+CONTENT_DIRECTORY = "dataframes"
+
+# Large payloads serialized in this context; see `PandasFeatherField.deferred_writes`
+_deferred_writes: ContextVar[Optional[list[memoryview]]] = ContextVar(
+    "sdt_deferred_writes", default=None
+)
+
+
+class DataframeAccessor(FieldAccessor):
+    """Load the dataframe from the database on first access, if the query which
+    created the instance didn't select it. Loaded dataframes are cached, see
+    `DataframeCache`.
+
+    Aliases in `instance.dataframe_aliases` are applied after loading."""
+
+    def __get__(self, instance, instance_type=None):
+        if (
+            instance is not None
+            and self.name not in instance.__data__
+            and instance._pk is not None
+        ):
+            with use_database(instance_database(instance)):
+                df = self._load(instance)
+            if aliases := getattr(instance, "dataframe_aliases", None):
+                df = apply_aliases(df, aliases)
+            instance.__data__[self.name] = df
+        return super().__get__(instance, instance_type)
+
+    def _load(self, instance) -> Union[pd.DataFrame, pa.Table]:
+        key = dataframe_cache.key(
+            self.model._meta.database, instance._pk, instance.__data__.get("version")
+        )
+        df = dataframe_cache.get(key)
+        if df is None:
+            with self.field.open_stored(instance._pk) as source:
+                table = open_reader(source).read_all()
+            df = table_to_dataframe(table)
+            dataframe_cache.put(key, df, table.nbytes)
+            df = share(df)
+        return df
 
 
 class PandasFeatherField(BlobField):
-    def db_value(self, value: Union[pd.DataFrame, pa.Table]) -> BytesIO:
-        if isinstance(value, pd.DataFrame):
-            schema = pa.Schema.from_pandas(value, preserve_index=False)
-            table = pa.Table.from_pandas(value, preserve_index=False)
+    """Store a dataframe, Arrow table, or stream of Arrow record batches as Arrow IPC
+    data.
+
+    Depending on `storage_mode` in the storage config, the IPC data is either stored
+    in the column itself, in a file in the content directory next to the database, or
+    in the `payloads` table; in the last two cases only a reference is stored in the
+    column. Referenced payloads are shared by all datasets with the same content, and
+    counted in the `payloads` table.
+
+    Column metadata in `df.attrs["sdt"]["columns"]` is stored in the Arrow field
+    metadata, and restored to `df.attrs` when reading.
+
+    The dataframe is only loaded when first accessed if it wasn't selected in the
+    query; see `DataframeAccessor`."""
+
+    accessor_class = DataframeAccessor
+
+    def __init__(self, *args, payloads=None, **kwargs):
+        # Model with the content-addressed payloads, see `db.DataframePayload`
+        self.payloads = payloads
+        super().__init__(*args, **kwargs)
+
+    @property
+    def content_directory(self) -> Path:
+        database = self.model._meta.database
+        if hasattr(database, "open_store"):
+            database.open_store()
+        if (
+            not database.database
+            or database.database == ":memory:"
+            or getattr(database, "in_memory", False)
+        ):
+            raise ValueError("Storing dataframes in files requires an on-disk database")
+        return Path(database.database).parent / CONTENT_DIRECTORY
+
+    def serialize(
+        self, value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator]
+    ) -> tuple[Union[bytes, memoryview], Optional[memoryview]]:
+        """Serialize `value` for storage with the current storage config. Returns the
+        value for the column, i.e. the payload itself or a reference to it, and the
+        referenced payload, if any, to count with `add_reference` when the value is
+        stored.
+
+        Doesn't use the database, so it can run on any thread. Large payloads are
+        returned as a view of a memory-mapped temporary file; see `is_spooled`."""
+        payload = serialize_payload(value)
+        storage_mode = get_storage_config().storage_mode
+        if storage_mode == StorageMode.INLINE:
+            return memoryview(payload), None
+
+        digest = payload_digest(payload)
+        if storage_mode == StorageMode.FILE:
+            write_file(payload, self.content_directory / payload_filename(digest))
+            return file_reference(digest), memoryview(payload)
+        return hash_reference(digest), memoryview(payload)
+
+    def add_reference(
+        self, value: Union[bytes, memoryview], payload: Optional[memoryview]
+    ) -> None:
+        """Count the reference `value` from `serialize`, and store its `payload` in
+        the `payloads` table if it's content-addressed and new. Call in the
+        transaction which stores `value`, so that the count is rolled back with it."""
+        if payload is None:
+            return
+        digest = reference_digest(value)
+        if is_file_reference(value):
+            self.payloads.add_reference(digest, len(payload))
         else:
-            schema = value.schema
-            table = value
+            # Only a hash lookup if the payload is already stored
+            self.payloads.add_reference(digest, len(payload), data=payload)
 
-        sink = pa.BufferOutputStream()
-        writer = pa.ipc.new_stream(sink, schema)
-        writer.write_table(table)
-        writer.close()
-        return sink.getvalue().to_pybytes()
+    def db_value(
+        self, value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator]
+    ) -> Union[bytes, memoryview, Node]:
+        if isinstance(value, (bytes, memoryview, Node)):
+            # Already serialized and counted, e.g. by `Dataset.bulk_save`
+            return value
+        payload, referenced = self.serialize(value)
+        self.add_reference(payload, referenced)
+        deferred = _deferred_writes.get()
+        if deferred is not None and is_spooled(payload):
+            # Insert an empty blob and fill it with `write_stored` afterwards
+            deferred.append(payload)
+            return fn.zeroblob(len(payload))
+        return payload
 
-    def python_value(self, value):
-        buffer = pa.py_buffer(value)
-        reader = pa.ipc.open_stream(buffer)
-        return reader.read_all().to_pandas()
+    @contextmanager
+    def deferred_writes(self) -> Iterator[list[memoryview]]:
+        """Collect large payloads instead of passing them to SQLite as query
+        parameters, which SQLite would copy in full. Write each one to its row with
+        `write_stored` after the query, in the same transaction."""
+        token = _deferred_writes.set([])
+        try:
+            yield _deferred_writes.get()
+        finally:
+            _deferred_writes.reset(token)
+
+    def write_stored(self, pk: int, payload: memoryview) -> None:
+        """Fill the empty blob in row `pk` with `payload`, in chunks."""
+        write_blob(
+            self.model._meta.database.connection(),
+            self.model._meta.table_name,
+            self.column_name,
+            pk,
+            payload,
+        )
+
+    def open_payload(self, value: bytes) -> pa.NativeFile:
+        """Open the stored `value` for reading without copying it."""
+        if is_file_reference(value):
+            return open_payload(value, self.content_directory)
+        elif is_hash_reference(value):
+            return pa.BufferReader(
+                self.payloads.get(self.payloads.digest == reference_digest(value)).data
+            )
+        return open_payload(value)
+
+    def _open_blob(self, table: str, column: str, rowid: int) -> SQLiteBlobFile:
+        try:
+            blob = self.model._meta.database.connection().blobopen(
+                table, column, rowid, readonly=True
+            )
+        except sqlite3.OperationalError as exc:
+            raise self.model.DoesNotExist(
+                f"No stored dataframe for id {rowid}"
+            ) from exc
+        return SQLiteBlobFile(blob)
+
+    @contextmanager
+    def open_stored(self, pk: int) -> Iterator[pa.NativeFile]:
+        """Open the payload stored in row `pk` for reading, without first copying the
+        whole blob into a Python `bytes` object.
+
+        Uses SQLite incremental blob I/O. If the database was opened with
+        `check_same_thread=False`, only the parts of the payload which are read, e.g.
+        the footer and the requested columns, are copied out of the database."""
+        reference = self.stored_reference(pk)
+        if reference is not None and is_file_reference(reference):
+            yield self.open_payload(reference)
+            return
+        if reference is not None:
+            table = self.payloads._meta.table_name
+            column = self.payloads.data.column_name
+            rowid = (
+                self.payloads.select(self.payloads.id)
+                .where(self.payloads.digest == reference_digest(reference))
+                .scalar()
+            )
+            if rowid is None:
+                raise self.model.DoesNotExist(f"Missing payload for dataset {pk}")
+        else:
+            table, column, rowid = self.model._meta.table_name, self.column_name, pk
+
+        with self._open_blob(table, column, rowid) as file:
+            if self.model._meta.database.connect_params.get("check_same_thread", True):
+                # Arrow reads files from its own I/O threads, which the `sqlite3`
+                # connection doesn't allow, so we read the whole blob
+                yield pa.BufferReader(file.copy_to_buffer())
+            else:
+                yield pa.PythonFile(file, mode="r")
+
+    def stored_reference(self, pk: int) -> Optional[bytes]:
+        """Get the payload reference stored in row `pk`, or `None` if the payload is
+        stored inline. Doesn't read inline payloads."""
+        with self._open_blob(self.model._meta.table_name, self.column_name, pk) as file:
+            if file.size > MAX_REFERENCE_LENGTH:
+                return None
+            value = file.read()
+        return value if is_reference(value) else None
+
+    def release(self, reference: bytes) -> None:
+        """Remove one reference to a stored payload, deleting the payload (and its
+        file) if no references are left."""
+        if self.payloads.release(reference_digest(reference)) and is_file_reference(
+            reference
+        ):
+            (
+                self.content_directory / payload_filename(reference_digest(reference))
+            ).unlink(missing_ok=True)
+
+    def python_value(self, value: bytes) -> Union[pd.DataFrame, pa.Table]:
+        return deserialize(self.open_payload(value))
 
 
 class IRIField(TextField):
-    def db_value(self, value: str) -> str:
+    def db_value(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
         if isinstance(value, URIRef):
             value = str(value)
-        if not rfc3987.match(value):
+        if not is_valid_iri(value):
             raise ValueError(f"`IRIField` requires a valid IRI; got {value}")
         return value
 
 
 class ProductIRIField(IRIField):
     def python_value(self, value):
-        return ProductIRI(value)
+        return None if value is None else ProductIRI(value)
 
 
 class GeonamesIRIField(IRIField):
     def python_value(self, value):
-        return GeonamesIRI(value)
+        return None if value is None else GeonamesIRI(value)
+
+
+class JSONPathField(TextField):
+    """Read-only projection of a JSON path of another column, as a virtual generated
+    column computed by SQLite. Nothing is stored, but the column can be indexed, so
+    filtering on it doesn't parse the JSON of every row.
+
+    Values are not written on save, and are only updated when the row is selected
+    again. Must come after blob columns: `sqlite3_blob_open` addresses the wrong
+    column when a virtual column precedes it."""
+
+    def __init__(self, path: str, source: str = "metadata", **kwargs):
+        self.path = path
+        self.source = source
+        # `path` and `source` are defined in code, not user input
+        generated = SQL(
+            f"GENERATED ALWAYS AS (json_extract(\"{source}\", '{path}')) VIRTUAL"
+        )
+        super().__init__(null=True, constraints=[generated], **kwargs)
 
 
 # Ideally these would be IRIs in the vocab, and be better informed by standards and provenance
@@ -0,0 +1,229 @@
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from peewee import Database, SchemaManager, fn
+from pydantic import BaseModel
+
+from sentier_data_tools.local_storage.binding import use_database
+from sentier_data_tools.local_storage.cache import dataframe_cache
+from sentier_data_tools.local_storage.db import (
+    STORE_MODELS,
+    DataframePayload,
+    Dataset,
+    LocalDatabase,
+    initialize_local_database,
+)
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import (
+    MAX_REFERENCE_LENGTH,
+    is_reference,
+    reference_digest,
+)
+from sentier_data_tools.logs import stdout_feedback_logger as logger
+
+# Files SQLite keeps next to the database file
+SIDE_FILE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def _database(db: Optional[Database]) -> Database:
+    return db or Dataset._meta.database
+
+
+def _content_directory(db: Database) -> Optional[Path]:
+    # Of `db`, not of the database the models are bound to
+    with use_database(db):
+        try:
+            return Dataset.dataframe.content_directory
+        except ValueError:
+            return None
+
+
+def reset_store(db: Optional[Database] = None, swap_file: bool = True) -> None:
+    """Delete all datasets and stored payloads.
+
+    For an on-disk `LocalDatabase`, the database file is deleted and a new one is
+    created on next use, which takes constant time and frees the disk space.
+    Processes which still have the old file open keep reading it until they
+    reopen the store. Otherwise, or if the file can't be deleted (e.g. it is open
+    on Windows), the tables are dropped and created again."""
+    db = _database(db)
+    directory = _content_directory(db)
+    dataframe_cache.clear()
+
+    swapped = False
+    if swap_file and isinstance(db, LocalDatabase):
+        db.open_store()
+        if not db.in_memory:
+            path = Path(db.database)
+            db.close_store()
+            try:
+                for file in [path] + [
+                    path.with_name(path.name + suffix) for suffix in SIDE_FILE_SUFFIXES
+                ]:
+                    file.unlink(missing_ok=True)
+                swapped = True
+            except PermissionError:
+                logger.warning("Can't delete %s; dropping tables instead", path)
+
+    if not swapped:
+        with db.atomic():
+            for model in reversed(STORE_MODELS):
+                SchemaManager(model, database=db).drop_all(safe=True)
+        initialize_local_database(db)
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def reset_local_database() -> None:
+    """Delete all datasets in the local data store; see `reset_store`."""
+    reset_store()
+
+
+def vacuum(db: Optional[Database] = None) -> None:
+    """Rebuild the database file without free pages. Slow for large stores, and
+    needs free disk space for a full copy.
+
+    Also enables incremental vacuuming for stores created before it was the
+    default."""
+    db = _database(db)
+    db.pragma("auto_vacuum", "incremental")
+    db.execute_sql("VACUUM")
+
+
+def incremental_vacuum(
+    max_pages: Optional[int] = None, db: Optional[Database] = None
+) -> int:
+    """Return up to `max_pages` (default all) free pages to the file system. Fast,
+    and can be run while the store is in use. Returns the number of pages freed."""
+    db = _database(db)
+    if db.pragma("auto_vacuum") != 2:
+        logger.warning("Incremental vacuum not enabled for this store; run `vacuum`")
+        return 0
+    before = db.pragma("freelist_count")
+    # `sqlite3` cursors stop this pragma after one page; `executescript` runs it to
+    # completion
+    db.connection().executescript(f"PRAGMA incremental_vacuum({int(max_pages or 0)})")
+    return before - db.pragma("freelist_count")
+
+
+def analyze(db: Optional[Database] = None, limit: Optional[int] = None) -> None:
+    """Update the statistics the query planner uses to choose indexes. With a
+    `limit`, only about that many rows of each index are sampled."""
+    db = _database(db)
+    if limit is not None:
+        db.pragma("analysis_limit", limit)
+    db.execute_sql("ANALYZE")
+
+
+class PayloadBytes(BaseModel):
+    kind: DatasetKind
+    product: Optional[str]
+    datasets: int
+    # Stored in the `dataset` table
+    inline_bytes: int
+    # Stored in the payload table or content files; shared payloads are counted
+    # for every dataset which references them
+    referenced_bytes: int
+
+
+class StoreStatistics(BaseModel):
+    row_counts: dict[str, int]
+    payload_bytes: list[PayloadBytes]
+    page_size: int
+    page_count: int
+    freelist_count: int
+    content_files: int = 0
+    content_bytes: int = 0
+
+    @property
+    def file_bytes(self) -> int:
+        return self.page_size * self.page_count
+
+    @property
+    def free_bytes(self) -> int:
+        return self.page_size * self.freelist_count
+
+    @property
+    def fragmentation(self) -> float:
+        """Share of the database file which is free pages."""
+        return self.freelist_count / self.page_count if self.page_count else 0.0
+
+
+def store_statistics(db: Optional[Database] = None) -> StoreStatistics:
+    """Collect row counts, payload sizes by kind and product, and page usage,
+    without reading any payloads."""
+    db = _database(db)
+    row_counts = {
+        model._meta.table_name: model.select().count(db) for model in STORE_MODELS
+    }
+
+    # Raw rows, so that products stay strings (IRI objects aren't equal to strings).
+    # `length()` of a blob doesn't read its content.
+    groups = {}
+    query = Dataset.select(
+        Dataset.kind,
+        Dataset.product,
+        fn.COUNT(Dataset.id),
+        fn.SUM(fn.length(Dataset.dataframe)),
+    ).group_by(Dataset.kind, Dataset.product)
+    for kind, product, count, size in db.execute_sql(*query.sql()):
+        groups[(kind, product)] = PayloadBytes(
+            kind=Dataset.kind.python_value(kind),
+            product=product,
+            datasets=count,
+            inline_bytes=size or 0,
+            referenced_bytes=0,
+        )
+
+    sizes = dict(
+        DataframePayload.select(DataframePayload.digest, DataframePayload.size)
+        .tuples()
+        .execute(db)
+    )
+    query = Dataset.select(Dataset.kind, Dataset.product, Dataset.dataframe).where(
+        fn.length(Dataset.dataframe) <= MAX_REFERENCE_LENGTH
+    )
+    for kind, product, value in db.execute_sql(*query.sql()):
+        if is_reference(bytes(value)):
+            group = groups[(kind, product)]
+            group.inline_bytes -= len(value)
+            group.referenced_bytes += sizes.get(reference_digest(value), 0)
+
+    statistics = StoreStatistics(
+        row_counts=row_counts,
+        payload_bytes=sorted(
+            groups.values(), key=lambda obj: obj.inline_bytes + obj.referenced_bytes
+        )[::-1],
+        page_size=db.pragma("page_size"),
+        page_count=db.pragma("page_count"),
+        freelist_count=db.pragma("freelist_count"),
+    )
+    directory = _content_directory(db)
+    if directory is not None and directory.exists():
+        files = [path for path in directory.iterdir() if path.is_file()]
+        statistics.content_files = len(files)
+        statistics.content_bytes = sum(path.stat().st_size for path in files)
+    return statistics
+
+
+def print_store_statistics(db: Optional[Database] = None) -> None:
+    statistics = store_statistics(db)
+    for table, count in statistics.row_counts.items():
+        print(f"{table}: {count} rows")
+    print(
+        f"File: {statistics.file_bytes / 1e6:.1f} MB, of which "
+        f"{statistics.free_bytes / 1e6:.1f} MB free pages "
+        f"({statistics.fragmentation:.0%})"
+    )
+    if statistics.content_files:
+        print(
+            f"Content files: {statistics.content_files}, "
+            f"{statistics.content_bytes / 1e6:.1f} MB"
+        )
+    for group in statistics.payload_bytes:
+        print(
+            f"{group.kind} | {group.product or '-'}: {group.datasets} datasets, "
+            f"{group.inline_bytes / 1e6:.1f} MB inline, "
+            f"{group.referenced_bytes / 1e6:.1f} MB referenced"
+        )
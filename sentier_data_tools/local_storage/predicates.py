@@ -0,0 +1,94 @@
+import operator
+from typing import Any, Optional, Union
+
+import pyarrow.compute as pc
+
+# Comparison operators for `(operator, value)` predicates
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# `(column, operator, value)`; the operator is one of `OPERATORS` or "in"
+Predicate = tuple[str, str, Any]
+
+
+def parse_predicates(predicates: dict) -> list[Predicate]:
+    """Convert a dict of predicates to `(column, operator, value)` tuples. All
+    predicates must hold:
+
+    ```python
+    {
+        company_iri: "Nel",              # equal
+        location_iri: ["DE", "FR"],      # one of
+        year_iri: (">=", 2020),          # compared with `OPERATORS`
+    }
+    ```
+
+    """
+    parsed = []
+    for column, value in predicates.items():
+        if isinstance(value, (list, set, frozenset)):
+            parsed.append((str(column), "in", list(value)))
+        elif isinstance(value, tuple):
+            if len(value) != 2 or value[0] not in OPERATORS:
+                raise ValueError(
+                    f"Predicate for {column} must be `(operator, value)` with an "
+                    f"operator in {list(OPERATORS)}; got {value}"
+                )
+            parsed.append((str(column), *value))
+        else:
+            parsed.append((str(column), "==", value))
+    return parsed
+
+
+def predicates_expression(predicates: list[Predicate]) -> Optional[pc.Expression]:
+    """All `predicates` as one Arrow compute expression; `None` if there are none."""
+    expression = None
+    for column, op, value in predicates:
+        field = pc.field(column)
+        condition = (
+            field.isin(value) if op == "in" else OPERATORS[op](field, pc.scalar(value))
+        )
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def could_match(op: str, value: Any, count: int, minimum: Any, maximum: Any) -> bool:
+    """Check if a predicate can hold for any value of a column (or record batch)
+    with `count` non-null values between `minimum` and `maximum`.
+
+    Only says no when sure: for unknown bounds, incomparable types, and `!=`
+    (which NaN values, not included in the bounds, would satisfy), it says yes."""
+    values = value if op == "in" else [value]
+    if op == "in" and any(obj is None for obj in values):
+        # Membership tests match nulls
+        return True
+    if not count:
+        # Comparisons with null are never true
+        return False
+    if minimum is None or maximum is None or op == "!=" or value is None:
+        return True
+    try:
+        if op in ("==", "in"):
+            return any(minimum <= obj <= maximum for obj in values)
+        elif op in ("<", "<="):
+            return OPERATORS[op](minimum, value)
+        return OPERATORS[op](maximum, value)
+    except TypeError:
+        return True
+
+
+def filter_expression(
+    filter: Union[pc.Expression, dict],
+) -> tuple[Optional[pc.Expression], Optional[list[Predicate]]]:
+    """The Arrow expression of a `Dataset.read` filter, and its predicates if it is
+    a dict."""
+    if isinstance(filter, pc.Expression):
+        return filter, None
+    predicates = parse_predicates(filter)
+    return predicates_expression(predicates), predicates
@@ -0,0 +1,53 @@
+from peewee import Query
+
+from sentier_data_tools.local_storage.column_index import datasets_with_column
+from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.fields import DatasetKind
+
+EXAMPLE_PRODUCT = "https://vocab.sentier.dev/products/pem-electrolyzer"
+EXAMPLE_LOCATION = "https://sws.geonames.org/6255148/"
+EXAMPLE_COLUMN = "https://vocab.sentier.dev/model-terms/generic/electric_power"
+EXAMPLE_UNIT = "https://vocab.sentier.dev/units/unit/KiloW"
+EXAMPLE_DETERMINING_VALUE = (
+    "https://vocab.sentier.dev/model-terms/energy/nom_power_cons"
+)
+
+
+def standard_queries() -> dict[str, Query]:
+    """The queries the library runs most often, with example values."""
+    return {
+        "model data, exact product": Dataset.select().where(
+            Dataset.kind == DatasetKind.PARAMETERS,
+            Dataset.product == EXAMPLE_PRODUCT,
+        ),
+        "model data, broader or narrower products": Dataset.select().where(
+            Dataset.kind == DatasetKind.PARAMETERS,
+            Dataset.product << [EXAMPLE_PRODUCT, "https://example.com/other"],
+        ),
+        "broad data by location": Dataset.select().where(
+            Dataset.kind == DatasetKind.BROAD,
+            Dataset.location == EXAMPLE_LOCATION,
+        ),
+        "latest version per name": Dataset.latest(),
+        "catalog": Dataset.catalog(Dataset.kind == DatasetKind.BOM),
+        "BOM by determining value": Dataset.with_metadata(
+            Dataset.kind == DatasetKind.BOM,
+            determining_value=EXAMPLE_DETERMINING_VALUE,
+        ),
+        "datasets with column": datasets_with_column(EXAMPLE_COLUMN, unit=EXAMPLE_UNIT),
+    }
+
+
+def explain_query_plan(query: Query) -> list[str]:
+    """Get the SQLite `EXPLAIN QUERY PLAN` output for `query`, one line per step."""
+    sql, params = query.sql()
+    cursor = query.model._meta.database.execute_sql("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def print_query_plans() -> None:
+    """Print the query plan of each of the `standard_queries`."""
+    for label, query in standard_queries().items():
+        print(label)
+        for line in explain_query_plan(query):
+            print("    " + line)
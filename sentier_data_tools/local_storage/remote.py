@@ -0,0 +1,267 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import urllib.request
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Optional, Union
+from urllib.parse import urljoin
+
+import pandas as pd
+import platformdirs
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sentier_data_tools.data_source_base import (
+    DatasetRecord,
+    DataSourceBase,
+    Products,
+    record_matches,
+)
+from sentier_data_tools.local_storage.datasource import CATALOG_NAME
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import (
+    read_table,
+    table_to_dataframe,
+)
+
+# Remote files are fetched and cached in chunks of this many bytes. Small enough
+# that reading one column of a wide file doesn't fetch the others, large enough
+# that the Arrow and Parquet footers usually fit in one request.
+CHUNK_SIZE = 256 * 1024
+cache_dir_platformdirs = (
+    Path(platformdirs.user_cache_dir(appname="sentier.dev", appauthor="DdS"))
+    / "remote-chunks"
+)
+
+
+class ChunkCache:
+    """Chunks of remote files on local disk, so that a dataset read once is read
+    from disk afterwards, even by other processes.
+
+    Chunks are keyed by a token of the file URL and its ETag (or modification time
+    and size), so changed files are fetched again. Chunks are written to a temporary
+    name and renamed, so concurrent readers never see partial chunks."""
+
+    def __init__(self, directory: Union[Path, str, None] = None):
+        self.directory = Path(directory or cache_dir_platformdirs)
+
+    def path(self, token: str, index: int) -> Path:
+        return self.directory / token[:2] / f"{token}-{index}"
+
+    def get(self, token: str, index: int) -> Optional[bytes]:
+        try:
+            return self.path(token, index).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, token: str, index: int, data: bytes) -> None:
+        path = self.path(token, index)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+
+    def size(self) -> int:
+        """Total size of the cached chunks in bytes."""
+        if not self.directory.exists():
+            return 0
+        return sum(path.stat().st_size for path in self.directory.glob("*/*-*"))
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class RangeFile(io.RawIOBase):
+    """Read-only, seekable file over HTTP range requests, read through a
+    `ChunkCache`. Each read fetches the chunks it covers which are not cached yet,
+    with one request per run of consecutive missing chunks.
+
+    Wrap in `pyarrow.PythonFile` to read it with Arrow."""
+
+    def __init__(
+        self,
+        url: str,
+        cache: ChunkCache,
+        chunk_size: int = CHUNK_SIZE,
+        timeout: float = 30,
+    ):
+        super().__init__()
+        self.url = url
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            self.size = int(response.headers["Content-Length"])
+            version = response.headers.get("ETag") or (
+                f"{response.headers.get('Last-Modified')} {self.size}"
+            )
+        self.token = hashlib.sha256(f"{url}\n{version}".encode()).hexdigest()
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(offset, 0)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else self._position + size
+        end = min(end, self.size)
+        if end <= self._position:
+            return b""
+        data = self.read_range(self._position, end)
+        self._position = end
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def read_range(self, start: int, end: int) -> bytes:
+        first, last = start // self.chunk_size, (end - 1) // self.chunk_size
+        chunks = {
+            index: self.cache.get(self.token, index) for index in range(first, last + 1)
+        }
+        missing = [index for index, data in chunks.items() if data is None]
+        while missing:
+            run = 1
+            while run < len(missing) and missing[run] == missing[0] + run:
+                run += 1
+            chunks.update(self._fetch(missing[0], missing[run - 1]))
+            missing = missing[run:]
+        data = b"".join(chunks[index] for index in range(first, last + 1))
+        offset = first * self.chunk_size
+        return data[start - offset : end - offset]
+
+    def _fetch(self, first: int, last: int) -> dict[int, bytes]:
+        """Fetch chunks `first` to `last` in one request, and cache them."""
+        start = first * self.chunk_size
+        end = min((last + 1) * self.chunk_size, self.size)
+        request = urllib.request.Request(
+            self.url, headers={"Range": f"bytes={start}-{end - 1}"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+        if response.status != 206:
+            # Server without range support: we got the whole file
+            first, last, start = 0, (self.size - 1) // self.chunk_size, 0
+        chunks = {}
+        for index in range(first, last + 1):
+            offset = index * self.chunk_size - start
+            chunks[index] = data[offset : offset + self.chunk_size]
+            self.cache.put(self.token, index, chunks[index])
+        return chunks
+
+
+class RemoteDataSource(DataSourceBase):
+    """Read-only data source for dataset files in object storage, or on any HTTP
+    server which supports range requests.
+
+    `base_url` serves a `CATALOG_NAME` with the attributes and file name of each
+    dataset, as written by `ParquetDataSource.write_catalog`, and the dataset files,
+    in Parquet or Arrow IPC file format (by extension). Reading a dataset fetches
+    only the file footer and the chunks of the requested columns; chunks are cached
+    on disk, see `ChunkCache`.
+
+    ```python
+    source = RemoteDataSource("https://example.com/datasets/")
+    record = source.query(product=product_iri)[0]
+    record.read(columns=[power_iri])
+    ```
+
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        cache_directory: Union[Path, str, None] = None,
+        chunk_size: int = CHUNK_SIZE,
+        timeout: float = 30,
+    ):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.cache = ChunkCache(cache_directory)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._catalog: Optional[list[dict]] = None
+        self._lock = threading.Lock()
+
+    def catalog(self) -> list[dict]:
+        """The entries of the remote catalog; fetched on first use."""
+        with self._lock:
+            if self._catalog is None:
+                url = urljoin(self.base_url, CATALOG_NAME)
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    self._catalog = json.loads(response.read())
+            return self._catalog
+
+    def refresh(self) -> None:
+        """Fetch the catalog again on the next query."""
+        with self._lock:
+            self._catalog = None
+
+    def query(
+        self,
+        product: Products = None,
+        kind: Optional[DatasetKind] = None,
+        location: Products = None,
+        begin: Union[date, datetime, None] = None,
+        end: Union[date, datetime, None] = None,
+    ) -> list[DatasetRecord]:
+        records = [
+            DatasetRecord.stored(self, key=entry["file"], **entry)
+            for entry in self.catalog()
+        ]
+        return [
+            record
+            for record in records
+            if record_matches(record, product, kind, location, begin, end)
+        ]
+
+    def open(self, key: str) -> RangeFile:
+        return RangeFile(
+            urljoin(self.base_url, key), self.cache, self.chunk_size, self.timeout
+        )
+
+    def load(self, record: DatasetRecord) -> Union[pd.DataFrame, pa.Table]:
+        return self.read(record)
+
+    def read(
+        self, record: DatasetRecord, columns: Optional[list[str]] = None
+    ) -> Union[pd.DataFrame, pa.Table]:
+        if columns is not None:
+            columns = [str(column) for column in columns]
+        with pa.PythonFile(self.open(record.key), mode="r") as source:
+            if record.key.endswith(".parquet"):
+                table = pq.ParquetFile(source).read(
+                    columns=columns, use_pandas_metadata=True
+                )
+            else:
+                table = read_table(source, columns)
+        return table_to_dataframe(table)
+
+    def bulk_save(self, records: Iterable[DatasetRecord]) -> int:
+        raise NotImplementedError(
+            "`RemoteDataSource` is read-only; write datasets with `ParquetDataSource`"
+            " and upload the directory with its catalog"
+        )
@@ -0,0 +1,494 @@
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from sentier_data_tools.local_storage.config import (
+    Compression,
+    ReadMode,
+    StorageConfig,
+    get_storage_config,
+)
+from sentier_data_tools.logs import stdout_feedback_logger as logger
+
+# Key in the Arrow field metadata under which we store the column metadata (IRI, unit,
+# assembly, comment) as a JSON object.
+COLUMN_METADATA_KEY = b"sdt"
+# Stored in the `dataframe` column instead of the payload when the payload is a file
+FILE_REFERENCE_PREFIX = b"sdt-file:"
+# Stored in the `dataframe` column instead of the payload when the payload is in the
+# content-addressed payload table
+HASH_REFERENCE_PREFIX = b"sdt-hash:"
+# References are the prefix plus a SHA-256 hex digest and maybe a file extension;
+# anything longer is a payload
+MAX_REFERENCE_LENGTH = 128
+ARROW_FILE_MAGIC = b"ARROW1"
+# Key in the Arrow schema metadata for the compression codec used
+COMPRESSION_METADATA_KEY = b"sdt:compression"
+# Key in the Arrow schema metadata for the IRIs of aliased columns
+ALIASES_METADATA_KEY = b"sdt:aliases"
+
+
+def match_column_metadata(columns: list, metadata: list[dict]) -> dict[str, dict]:
+    """Match the entries of `Dataset.columns` to the dataframe column labels.
+
+    The metadata is matched by position if the lengths are the same, and by the `iri`
+    key otherwise. Columns without matching metadata are left out."""
+    if len(columns) == len(metadata):
+        return {str(column): dict(obj) for column, obj in zip(columns, metadata)}
+    by_iri = {obj["iri"]: obj for obj in metadata if "iri" in obj}
+    return {str(column): dict(by_iri[column]) for column in columns if column in by_iri}
+
+
+def update_column_metadata(
+    columns: list, metadata: list[dict], updates: dict[str, dict]
+) -> list[dict]:
+    """Replace the entries of `Dataset.columns` matched to the dataframe column labels
+    (see `match_column_metadata`) by their entries in `updates`. The other entries
+    are kept, in their order."""
+    if len(columns) == len(metadata):
+        return [updates.get(str(column), obj) for column, obj in zip(columns, metadata)]
+    labels = {str(column) for column in columns}
+    return [
+        updates.get(obj["iri"], obj) if obj.get("iri") in labels else obj
+        for obj in metadata
+    ]
+
+
+def column_metadata_from_schema(schema: pa.Schema) -> dict[str, dict]:
+    """Get the column metadata stored in the Arrow field metadata of `schema`."""
+    return {
+        field.name: json.loads(field.metadata[COLUMN_METADATA_KEY])
+        for field in schema
+        if field.metadata and COLUMN_METADATA_KEY in field.metadata
+    }
+
+
+def add_column_metadata_to_schema(
+    schema: pa.Schema, metadata: dict[str, dict]
+) -> pa.Schema:
+    """Store `metadata` in the Arrow field metadata of `schema`."""
+    fields = []
+    for field in schema:
+        if field.name in metadata:
+            field = field.with_metadata(
+                (field.metadata or {})
+                | {COLUMN_METADATA_KEY: json.dumps(metadata[field.name])}
+            )
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def add_column_metadata_to_table(
+    table: pa.Table, metadata: dict[str, dict]
+) -> pa.Table:
+    """Store `metadata` in the Arrow field metadata of `table`. Doesn't copy any
+    data."""
+    schema = add_column_metadata_to_schema(table.schema, metadata)
+    return pa.Table.from_arrays(table.columns, schema=schema)
+
+
+def is_record_batch_stream(value) -> bool:
+    """Check if `value` is a `pyarrow.RecordBatchReader` or an iterator (e.g. a
+    generator) of record batches, rather than a complete dataframe or a serialized
+    payload. Other iterables, like lists or strings, aren't streams."""
+    return isinstance(value, (pa.RecordBatchReader, Iterator))
+
+
+def record_batch_reader(
+    value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator],
+    batch_size: Optional[int] = None,
+) -> pa.RecordBatchReader:
+    """Get `value` as a stream of record batches of at most `batch_size` rows.
+
+    Dataframes are converted to Arrow one batch at a time, so there is never a second
+    copy of the whole dataframe in memory. Batches of other streams are passed on
+    as they are."""
+    batch_size = batch_size or get_storage_config().record_batch_size
+    if isinstance(value, pd.DataFrame):
+        # Infer the schema from the whole dataframe, so that e.g. a batch with only
+        # missing values doesn't get a different type
+        schema = pa.Schema.from_pandas(value, preserve_index=False)
+        if metadata := value.attrs.get("sdt", {}).get("columns"):
+            schema = add_column_metadata_to_schema(schema, metadata)
+        return pa.RecordBatchReader.from_batches(
+            schema,
+            (
+                pa.RecordBatch.from_pandas(
+                    value.iloc[start : start + batch_size],
+                    schema=schema,
+                    preserve_index=False,
+                )
+                for start in range(0, len(value), batch_size)
+            ),
+        )
+    elif isinstance(value, pa.Table):
+        return value.to_reader(max_chunksize=batch_size)
+    elif isinstance(value, pa.RecordBatchReader):
+        return value
+    elif not isinstance(value, Iterator):
+        raise TypeError(
+            "Expected a dataframe, Arrow table, or stream of record batches; got "
+            f"{type(value).__name__}"
+        )
+    first = next(value, None)
+    if first is None:
+        raise ValueError("Can't store an empty stream of record batches")
+    elif not isinstance(first, pa.RecordBatch):
+        raise TypeError(
+            f"Expected a stream of record batches; got {type(first).__name__}"
+        )
+    return pa.RecordBatchReader.from_batches(
+        first.schema, itertools.chain([first], value)
+    )
+
+
+def table_to_dataframe(
+    table: pa.Table, read_mode: Optional[ReadMode] = None
+) -> Union[pd.DataFrame, pa.Table]:
+    """Convert an Arrow table to the type given by `read_mode` (default from the
+    storage config). Dataframes get the column metadata in `df.attrs`, restored from
+    the Arrow field metadata."""
+    read_mode = read_mode or get_storage_config().read_mode
+    if read_mode == ReadMode.ARROW:
+        return table
+    elif read_mode == ReadMode.ARROW_DTYPE:
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        df = table.to_pandas()
+    metadata = column_metadata_from_schema(table.schema)
+    if metadata:
+        df.attrs.setdefault("sdt", {})["columns"] = metadata
+    return df
+
+
+def choose_compression(table: pa.Table, config: StorageConfig) -> Optional[str]:
+    """Get the Arrow IPC compression codec for `table`, or `None` for uncompressed.
+
+    Arrow applies one codec to all column buffers of a record batch, so with
+    `Compression.AUTO` the codec is chosen from the columns of the whole table:
+    small tables aren't compressed, tables where most bytes are in string or binary
+    columns use ZSTD for its better ratio, and other tables LZ4 for its faster
+    decompression."""
+    compression = config.compression
+    if compression == Compression.AUTO:
+        if table.nbytes < config.compression_min_bytes:
+            return None
+        text_bytes = sum(
+            column.nbytes
+            for field, column in zip(table.schema, table.columns)
+            if pa.types.is_string(field.type)
+            or pa.types.is_large_string(field.type)
+            or pa.types.is_binary(field.type)
+            or pa.types.is_large_binary(field.type)
+            or pa.types.is_dictionary(field.type)
+        )
+        compression = (
+            Compression.ZSTD if 2 * text_bytes >= table.nbytes else Compression.LZ4
+        )
+    if compression == Compression.NONE:
+        return None
+    if not pa.Codec.is_available(compression.value):
+        logger.warning("Compression codec %s not available", compression.value)
+        return None
+    return compression.value
+
+
+def write_ipc(
+    value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator],
+    sink: pa.NativeFile,
+) -> None:
+    """Write `value` to `sink` as an Arrow IPC file, one record batch at a time, using
+    the current storage config.
+
+    For streams, `Compression.AUTO` chooses the codec from the first record batch."""
+    config = get_storage_config()
+    reader = record_batch_reader(value, config.record_batch_size)
+    batches = iter(reader)
+    first = next(batches, None)
+    codec = choose_compression(
+        reader.schema.empty_table() if first is None else first, config
+    )
+    schema = reader.schema.with_metadata(
+        (reader.schema.metadata or {}) | {COMPRESSION_METADATA_KEY: codec or "none"}
+    )
+    if codec and config.compression_level is not None:
+        codec = pa.Codec(codec, config.compression_level)
+
+    options = pa.ipc.IpcWriteOptions(compression=codec)
+    with pa.ipc.new_file(sink, schema, options=options) as writer:
+        for batch in itertools.chain([] if first is None else [first], batches):
+            for start in range(0, batch.num_rows, config.record_batch_size):
+                writer.write_batch(batch.slice(start, config.record_batch_size))
+
+
+def write_ipc_buffer(
+    value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator],
+) -> pa.Buffer:
+    """Serialize to an Arrow IPC file in memory, using the current storage config."""
+    sink = pa.BufferOutputStream()
+    write_ipc(value, sink)
+    return sink.getvalue()
+
+
+def spool_ipc(
+    value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator],
+) -> mmap.mmap:
+    """Serialize to an anonymous temporary Arrow IPC file, and map it into memory.
+
+    Only one record batch is held in memory while writing, and the mapped file can
+    be passed to SQLite or hashed without reading it into memory first. The file is
+    deleted when the map is closed or garbage collected."""
+    with tempfile.TemporaryFile() as tmp:
+        write_ipc(value, pa.PythonFile(tmp, mode="w"))
+        tmp.flush()
+        return mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def serialize_payload(
+    value: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Iterator],
+) -> Union[pa.Buffer, mmap.mmap]:
+    """Serialize to an Arrow IPC file in memory, or for streams and dataframes of at
+    least `spool_min_bytes`, to a temporary file; see `spool_ipc`."""
+    if isinstance(value, pd.DataFrame):
+        size = value.memory_usage(index=False).sum()
+    elif isinstance(value, pa.Table):
+        size = value.nbytes
+    else:
+        return spool_ipc(value)
+    if size >= get_storage_config().spool_min_bytes:
+        return spool_ipc(value)
+    return write_ipc_buffer(value)
+
+
+def payload_compression(schema: pa.Schema) -> Optional[str]:
+    """Get the compression codec recorded in the schema of a stored payload. Returns
+    `None` for payloads written before the codec was recorded."""
+    if schema.metadata and COMPRESSION_METADATA_KEY in schema.metadata:
+        return schema.metadata[COMPRESSION_METADATA_KEY].decode()
+    return None
+
+
+def apply_aliases(
+    value: Union[pd.DataFrame, pa.Table], aliases: dict
+) -> Union[pd.DataFrame, pa.Table]:
+    """Rename columns with `aliases`. Dataframes are changed in place, while a renamed
+    copy is returned for Arrow tables. Tables record the IRIs of the renamed columns
+    in their schema metadata, like dataframes do in `df.attrs`, for
+    `restore_column_iris`."""
+    if isinstance(value, pa.Table):
+        aliases = {str(key): alias for key, alias in aliases.items()}
+        metadata = dict(value.schema.metadata or {})
+        mapping = json.loads(metadata.get(ALIASES_METADATA_KEY, b"{}"))
+        for name in value.column_names:
+            if name in aliases:
+                mapping[aliases[name]] = mapping.pop(name, name)
+        metadata[ALIASES_METADATA_KEY] = json.dumps(mapping).encode()
+        return value.rename_columns(
+            [aliases.get(name, name) for name in value.column_names]
+        ).replace_schema_metadata(metadata)
+    return value.apply_aliases(aliases)
+
+
+def restore_column_iris(
+    value: Union[pd.DataFrame, pa.Table],
+) -> Union[pd.DataFrame, pa.Table]:
+    """Undo `apply_aliases`. Dataframes are changed in place, while a renamed copy is
+    returned for Arrow tables."""
+    if isinstance(value, pd.DataFrame):
+        return value.restore_column_iris()
+    metadata = dict(value.schema.metadata or {})
+    if ALIASES_METADATA_KEY not in metadata:
+        return value
+    mapping = json.loads(metadata.pop(ALIASES_METADATA_KEY))
+    return value.rename_columns(
+        [mapping.get(name, name) for name in value.column_names]
+    ).replace_schema_metadata(metadata or None)
+
+
+def is_spooled(payload) -> bool:
+    """Check if `payload` is a view of a temporary file from `spool_ipc`."""
+    return isinstance(payload, memoryview) and isinstance(payload.obj, mmap.mmap)
+
+
+def serialize(value: Union[pd.DataFrame, pa.Table]) -> bytes:
+    """Serialize to an Arrow IPC file.
+
+    Unlike the IPC stream format, the file format has a footer with the location of
+    each record batch, so batches and columns can be read without decoding the rest."""
+    return write_ipc_buffer(value).to_pybytes()
+
+
+def payload_digest(buffer: Union[pa.Buffer, mmap.mmap, bytes]) -> str:
+    """Content hash under which a serialized payload is stored."""
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def payload_filename(digest: str) -> str:
+    return digest + ".arrow"
+
+
+def write_file(buffer: Union[pa.Buffer, mmap.mmap], path: Path) -> bool:
+    """Write `buffer` to `path` unless the file already exists. Returns `True` if the
+    file was written.
+
+    Files are named after the hash of their contents, so an existing file already has
+    the same contents."""
+    if path.exists():
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial file
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+        tmp.write(buffer)
+    os.replace(tmp.name, path)
+    return True
+
+
+def file_reference(digest: str) -> bytes:
+    return FILE_REFERENCE_PREFIX + payload_filename(digest).encode()
+
+
+def hash_reference(digest: str) -> bytes:
+    return HASH_REFERENCE_PREFIX + digest.encode()
+
+
+def is_file_reference(value: bytes) -> bool:
+    return bytes(value[: len(FILE_REFERENCE_PREFIX)]) == FILE_REFERENCE_PREFIX
+
+
+def is_hash_reference(value: bytes) -> bool:
+    return bytes(value[: len(HASH_REFERENCE_PREFIX)]) == HASH_REFERENCE_PREFIX
+
+
+def is_reference(value: bytes) -> bool:
+    return len(value) <= MAX_REFERENCE_LENGTH and (
+        is_file_reference(value) or is_hash_reference(value)
+    )
+
+
+def reference_digest(value: bytes) -> str:
+    """Get the payload digest from a file or hash reference."""
+    if is_file_reference(value):
+        return Path(bytes(value[len(FILE_REFERENCE_PREFIX) :]).decode()).stem
+    elif is_hash_reference(value):
+        return bytes(value[len(HASH_REFERENCE_PREFIX) :]).decode()
+    raise ValueError("Not a payload reference")
+
+
+def open_payload(value: bytes, directory: Optional[Path] = None) -> pa.NativeFile:
+    """Open a stored payload for reading without copying it.
+
+    Payloads stored in files are memory-mapped, so only the pages which are actually
+    read are loaded from disk."""
+    if is_file_reference(value):
+        if directory is None:
+            raise ValueError("Need the content directory to read a file reference")
+        filename = bytes(value[len(FILE_REFERENCE_PREFIX) :]).decode()
+        return pa.memory_map(str(directory / filename))
+    return pa.BufferReader(value)
+
+
+def open_reader(
+    source: pa.NativeFile,
+) -> Union[pa.ipc.RecordBatchFileReader, pa.ipc.RecordBatchStreamReader]:
+    """Open an Arrow IPC file or stream, depending on the format of `source`."""
+    source.seek(0)
+    magic = source.read(len(ARROW_FILE_MAGIC))
+    source.seek(0)
+    if magic == ARROW_FILE_MAGIC:
+        return pa.ipc.open_file(source)
+    return pa.ipc.open_stream(source)
+
+
+def select_batches(count: int, batches: Union[int, slice, list[int], None]) -> list:
+    """Indices of the selected record `batches` out of `count`: all for `None`."""
+    if batches is None:
+        return list(range(count))
+    elif isinstance(batches, int):
+        return [range(count)[batches]]
+    elif isinstance(batches, slice):
+        return list(range(count)[batches])
+    return [range(count)[index] for index in batches]
+
+
+def read_table(
+    source: pa.NativeFile,
+    columns: Optional[list[str]] = None,
+    batches: Union[int, slice, list[int], None] = None,
+    filter: Optional[pc.Expression] = None,
+    filter_columns: Optional[list[str]] = None,
+) -> pa.Table:
+    """Read the given `columns` and record `batches` from a stored payload.
+
+    For the IPC file format, only the requested columns of the requested batches are
+    decoded. Payloads in the IPC stream format (written by older versions) are read
+    completely and then filtered.
+
+    With a `filter`, only the rows for which it holds are returned. It is evaluated
+    on each record batch as it is read, so only the matching rows are kept in
+    memory. Arrow can't list the columns an expression uses, so all columns are
+    decoded unless they are given in `filter_columns`."""
+    reader = open_reader(source)
+    if columns is not None:
+        missing = [
+            column
+            for column in columns + (filter_columns or [])
+            if column not in reader.schema.names
+        ]
+        if missing:
+            raise KeyError(f"Columns not in stored dataframe: {missing}")
+
+    decoded = columns
+    if filter is not None and columns is not None:
+        decoded = (
+            None
+            if filter_columns is None
+            else columns
+            + [column for column in filter_columns if column not in columns]
+        )
+
+    if isinstance(reader, pa.ipc.RecordBatchFileReader):
+        if decoded is not None:
+            options = pa.ipc.IpcReadOptions(
+                included_fields=[reader.schema.get_field_index(c) for c in decoded]
+            )
+            reader = pa.ipc.open_file(source, options=options)
+        schema = reader.schema
+        record_batches = (
+            reader.get_batch(index)
+            for index in select_batches(reader.num_record_batches, batches)
+        )
+    else:
+        table = reader.read_all()
+        schema = table.schema
+        record_batches = table.to_batches()
+        if batches is not None:
+            record_batches = [
+                record_batches[index]
+                for index in select_batches(len(record_batches), batches)
+            ]
+    if filter is not None:
+        record_batches = (batch.filter(filter) for batch in record_batches)
+    table = pa.Table.from_batches(list(record_batches), schema=schema)
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+
+def deserialize(
+    source: pa.NativeFile, read_mode: Optional[ReadMode] = None
+) -> Union[pd.DataFrame, pa.Table]:
+    return table_to_dataframe(open_reader(source).read_all(), read_mode)
+
+
+def read_schema(source: pa.NativeFile) -> pa.Schema:
+    """Read only the schema of a stored payload; no data is deserialized."""
+    return open_reader(source).schema
@@ -0,0 +1,215 @@
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Union
+
+from sentier_data_tools.local_storage.binding import (
+    bind_instance,
+    instance_database,
+    use_database,
+)
+from sentier_data_tools.local_storage.db import (
+    DB_NAME,
+    MAX_CONNECTIONS,
+    POOL_TIMEOUT,
+    PRAGMA_PROFILES,
+    BulkSaveStatistics,
+    Dataset,
+    LocalDatabase,
+)
+from sentier_data_tools.local_storage.fields import DatasetKind
+
+# Shard of datasets without a product, when partitioning by product
+NO_PRODUCT_SHARD = "no-product"
+
+
+class ShardPartition(StrEnum):
+    # One shard per `DatasetKind`
+    KIND = "kind"
+    # Products are grouped by namespace (the IRI up to the last "/" or "#"), and
+    # namespaces are spread over `product_shards` shards by hash
+    PRODUCT = "product"
+
+
+def product_namespace(product: str) -> str:
+    product = str(product)
+    return product[: max(product.rfind("/"), product.rfind("#")) + 1] or product
+
+
+class ShardedStore:
+    """Local data store split over several SQLite files, so that writes to one shard
+    don't lock the others, and large `BROAD` tables don't share pages with small
+    `PARAMETERS` rows.
+
+    Each shard is a complete store (`LocalDatabase`) in its own subdirectory of
+    `directory`, with its own content directory. Datasets are routed to a shard by
+    kind or product when first saved, and stay bound to it: their dataframes are
+    loaded from, and later saves go to, the same shard.
+
+    ```python
+    store = ShardedStore(path, partition="kind")
+    store.bulk_save(datasets)
+    store.select(Dataset.location == location, kind=DatasetKind.BROAD)
+    ```
+
+    """
+
+    def __init__(
+        self,
+        directory: Union[Path, str],
+        partition: ShardPartition = ShardPartition.KIND,
+        product_shards: int = 16,
+        profile: str = "default",
+        max_connections: int = MAX_CONNECTIONS,
+    ):
+        self.directory = Path(directory)
+        self.partition = ShardPartition(partition)
+        self.product_shards = product_shards
+        self._settings = {
+            "max_connections": max_connections,
+            "timeout": POOL_TIMEOUT,
+            "pragmas": PRAGMA_PROFILES[profile],
+            "check_same_thread": False,
+        }
+        self._databases: dict[str, LocalDatabase] = {}
+        self._lock = threading.Lock()
+
+    def shard_name(self, kind: DatasetKind, product: Optional[str] = None) -> str:
+        if self.partition == ShardPartition.KIND:
+            return DatasetKind(kind).name.lower()
+        if not product:
+            return NO_PRODUCT_SHARD
+        digest = hashlib.sha256(product_namespace(product).encode()).digest()
+        return f"product-{int.from_bytes(digest[:4], 'big') % self.product_shards:02}"
+
+    def shard_for(self, dataset: Dataset) -> str:
+        return self.shard_name(dataset.kind, dataset.product)
+
+    def database(self, name: str) -> LocalDatabase:
+        """The database of shard `name`; created on first use."""
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = LocalDatabase(
+                    self.directory / name / DB_NAME, **self._settings
+                )
+            return self._databases[name]
+
+    def shards(self) -> list[str]:
+        """Names of the shards which exist on disk or have been opened."""
+        on_disk = (
+            {path.parent.name for path in self.directory.glob(f"*/{DB_NAME}")}
+            if self.directory.exists()
+            else set()
+        )
+        return sorted(on_disk | set(self._databases))
+
+    def save(self, dataset: Dataset, *args, **kwargs) -> int:
+        """Save `dataset` to its shard, or to the shard it was loaded from."""
+        if instance_database(dataset) is None:
+            bind_instance(dataset, self.database(self.shard_for(dataset)))
+        return dataset.save(*args, **kwargs)
+
+    def bulk_save(
+        self, datasets: Iterable[Dataset], **kwargs
+    ) -> dict[str, BulkSaveStatistics]:
+        """Insert many new datasets, with one `Dataset.bulk_save` per shard running
+        concurrently. Keyword arguments are passed to `Dataset.bulk_save`."""
+        groups: dict[str, list[Dataset]] = {}
+        for dataset in datasets:
+            groups.setdefault(self.shard_for(dataset), []).append(dataset)
+
+        def save(name: str) -> BulkSaveStatistics:
+            database = self.database(name)
+            with use_database(database):
+                statistics = Dataset.bulk_save(groups[name], **kwargs)
+            for dataset in groups[name]:
+                bind_instance(dataset, database)
+            return statistics
+
+        return dict(zip(groups, self._map(save, list(groups))))
+
+    def fan_out(
+        self, query: Callable[[], Iterable], shards: Optional[list[str]] = None
+    ) -> list:
+        """Run `query` on each shard (default all), and concatenate the results.
+        Datasets in the results are bound to their shard.
+
+        ```python
+        store.fan_out(lambda: Dataset.latest(Dataset.name == name))
+        ```
+
+        """
+
+        def run(name: str) -> list:
+            database = self.database(name)
+            with use_database(database):
+                results = list(query())
+            for result in results:
+                if isinstance(result, Dataset):
+                    bind_instance(result, database)
+            return results
+
+        return [
+            result
+            for results in self._map(run, self.shards() if shards is None else shards)
+            for result in results
+        ]
+
+    def select(
+        self,
+        *expressions,
+        kind: Optional[DatasetKind] = None,
+        product: Optional[str] = None,
+    ) -> list[Dataset]:
+        """Select datasets matching `expressions` from all shards. Giving the `kind`
+        or `product` also restricts the query to the shards which can hold them."""
+        if kind is not None:
+            expressions += (Dataset.kind == kind,)
+        if product is not None:
+            expressions += (Dataset.product == product,)
+
+        shards = self.shards()
+        if self.partition == ShardPartition.KIND and kind is not None:
+            shards = [name for name in shards if name == self.shard_name(kind)]
+        elif self.partition == ShardPartition.PRODUCT and product is not None:
+            shards = [name for name in shards if name == self.shard_name(kind, product)]
+
+        def query():
+            return (
+                Dataset.select().where(*expressions)
+                if expressions
+                else Dataset.select()
+            )
+
+        return self.fan_out(query, shards)
+
+    def _map(self, function: Callable[[str], Any], names: list[str]) -> list:
+        if len(names) <= 1:
+            return [function(name) for name in names]
+
+        def call(name: str) -> Any:
+            database = self.database(name)
+            try:
+                return function(name)
+            finally:
+                # Give the worker's connection back to the pool before the thread
+                # is discarded, or it stays checked out
+                if not database.is_closed():
+                    database.close()
+
+        # Storage settings are in a context variable, which threads don't inherit
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, call, name)
+                for name in names
+            ]
+            return [future.result() for future in futures]
+
+    def close(self) -> None:
+        with self._lock:
+            for database in self._databases.values():
+                database.close_store()
+            self._databases = {}
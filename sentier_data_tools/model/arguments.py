@@ -1,12 +1,11 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
-# from sentier_data_tools.data_source_base import DataSourceBase
+from sentier_data_tools.data_source_base import DataSourceBase
 from sentier_data_tools.iri import FlowIRI, GeonamesIRI, ProductIRI, UnitIRI
-
-# from sentier_data_tools.local_storage import DefaultDataSource
+from sentier_data_tools.local_storage import DefaultDataSource
 
 
 class Edge(BaseModel):
@@ -32,6 +31,8 @@ class Flow(Edge):
 
 class RunConfig(BaseModel):
     num_samples: int = 1000
-    # data_source: Optional[DataSourceBase] = DefaultDataSource
+    # Where `SentierModel.get_model_data` finds datasets; swap the backend e.g. to
+    # measure storage cost separately from model code
+    data_source: DataSourceBase = Field(default_factory=DefaultDataSource)
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -5,10 +5,13 @@ from datetime import datetime
 from typing import Optional
 
 import pandas as pd
+import pyarrow as pa
 
+from sentier_data_tools.data_source_base import DatasetRecord
 from sentier_data_tools.iri import FlowIRI, GeonamesIRI, ProductIRI, VocabIRI
-from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.config import ReadMode
 from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import table_to_dataframe
 from sentier_data_tools.logs import stdout_feedback_logger as logger
 from sentier_data_tools.model.arguments import Demand, Flow, RunConfig
 
@@ -99,38 +102,38 @@ class SentierModel(ABC):
         product: VocabIRI,
         kind: DatasetKind,
     ) -> dict:
+        data_source = self.run_config.data_source
         results = {
-            "exactMatch": list(
-                Dataset.select().where(
-                    Dataset.kind == kind,
-                    Dataset.product == str(product),
-                )
-            ),
-            "broader": list(
-                Dataset.select().where(
-                    Dataset.kind == kind,
-                    Dataset.product << product.broader(raw_strings=True),
-                )
+            "exactMatch": data_source.query(product=str(product), kind=kind),
+            "broader": data_source.query(
+                product=product.broader(raw_strings=True), kind=kind
             ),
-            "narrower": list(
-                Dataset.select().where(
-                    Dataset.kind == kind,
-                    Dataset.product << product.narrower(raw_strings=True),
-                )
+            "narrower": data_source.query(
+                product=product.narrower(raw_strings=True), kind=kind
             ),
         }
-        for df in itertools.chain(*results.values()):
-            df.dataframe.apply_aliases(self.aliases)
+        # Dataframes are loaded when first accessed
+        for dataset in itertools.chain(*results.values()):
+            dataset.apply_aliases(self.aliases)
 
         return results
 
-    def merge_datasets_to_dataframes(self, lst: list[Dataset]) -> pd.DataFrame:
-        if not lst:
+    def merge_datasets_to_dataframes(self, lst: list[DatasetRecord]) -> pd.DataFrame:
+        # Arrow tables, loaded with `ReadMode.ARROW`, are merged as dataframes
+        frames = [
+            (
+                table_to_dataframe(obj.dataframe, ReadMode.PANDAS)
+                if isinstance(obj.dataframe, pa.Table)
+                else obj.dataframe
+            )
+            for obj in lst
+        ]
+        if not frames:
             return pd.DataFrame()
-        elif len(lst) == 1:
-            return lst[0].dataframe
+        elif len(frames) == 1:
+            return frames[0]
         else:
-            given = lst.pop(0).dataframe
-            while lst:
-                given = pd.merge(given, lst.pop(0).dataframe, how="outer")
+            given = frames.pop(0)
+            while frames:
+                given = pd.merge(given, frames.pop(0), how="outer")
             return given
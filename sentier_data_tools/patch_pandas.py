@@ -54,5 +54,17 @@ def restore_column_iris(df: pd.DataFrame) -> pd.DataFrame:
             len(df.attrs["sdt"]["mapping"]),
             id(df),
         )
-        df.rename(columns=df.attrs["mapping"], inplace=True)
+        df.rename(columns=df.attrs["sdt"]["mapping"], inplace=True)
+        df.attrs["sdt"]["aliased"] = False
+        df.attrs["sdt"]["mapping"] = {}
     return df
+
+
+@pf.register_dataframe_method
+def column_unit(df: pd.DataFrame, column: str) -> str | None:
+    """Get the unit IRI of `column` from the column metadata, or `None` if not given.
+
+    Aliased column labels are resolved to their IRIs first."""
+    sdt = df.attrs.get("sdt", {})
+    column = sdt.get("mapping", {}).get(column, column)
+    return sdt.get("columns", {}).get(column, {}).get("unit")
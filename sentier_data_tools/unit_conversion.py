@@ -1,5 +1,8 @@
+import operator
 from functools import lru_cache
-from typing import List, Optional
+from typing import Callable, List, Optional
+
+import pandas as pd
 
 from sentier_data_tools.iri import UnitIRI
 from sentier_data_tools.iri.utils import execute_sparql_query
@@ -68,3 +71,133 @@ def get_conversion_factor(from_iri: UnitIRI, to_iri: UnitIRI) -> float:
         conversion_dict.update(get_units_for_quantity_kind(qk))
 
     return conversion_dict[str(from_iri)] / conversion_dict[str(to_iri)]
+
+
+@lru_cache(maxsize=2048)
+def get_conversion_offset(iri: UnitIRI) -> float:
+    QUERY = f"""
+PREFIX qudt: <http://qudt.org/schema/qudt/>
+
+SELECT ?offset
+FROM <{UNITS_GRAPH}>
+WHERE {{
+    <{iri}> qudt:conversionOffset ?offset
+}}
+        """
+    logger.debug("Executing query %s", QUERY)
+    result = execute_sparql_query(QUERY)
+    return float(result[0]["offset"]["value"]) if result else 0.0
+
+
+@lru_cache(maxsize=2048)
+def get_canonical_unit(iri: UnitIRI) -> Optional[tuple[str, float]]:
+    """Get the canonical unit (conversion multiplier of one) for the quantity kind of
+    `iri`, and the factor to convert from `iri` to that unit.
+
+    Returns `None` for units which can't be converted with a factor alone, like
+    degrees Celsius."""
+    if get_conversion_offset(iri):
+        return None
+    for qk in sorted(get_quantity_kinds_for_unit(iri)):
+        units = get_units_for_quantity_kind(qk)
+        if str(iri) not in units:
+            continue
+        factor = units[str(iri)]
+        if factor == 1.0:
+            return str(iri), 1.0
+        canonical = sorted(unit for unit, value in units.items() if value == 1.0)
+        if canonical:
+            return canonical[0], factor
+    return None
+
+
+class ConversionTable:
+    """Canonical unit and conversion factor for each unit IRI.
+
+    Lookups are cached on the instance, so a single table can be reused when
+    normalizing many dataframes, e.g. during bulk ingestion. Units missing from the
+    units graph are not converted."""
+
+    def __init__(self, table: Optional[dict[str, Optional[tuple[str, float]]]] = None):
+        self.table = dict(table or {})
+
+    def __getitem__(self, unit: str) -> Optional[tuple[str, float]]:
+        unit = str(unit)
+        if unit not in self.table:
+            try:
+                self.table[unit] = get_canonical_unit(UnitIRI(unit))
+            except KeyError:
+                self.table[unit] = None
+        return self.table[unit]
+
+
+def normalize_to_canonical_units(
+    df: pd.DataFrame, conversion_table: Optional[ConversionTable] = None
+) -> pd.DataFrame:
+    """Convert the numeric columns of `df` to the canonical units of their quantity
+    kinds in one vectorized pass.
+
+    Units are read from and written to the column metadata in `df.attrs`; converted
+    columns also get `original_unit` and `conversion_factor` entries."""
+    if conversion_table is None:
+        conversion_table = ConversionTable()
+    metadata = df.attrs.get("sdt", {}).get("columns", {})
+    factors = {}
+    for column in df.select_dtypes("number").columns:
+        unit = metadata.get(column, {}).get("unit")
+        conversion = conversion_table[unit] if unit else None
+        if conversion is not None and conversion[0] != str(unit):
+            factors[column] = conversion
+
+    if not factors:
+        return df
+
+    df = df.copy()
+    columns = list(factors)
+    df[columns] = df[columns].mul(pd.Series({c: f for c, (_, f) in factors.items()}))
+    df.attrs["sdt"] = df.attrs["sdt"] | {
+        "columns": {
+            column: (
+                obj
+                | {
+                    "unit": factors[column][0],
+                    "original_unit": obj["unit"],
+                    "conversion_factor": factors[column][1],
+                }
+                if column in factors
+                else obj
+            )
+            for column, obj in metadata.items()
+        }
+    }
+    return df
+
+
+class UnitMismatchError(ValueError):
+    pass
+
+
+def unit_aware_operation(
+    left: pd.Series,
+    left_unit: Optional[str],
+    right: pd.Series,
+    right_unit: Optional[str],
+    operation: Callable = operator.add,
+    convert: bool = False,
+) -> pd.Series:
+    """Apply a vectorized `operation` which requires both operands to have the same
+    unit, such as addition, subtraction, or comparison.
+
+    If the units differ, raise `UnitMismatchError`, or if `convert` is `True` convert
+    `right` to `left_unit` first. Column units can be retrieved with
+    `df.column_unit(label)`."""
+    # `URIRef` doesn't compare equal to `str`
+    left_unit = None if left_unit is None else str(left_unit)
+    right_unit = None if right_unit is None else str(right_unit)
+    if left_unit != right_unit:
+        if not convert or left_unit is None or right_unit is None:
+            raise UnitMismatchError(
+                f"Can't combine values in {left_unit} with values in {right_unit}"
+            )
+        right = right * get_conversion_factor(UnitIRI(right_unit), UnitIRI(left_unit))
+    return operation(left, right)
@@ -1,3 +1,16 @@
 """Fixtures for sentier_data_tools"""
 
-# import pytest
+import pytest
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.db import STORE_MODELS
+
+
+@pytest.fixture
+def local_db(tmp_path):
+    """Bind the local data store models to a fresh database in a temporary directory."""
+    db = SqliteExtDatabase(tmp_path / "datasets.db", check_same_thread=False)
+    with db.bind_ctx(STORE_MODELS):
+        db.create_tables(STORE_MODELS)
+        yield db
+    db.close()
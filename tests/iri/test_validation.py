@@ -0,0 +1,39 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+import rfc3987
+
+from sentier_data_tools.iri.validation import check_iris, is_valid_iri, validate_iris
+
+VALUES = [
+    "https://vocab.sentier.dev/products/pem-electrolyzer",
+    "http://example.com:8080/a/b?c=d&e=%20#frag",
+    "https://sws.geonames.org/6255148/",
+    # Only valid with the full grammar
+    "urn:isbn:0451450523",
+    "https://例え.jp/パス",
+    # Invalid
+    "https://example.com/a b",
+    "https://example.com/<tag>",
+    "http://[::1",
+]
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_is_valid_iri_agrees_with_rfc3987(value):
+    assert is_valid_iri(value) == bool(rfc3987.match(value))
+
+
+def test_validate_iris():
+    values = VALUES + [None]
+    expected = [bool(rfc3987.match(value)) for value in VALUES] + [None]
+    assert validate_iris(values).to_pylist() == expected
+    assert validate_iris(pd.Series(values)).to_pylist() == expected
+    chunked = pa.chunked_array([values[:4], values[4:]])
+    assert validate_iris(chunked).to_pylist() == expected
+
+
+def test_check_iris():
+    check_iris(VALUES[:5] + [None])
+    with pytest.raises(ValueError, match="3 invalid IRIs"):
+        check_iris(pa.array(VALUES), label="company")
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from sentier_data_tools.local_storage.aio import StorageExecutor
+from sentier_data_tools.local_storage.config import (
+    get_storage_config,
+    storage_options,
+)
+from sentier_data_tools.local_storage.db import Dataset
+from tests.local_storage.test_fields import make_dataset
+
+
+def test_async_dataset_api(local_db):
+    async def main():
+        dataset = make_dataset()
+        await dataset.asave()
+        [selected] = await Dataset.aselect(Dataset.name == "test")
+        df = await selected.aload_dataframe()
+        assert df.shape == (2, 2)
+        assert "dataframe" in selected.__data__
+        part = await selected.aread(columns=["https://example.com/power"])
+        assert list(part.columns) == ["https://example.com/power"]
+        assert await Dataset.aselect(Dataset.name == "missing") == []
+
+    asyncio.run(main())
+
+
+def test_storage_executor_backpressure():
+    executor = StorageExecutor(max_workers=2, max_pending=1)
+    release = threading.Event()
+    running = []
+
+    def block(index):
+        running.append(index)
+        release.wait()
+        return index
+
+    async def main():
+        tasks = [asyncio.create_task(executor.run(block, i)) for i in range(6)]
+        await asyncio.sleep(0.1)
+        # Two calls running, one queued in the pool, three waiting in the loop
+        assert len(running) == 2
+        semaphore = executor._get_semaphore(asyncio.get_running_loop())
+        assert semaphore.locked()
+        release.set()
+        assert await asyncio.gather(*tasks) == list(range(6))
+
+    asyncio.run(main())
+    executor.shutdown()
+
+
+def test_storage_executor_copies_storage_options():
+    executor = StorageExecutor(max_workers=1)
+
+    async def main():
+        with storage_options(record_batch_size=7):
+            return await executor.run(lambda: get_storage_config().record_batch_size)
+
+    assert asyncio.run(main()) == 7
+    executor.shutdown()
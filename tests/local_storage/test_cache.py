@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from sentier_data_tools.local_storage.cache import DataframeCache, dataframe_cache
+from sentier_data_tools.local_storage.config import storage_options
+from sentier_data_tools.local_storage.db import Dataset
+from tests.local_storage.test_fields import make_dataset
+
+POWER = "https://example.com/power"
+
+
+def test_loaded_dataframes_are_cached(local_db):
+    make_dataset().save()
+    hits = dataframe_cache.hits
+
+    first = Dataset.get().dataframe
+    first[POWER] = 0.0
+    second = Dataset.get().dataframe
+    assert dataframe_cache.hits == hits + 1
+    # Changing a returned dataframe doesn't change the cached one
+    assert list(second[POWER]) == [1.0, 2.5]
+
+
+def test_shared_dataframes_copied_without_copy_on_write(local_db, monkeypatch):
+    # pandas 2.2 with the default copy-on-write option
+    monkeypatch.setattr(pd, "__version__", "2.2.3")
+    monkeypatch.setattr(pd, "get_option", lambda key: "warn")
+    make_dataset().save()
+    first, second = Dataset.get().dataframe, Dataset.get().dataframe
+    # Changes in place, e.g. through numpy, would change the cached dataframe
+    assert not np.shares_memory(first[POWER].to_numpy(), second[POWER].to_numpy())
+    first.loc[0, POWER] = 0.0
+    assert list(Dataset.get().dataframe[POWER]) == [1.0, 2.5]
+
+
+def test_save_and_delete_invalidate(local_db):
+    dataset = make_dataset()
+    dataset.save()
+    assert list(Dataset.get().dataframe[POWER]) == [1.0, 2.5]
+
+    dataset.dataframe = pd.DataFrame({POWER: [7.0]})
+    dataset.save()
+    assert list(Dataset.get().dataframe[POWER]) == [7.0]
+
+    before = len(dataframe_cache)
+    dataset.delete_instance()
+    assert len(dataframe_cache) == before - 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = DataframeCache()
+    with storage_options(cache_max_bytes=100):
+        cache.put(("db", 1), pd.DataFrame(), 60)
+        cache.put(("db", 2), pd.DataFrame(), 30)
+        cache.get(("db", 1))
+        cache.put(("db", 3), pd.DataFrame(), 30)
+        # Too large to cache at all
+        cache.put(("db", 4), pd.DataFrame(), 200)
+    assert cache.get(("db", 2)) is None
+    assert cache.get(("db", 4)) is None
+    assert cache.get(("db", 1)) is not None
+    assert cache.size == 90
+
+
+def test_cache_disabled(local_db):
+    make_dataset().save()
+    with storage_options(cache_max_bytes=0):
+        Dataset.get().dataframe
+    assert (
+        dataframe_cache.get(dataframe_cache.key(Dataset._meta.database, 1, 1)) is None
+    )
@@ -0,0 +1,69 @@
+from sentier_data_tools.local_storage.column_index import (
+    ColumnSchema,
+    DatasetColumns,
+    SchemaColumn,
+    datasets_with_column,
+    datasets_with_columns,
+    rebuild_column_index,
+)
+from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.queries import explain_query_plan
+from tests.local_storage.test_fields import COLUMNS, make_dataset
+
+POWER = "https://example.com/power"
+KILOWATT = "https://example.com/KiloW"
+
+
+def test_identical_schemas_are_shared(local_db):
+    make_dataset(name="a").save()
+    make_dataset(name="b").save()
+    Dataset.bulk_save([make_dataset(name=str(index)) for index in range(3)])
+    assert ColumnSchema.select().count() == 1
+    assert SchemaColumn.select().count() == 2
+    assert DatasetColumns.select().count() == 5
+
+
+def test_datasets_with_column(local_db):
+    make_dataset(name="kilowatt").save()
+    make_dataset(
+        name="watt",
+        columns=[COLUMNS[0] | {"unit": "https://example.com/W"}, COLUMNS[1]],
+    ).save()
+    make_dataset(name="other", columns=[{}, COLUMNS[1]]).save()
+
+    assert {ds.name for ds in datasets_with_column(POWER)} == {"kilowatt", "watt"}
+    assert [ds.name for ds in datasets_with_column(POWER, unit=KILOWATT)] == [
+        "kilowatt"
+    ]
+    assert not datasets_with_column(POWER, Dataset.kind == DatasetKind.BOM).count()
+    assert {
+        ds.name for ds in datasets_with_columns([POWER, "https://example.com/name"])
+    } == {"kilowatt", "watt"}
+
+
+def test_index_follows_changes(local_db):
+    dataset = make_dataset()
+    dataset.save()
+    dataset.columns = [{}, COLUMNS[1]]
+    dataset.save()
+    assert not datasets_with_column(POWER).count()
+
+    dataset.delete_instance()
+    assert not DatasetColumns.select().count()
+
+
+def test_rebuild_column_index(local_db):
+    make_dataset().save()
+    Dataset.update(columns=[{"iri": "https://example.com/new"}]).execute()
+    assert rebuild_column_index() == 1
+    assert datasets_with_column("https://example.com/new").count() == 1
+    assert ColumnSchema.select().count() == 1
+    # Columns of the removed schema
+    assert SchemaColumn.select().count() == 1
+
+
+def test_column_query_uses_index(local_db):
+    plan = " ".join(explain_query_plan(datasets_with_column(POWER, unit=KILOWATT)))
+    assert "schemacolumn_iri_unit" in plan
+    assert "SCAN" not in plan.replace("SCAN dataset", "")
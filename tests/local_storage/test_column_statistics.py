@@ -0,0 +1,186 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from sentier_data_tools.local_storage import column_statistics
+from sentier_data_tools.local_storage.column_statistics import (
+    BatchStatistics,
+    ColumnStatistics,
+    compute_column_statistics,
+    compute_statistics,
+    datasets_with_values,
+    matching_batches,
+    read_column_statistics,
+    update_column_statistics,
+)
+from sentier_data_tools.local_storage.config import storage_options
+from sentier_data_tools.local_storage.db import Dataset
+from tests.local_storage.test_fields import make_dataset
+
+POWER = "https://example.com/power"
+NAME = "https://example.com/name"
+
+
+def test_compute_column_statistics():
+    df = pd.DataFrame({"x": np.arange(1000.0), "y": ["a", None] * 500})
+    df.loc[0, "x"] = np.nan
+    x, y = compute_column_statistics(df)
+    assert (x["count"], x["null_count"], x["min"], x["max"]) == (999, 1, 1.0, 999.0)
+    assert x["mean"] == pytest.approx(500)
+    assert x["distinct"] == 999
+    assert x["quantiles"][2] == pytest.approx(500, rel=0.01)
+    assert (y["count"], y["null_count"], y["min"], y["distinct"]) == (500, 500, "a", 1)
+    assert y["mean"] is None and y["quantiles"] is None
+
+
+def test_nested_columns(local_db):
+    table = pa.table({POWER: [1.0, 2.0], NAME: [[1, 2], None]})
+    _, name = compute_column_statistics(table)
+    assert (name["count"], name["null_count"], name["distinct"]) == (1, 1, None)
+    assert name["quantiles"] is None
+
+    dataset = make_dataset(dataframe=table.to_pandas())
+    dataset.save()
+    assert read_column_statistics(dataset)[NAME].count == 1
+
+
+def test_statistics_stored_on_save(local_db):
+    dataset = make_dataset()
+    dataset.save()
+    statistics = read_column_statistics(dataset)
+    assert list(statistics) == [POWER, NAME]
+    assert (statistics[POWER].min, statistics[POWER].max) == (1.0, 2.5)
+    assert statistics[NAME].max == "b"
+
+    dataset.dataframe = pd.DataFrame({POWER: [10.0, None], NAME: ["c", "d"]})
+    dataset.save()
+    assert read_column_statistics(dataset)[POWER].null_count == 1
+    assert ColumnStatistics.select().count() == 2
+
+    dataset.delete_instance()
+    assert not ColumnStatistics.select().count()
+
+
+def test_bulk_save_summarizes_on_workers(local_db, monkeypatch):
+    threads = set()
+
+    def compute(value, batch_size=None):
+        threads.add(threading.current_thread())
+        return compute_statistics(value, batch_size)
+
+    monkeypatch.setattr(column_statistics, "compute_statistics", compute)
+    Dataset.bulk_save([make_dataset(name=str(i)) for i in range(4)], workers=2)
+    assert threads and threading.main_thread() not in threads
+    assert ColumnStatistics.select().count() == 8
+
+
+def test_unchanged_dataframe_not_summarized(local_db):
+    make_dataset().save()
+    ColumnStatistics.delete().execute()
+    dataset = Dataset.get()
+    dataset.dataframe
+    dataset.save()
+    assert not ColumnStatistics.select().count()
+
+    update_column_statistics(dataset)
+    assert ColumnStatistics.select().count() == 2
+
+
+def test_streamed_statistics(local_db):
+    batches = (
+        pa.record_batch({POWER: [float(i), None], NAME: ["a", "b"]}) for i in range(4)
+    )
+    dataset = make_dataset(dataframe=batches)
+    dataset.save()
+    power = read_column_statistics(dataset)[POWER]
+    assert (power.count, power.null_count, power.min, power.max) == (4, 4, 0.0, 3.0)
+    assert power.mean == 1.5
+    assert power.distinct is None
+
+
+def test_datasets_with_values(local_db):
+    make_dataset(name="low").save()
+    make_dataset(
+        name="high", dataframe=pd.DataFrame({POWER: [100.0, 200.0], NAME: ["x", "y"]})
+    ).save()
+    with storage_options(column_statistics=False):
+        make_dataset(name="unknown").save()
+
+    assert [ds.name for ds in datasets_with_values(POWER, minimum=50)] == ["high"]
+    assert [ds.name for ds in datasets_with_values(POWER, maximum=2)] == ["low"]
+    assert datasets_with_values(POWER, minimum=2, maximum=150).count() == 2
+    assert [
+        ds.name
+        for ds in datasets_with_values(POWER, Dataset.name == "high", maximum=150)
+    ] == ["high"]
+
+
+def test_batch_statistics():
+    df = pd.DataFrame({"x": [1.0, 2.0, None, None, 5.0], "y": [[1], [2], [], [], []]})
+    columns, batches = compute_statistics(df, batch_size=2)
+    assert len(columns) == 2
+    # Not for columns which can't be ordered
+    assert [(row["batch"], row["count"], row["min"]) for row in batches] == [
+        (0, 2, 1.0),
+        (1, 0, None),
+        (2, 1, 5.0),
+    ]
+    # Batches of tables are split at chunks
+    table = pa.chunked_array([[1, 2, 3], [4]])
+    _, batches = compute_statistics(pa.table({"x": table}), batch_size=2)
+    assert [(row["min"], row["max"]) for row in batches] == [(1, 2), (3, 3), (4, 4)]
+    # One batch is covered by the column statistics
+    assert compute_statistics(df, batch_size=10)[1] == []
+
+
+def test_matching_batches(local_db):
+    with storage_options(record_batch_size=2):
+        dataset = make_dataset(
+            dataframe=pd.DataFrame({POWER: [1.0, 2.0, 3.0, 4.0, None], NAME: "a"})
+        )
+        dataset.save()
+    assert BatchStatistics.select().count() == 6
+    assert matching_batches(dataset, [(0, ">", 2.5)], [0, 1, 2]) == [1]
+    assert matching_batches(dataset, [(0, "in", [1.0, 4.0])], [0, 1, 2]) == [0, 1]
+    assert matching_batches(dataset, [(0, "==", 10.0)], [0, 1, 2]) == []
+    assert matching_batches(dataset, [(0, "!=", 1.0)], [0, 2]) == [0]
+    assert matching_batches(dataset, [(1, "==", "b")], [0, 1, 2]) == []
+    # Incomparable values don't skip anything
+    assert matching_batches(dataset, [(0, "<", "x")], [0, 1]) == [0, 1]
+
+    dataset.delete_instance()
+    assert not BatchStatistics.select().count()
+
+
+def test_streamed_batch_statistics(local_db):
+    batches = (
+        pa.record_batch({POWER: [float(i)] * 3, NAME: ["a"] * 3}) for i in range(2)
+    )
+    with storage_options(record_batch_size=2):
+        dataset = make_dataset(dataframe=batches)
+        dataset.save()
+    stored = (
+        BatchStatistics.select()
+        .where(BatchStatistics.position == 0)
+        .order_by(BatchStatistics.batch)
+    )
+    assert [(obj.count, obj.min) for obj in stored] == [
+        (2, 0.0),
+        (1, 0.0),
+        (2, 1.0),
+        (1, 1.0),
+    ]
+    assert dataset.read(batches=[2, 3], columns=[POWER])[POWER].tolist() == [1.0] * 3
+
+
+def test_statistics_removed_when_disabled(local_db):
+    dataset = make_dataset()
+    dataset.save()
+    dataset.dataframe = pd.DataFrame({POWER: [50.0], NAME: ["z"]})
+    with storage_options(column_statistics=False):
+        dataset.save()
+    assert not ColumnStatistics.select().count()
+    assert len(dataset.read(filter={POWER: 50.0})) == 1
@@ -0,0 +1,155 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from sentier_data_tools.data_source_base import DatasetRecord
+from sentier_data_tools.local_storage.config import ReadMode, storage_options
+from sentier_data_tools.local_storage.datasource import (
+    DefaultDataSource,
+    MemoryDataSource,
+    ParquetDataSource,
+)
+from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.serialization import column_metadata_from_schema
+from sentier_data_tools.model.arguments import RunConfig
+from tests.local_storage.test_fields import COLUMNS
+
+PRODUCT = "https://example.com/product"
+OTHER_PRODUCT = "https://example.com/other"
+LOCATION = "https://sws.geonames.org/2921044/"
+
+
+def make_record(**kwargs) -> DatasetRecord:
+    return DatasetRecord(
+        **{
+            "name": "test",
+            "dataframe": pd.DataFrame(
+                {
+                    "https://example.com/power": [1.0, 2.5],
+                    "https://example.com/name": ["a", "b"],
+                }
+            ),
+            "product": PRODUCT,
+            "columns": COLUMNS,
+            "valid_from": date(2020, 1, 1),
+            "valid_to": date(2030, 1, 1),
+        }
+        | kwargs
+    )
+
+
+@pytest.fixture(params=["sqlite", "parquet", "memory"])
+def source(request, tmp_path):
+    if request.param == "sqlite":
+        request.getfixturevalue("local_db")
+        return DefaultDataSource()
+    elif request.param == "parquet":
+        return ParquetDataSource(tmp_path / "parquet")
+    return MemoryDataSource()
+
+
+def test_query(source):
+    assert (
+        source.bulk_save(
+            [
+                make_record(name="a"),
+                make_record(name="b", kind=DatasetKind.BOM, location=LOCATION),
+                make_record(name="c", product=OTHER_PRODUCT, valid_to=date(2021, 1, 1)),
+                make_record(name="d", product=None, valid_from=date(2031, 1, 1)),
+            ]
+        )
+        == 4
+    )
+
+    def names(**kwargs) -> list[str]:
+        return sorted(record.name for record in source.query(**kwargs))
+
+    assert names() == ["a", "b", "c", "d"]
+    assert names(product=PRODUCT) == ["a", "b"]
+    assert names(product=[PRODUCT, OTHER_PRODUCT]) == ["a", "b", "c"]
+    assert names(product=[]) == []
+    assert names(kind=DatasetKind.BOM) == ["b"]
+    assert names(location=LOCATION) == ["b"]
+    # Validity periods overlapping `[begin, end]`
+    assert names(begin=date(2025, 1, 1)) == ["a", "b", "d"]
+    assert names(begin=datetime(2025, 1, 1), end=date(2030, 6, 1)) == ["a", "b"]
+    assert names(product=PRODUCT, kind=DatasetKind.PARAMETERS) == ["a"]
+
+
+def test_dataframes_loaded_lazily(source):
+    record = make_record()
+    source.save(record)
+    assert record.key is not None
+
+    (stored,) = source.query()
+    assert not stored.loaded
+    assert stored.columns == COLUMNS
+    assert stored.dataframe.shape == (2, 2)
+    assert stored.loaded
+    assert stored.dataframe.attrs["sdt"]["columns"]["https://example.com/power"] == (
+        COLUMNS[0]
+    )
+
+
+def test_aliases_applied_on_load(source):
+    source.save(make_record())
+    (stored,) = source.query()
+    stored.apply_aliases({"https://example.com/power": "power"})
+    assert list(stored.dataframe.columns) == ["power", "https://example.com/name"]
+
+
+def test_read_columns(source):
+    source.save(make_record())
+    (stored,) = source.query()
+    stored.apply_aliases({"https://example.com/power": "power"})
+    df = stored.read(columns=["power"])
+    assert list(df.columns) == ["power"]
+    assert df["power"].tolist() == [1.0, 2.5]
+    assert not stored.loaded
+
+
+def test_loaded_dataframe_can_be_changed(source):
+    source.save(make_record())
+    (first,) = source.query()
+    first.dataframe.loc[0, "https://example.com/power"] = 100.0
+    (second,) = source.query()
+    assert second.dataframe["https://example.com/power"].tolist() == [1.0, 2.5]
+
+
+def test_default_data_source(local_db):
+    source = DefaultDataSource()
+    source.save(make_record(metadata={"determining_value": "x"}))
+    (dataset,) = Dataset.select()
+    assert dataset.metadata == {"determining_value": "x"}
+    assert dataset.dataframe.shape == (2, 2)
+
+    assert isinstance(RunConfig().data_source, DefaultDataSource)
+    assert RunConfig(data_source=source).data_source is source
+
+
+def test_parquet_catalog_refreshed(tmp_path):
+    source = ParquetDataSource(tmp_path)
+    source.save(make_record(name="a"))
+    assert [record.name for record in source.query()] == ["a"]
+    # Another process adding a file
+    ParquetDataSource(tmp_path).save(make_record(name="b"))
+    assert sorted(record.name for record in source.query()) == ["a", "b"]
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_arrow_tables(source):
+    table = pa.table(
+        {"https://example.com/power": [1.0], "https://example.com/name": ["a"]}
+    )
+    source.save(make_record(dataframe=table))
+    (stored,) = source.query()
+    with storage_options(read_mode=ReadMode.ARROW):
+        stored.dataframe
+    assert isinstance(stored.dataframe, pa.Table)
+    assert column_metadata_from_schema(stored.dataframe.schema) == {
+        "https://example.com/power": COLUMNS[0],
+        "https://example.com/name": COLUMNS[1],
+    }
@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+from playhouse.pool import PooledSqliteExtDatabase
+from playhouse.signals import post_save
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.binding import use_database
+from sentier_data_tools.local_storage.config import StorageMode, storage_options
+from sentier_data_tools.local_storage.db import (
+    SERIALIZE_HOOKS,
+    STORE_MODELS,
+    Dataset,
+    LocalDatabase,
+    _environment_pragma_profile,
+    configure_local_database,
+)
+from sentier_data_tools.local_storage.fields import DatasetKind
+from tests.local_storage.test_fields import make_dataset
+
+
+def test_select_defers_dataframe(local_db):
+    make_dataset().save()
+    dataset = Dataset.select().get()
+    assert "dataframe" not in dataset.__data__
+    assert dataset.dataframe["https://example.com/power"].tolist() == [1.0, 2.5]
+    assert "dataframe" in dataset.__data__
+
+
+def test_deferred_dataframe_aliases(local_db):
+    make_dataset().save()
+    dataset = Dataset.select().get()
+    dataset.apply_aliases({"https://example.com/power": "power"})
+    assert "dataframe" not in dataset.__data__
+    assert "power" in dataset.dataframe.columns
+
+
+def test_save_deferred_dataset_keeps_dataframe(local_db):
+    make_dataset().save()
+    dataset = Dataset.select().get()
+    dataset.name = "renamed"
+    dataset.save()
+    assert Dataset.get_by_id(dataset.id).dataframe.shape == (2, 2)
+
+
+def test_catalog(local_db):
+    make_dataset().save()
+    make_dataset(name="other").save()
+    catalog = list(Dataset.catalog(Dataset.name == "other"))
+    assert len(catalog) == 1
+    assert catalog[0]["name"] == "other"
+    assert "dataframe" not in catalog[0]
+
+
+def test_read_columns_and_batches(local_db):
+    df = pd.DataFrame({"a": range(10), "b": [float(x) for x in range(10)], "c": "x"})
+    with storage_options(record_batch_size=4):
+        make_dataset(dataframe=df, columns=[{"unit": "u"}, {}, {}]).save()
+    dataset = Dataset.select().get()
+
+    result = dataset.read(columns=["c", "a"], batches=slice(1, None))
+    assert list(result.columns) == ["c", "a"]
+    assert result["a"].tolist() == list(range(4, 10))
+    assert result.attrs["sdt"]["columns"]["a"] == {"unit": "u"}
+    assert "dataframe" not in dataset.__data__
+
+    assert dataset.read(batches=2)["b"].tolist() == [8.0, 9.0]
+    dataset.apply_aliases({"a": "alpha"})
+    assert list(dataset.read(columns=["alpha"]).columns) == ["alpha"]
+    with pytest.raises(KeyError):
+        dataset.read(columns=["missing"])
+
+
+def test_read_filter(local_db):
+    df = pd.DataFrame(
+        {"year": range(2015, 2025), "company": ["Nel", "ITM"] * 5, "power": 1.0}
+    )
+    with storage_options(record_batch_size=4):
+        make_dataset(dataframe=df, columns=[{}, {}, {}]).save()
+    dataset = Dataset.select().get()
+
+    result = dataset.read(filter={"company": "Nel", "year": (">=", 2020)})
+    assert result["year"].tolist() == [2021, 2023]
+    assert result.index.tolist() == [0, 1]
+
+    result = dataset.read(columns=["power"], filter={"year": [2016, 2023]})
+    assert list(result.columns) == ["power"]
+    assert len(result) == 2
+    # Every batch ruled out by its value range
+    assert dataset.read(filter={"year": ("<", 2000)}).empty
+
+    result = dataset.read(
+        columns=["year"], filter=(pc.field("power") > 0) & (pc.field("year") < 2017)
+    )
+    assert result["year"].tolist() == [2015, 2016]
+
+    dataset.apply_aliases({"company": "manufacturer"})
+    assert len(dataset.read(filter={"manufacturer": "ITM"})) == 5
+    with storage_options(read_mode="arrow"):
+        assert dataset.read(filter={"year": 2015}).num_rows == 1
+    with pytest.raises(KeyError):
+        dataset.read(filter={"missing": 1})
+
+
+def test_read_modes(local_db):
+    make_dataset().save()
+    with storage_options(read_mode="arrow"):
+        dataset = Dataset.select().get()
+        dataset.apply_aliases({"https://example.com/power": "power"})
+        table = dataset.dataframe
+    assert isinstance(table, pa.Table)
+    assert table.column("power").to_pylist() == [1.0, 2.5]
+
+    dataset = Dataset.select().get()
+    df = dataset.read(read_mode="arrow_dtype")
+    assert isinstance(df.dtypes["https://example.com/name"], pd.ArrowDtype)
+    assert df.attrs["sdt"]["columns"]["https://example.com/power"]["unit"] == (
+        "https://example.com/KiloW"
+    )
+    assert isinstance(dataset.dataframe, pd.DataFrame)
+
+
+def test_aliased_table_saved_with_iris(local_db):
+    make_dataset().save()
+    with storage_options(read_mode="arrow"):
+        dataset = Dataset.select().get()
+        dataset.apply_aliases({"https://example.com/power": "power"})
+        table = dataset.dataframe.filter(pc.field("power") > 2)
+    assert table.column_names == ["power", "https://example.com/name"]
+    dataset.dataframe = table
+    dataset.save()
+    assert dataset.read_schema().names == [
+        "https://example.com/power",
+        "https://example.com/name",
+    ]
+    assert Dataset.get().column_metadata()["https://example.com/power"]["unit"] == (
+        "https://example.com/KiloW"
+    )
+
+
+def test_read_with_same_thread_connection(tmp_path):
+    # Falls back to copying the whole blob, as Arrow can't read from other threads
+    db = SqliteExtDatabase(tmp_path / "same-thread.db")
+    with db.bind_ctx(STORE_MODELS):
+        db.create_tables(STORE_MODELS)
+        make_dataset().save()
+        dataset = Dataset.select().get()
+        assert dataset.read(columns=["https://example.com/name"]).shape == (2, 1)
+        assert dataset.dataframe.shape == (2, 2)
+    db.close()
+
+
+def test_open_stored_missing_row(local_db):
+    with pytest.raises(Dataset.DoesNotExist):
+        with Dataset.dataframe.open_stored(42):
+            pass
+
+
+def test_dataset_without_product(local_db):
+    make_dataset(product=None, kind=DatasetKind.BROAD).save()
+    assert Dataset.select().get().product is None
+
+
+def test_configure_local_database_profiles(tmp_path):
+    db = PooledSqliteExtDatabase(tmp_path / "pooled.db", check_same_thread=False)
+    configure_local_database("concurrent", max_connections=4, db=db)
+    with db.bind_ctx(STORE_MODELS):
+        db.create_tables(STORE_MODELS)
+        assert db.execute_sql("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute_sql("PRAGMA synchronous").fetchone()[0] == 1
+        make_dataset().save()
+
+        def read(_):
+            with db.connection_context():
+                return Dataset.select().get().dataframe.shape
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert list(executor.map(read, range(8))) == [(2, 2)] * 8
+    db.close_all()
+    with pytest.raises(KeyError):
+        configure_local_database("missing", db=db)
+
+
+def test_environment_pragma_profile(monkeypatch):
+    monkeypatch.delenv("SDT_PRAGMA_PROFILE", raising=False)
+    assert _environment_pragma_profile() == "default"
+    monkeypatch.setenv("SDT_PRAGMA_PROFILE", "concurrent")
+    assert _environment_pragma_profile() == "concurrent"
+    monkeypatch.setenv("SDT_PRAGMA_PROFILE", "concurent")
+    assert _environment_pragma_profile() == "default"
+
+
+def test_bulk_save(local_db):
+    received = []
+
+    @post_save(sender=Dataset)
+    def record(model_class, instance, created):
+        received.append(instance.id)
+
+    try:
+        with storage_options(compression="zstd"):
+            statistics = Dataset.bulk_save(
+                (make_dataset(name=str(index), version=index) for index in range(7)),
+                batch_size=3,
+                workers=2,
+            )
+    finally:
+        post_save.disconnect(name="record", sender=Dataset)
+
+    assert statistics.count == 7
+    assert statistics.datasets_per_second > 0
+    assert sorted(received) == sorted(ds.id for ds in Dataset.select())
+    dataset = Dataset.get(Dataset.name == "4")
+    assert dataset.version == 4
+    assert dataset.kind == DatasetKind.PARAMETERS
+    assert dataset.read_schema().metadata[b"sdt:compression"] == b"zstd"
+    assert dataset.column_metadata()["https://example.com/power"]["unit"] == (
+        "https://example.com/KiloW"
+    )
+    with pytest.raises(ValueError):
+        Dataset.bulk_save([dataset])
+
+
+@pytest.mark.parametrize("storage_mode", list(StorageMode))
+def test_bulk_save_returns_connections(tmp_path, storage_mode):
+    def count(dataset):
+        Dataset.select().count()
+
+    db = LocalDatabase(
+        tmp_path / "store.db", max_connections=3, check_same_thread=False
+    )
+    SERIALIZE_HOOKS.append(count)
+    try:
+        with use_database(db), storage_options(storage_mode=storage_mode):
+            for index in range(4):
+                Dataset.bulk_save(
+                    [make_dataset(name=f"{index}-{n}") for n in range(4)], workers=2
+                )
+            assert Dataset.select().count() == 16
+    finally:
+        SERIALIZE_HOOKS.remove(count)
+        db.close_store()
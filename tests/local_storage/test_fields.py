@@ -0,0 +1,244 @@
+import io
+import mmap
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from playhouse.sqlite_ext import SqliteExtDatabase
+
+from sentier_data_tools.local_storage.config import (
+    StorageConfig,
+    StorageMode,
+    storage_options,
+)
+from sentier_data_tools.local_storage.db import STORE_MODELS, Dataset
+from sentier_data_tools.local_storage.fields import CONTENT_DIRECTORY
+from sentier_data_tools.local_storage.serialization import (
+    FILE_REFERENCE_PREFIX,
+    choose_compression,
+    column_metadata_from_schema,
+    deserialize,
+    is_record_batch_stream,
+    match_column_metadata,
+    payload_compression,
+    read_schema,
+    read_table,
+    record_batch_reader,
+    serialize,
+    serialize_payload,
+)
+from sentier_data_tools.unit_conversion import ConversionTable
+
+COLUMNS = [
+    {"iri": "https://example.com/power", "unit": "https://example.com/KiloW"},
+    {"iri": "https://example.com/name", "comment": "manufacturer"},
+]
+
+
+def make_dataset(**kwargs) -> Dataset:
+    return Dataset(
+        **{
+            "name": "test",
+            "dataframe": pd.DataFrame(
+                {
+                    "https://example.com/power": [1.0, 2.5],
+                    "https://example.com/name": ["a", "b"],
+                }
+            ),
+            "product": "https://example.com/product",
+            "columns": COLUMNS,
+            "metadata": {},
+            "version": 1,
+            "valid_from": date(2020, 1, 1),
+            "valid_to": date(2030, 1, 1),
+        }
+        | kwargs
+    )
+
+
+def test_match_column_metadata_by_position():
+    assert match_column_metadata(["a", "b"], [{"unit": "x"}, {"unit": "y"}]) == {
+        "a": {"unit": "x"},
+        "b": {"unit": "y"},
+    }
+
+
+def test_match_column_metadata_by_iri():
+    assert match_column_metadata(
+        ["a"], [{"iri": "b", "unit": "x"}, {"iri": "a", "unit": "y"}]
+    ) == {"a": {"iri": "a", "unit": "y"}}
+
+
+def test_serialization_round_trip_keeps_column_metadata():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": [3, 4]})
+    df.attrs["sdt"] = {"columns": {"a": {"unit": "https://example.com/KiloW"}}}
+    payload = serialize(df)
+    result = deserialize(pa.BufferReader(payload))
+    pd.testing.assert_frame_equal(result, df)
+    assert result.attrs["sdt"]["columns"] == {
+        "a": {"unit": "https://example.com/KiloW"}
+    }
+    schema = read_schema(pa.BufferReader(payload))
+    assert column_metadata_from_schema(schema) == {
+        "a": {"unit": "https://example.com/KiloW"}
+    }
+
+
+def test_dataset_column_metadata_survives_storage(local_db):
+    dataset = make_dataset()
+    dataset.save()
+    expected = {column["iri"]: column for column in COLUMNS}
+    assert dataset.column_metadata() == expected
+    loaded = Dataset.get_by_id(dataset.id)
+    assert loaded.dataframe.attrs["sdt"]["columns"] == expected
+    assert loaded.dataframe.column_unit("https://example.com/power") == (
+        "https://example.com/KiloW"
+    )
+    assert loaded.dataframe.column_unit("https://example.com/name") is None
+
+
+def test_dataset_save_normalize_units(local_db):
+    table = ConversionTable(
+        {"https://example.com/KiloW": ("https://example.com/W", 1e3)}
+    )
+    dataset = make_dataset()
+    dataset.save(normalize_units=True, conversion_table=table)
+    loaded = Dataset.get_by_id(dataset.id)
+    assert loaded.dataframe["https://example.com/power"].tolist() == [1e3, 2.5e3]
+    assert loaded.columns[0] == {
+        "iri": "https://example.com/power",
+        "unit": "https://example.com/W",
+        "original_unit": "https://example.com/KiloW",
+        "conversion_factor": 1e3,
+    }
+    assert loaded.column_metadata()["https://example.com/power"] == loaded.columns[0]
+
+
+def test_normalize_units_keeps_unmatched_columns(local_db):
+    table = ConversionTable(
+        {"https://example.com/KiloW": ("https://example.com/W", 1e3)}
+    )
+    # Matched by IRI, since the lengths differ
+    other = {"iri": "https://example.com/other", "unit": "https://example.com/KiloW"}
+    dataset = make_dataset(columns=[COLUMNS[1], other, COLUMNS[0]])
+    dataset.save(normalize_units=True, conversion_table=table)
+    name, unmatched, power = Dataset.get_by_id(dataset.id).columns
+    assert (name, unmatched) == (COLUMNS[1], other)
+    assert power["unit"] == "https://example.com/W"
+
+
+def test_dataset_file_storage_mode(local_db, tmp_path):
+    with storage_options(storage_mode=StorageMode.FILE):
+        dataset = make_dataset()
+        dataset.save()
+        make_dataset(name="same frame").save()
+
+    raw = dataset._raw_dataframe()
+    assert raw.startswith(FILE_REFERENCE_PREFIX)
+    files = list((tmp_path / CONTENT_DIRECTORY).iterdir())
+    assert len(files) == 1
+    assert files[0].read_bytes().startswith(b"ARROW1")
+
+    loaded = Dataset.get_by_id(dataset.id)
+    pd.testing.assert_frame_equal(loaded.dataframe, make_dataset().dataframe)
+    assert loaded.column_metadata()["https://example.com/power"] == COLUMNS[0]
+
+
+def test_file_storage_mode_requires_database_file():
+    db = SqliteExtDatabase(":memory:")
+    with db.bind_ctx(STORE_MODELS):
+        db.create_tables(STORE_MODELS)
+        with storage_options(storage_mode="file"):
+            with pytest.raises(ValueError):
+                make_dataset().save()
+
+
+def test_deserialize_stream_payload():
+    # Payloads written before the switch to the IPC file format
+    table = pa.table({"a": [1, 2]})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    assert deserialize(pa.BufferReader(sink.getvalue()))["a"].tolist() == [1, 2]
+    assert read_table(pa.BufferReader(sink.getvalue()), batches=0).num_rows == 2
+
+
+def test_source_read_twice():
+    source = pa.PythonFile(io.BytesIO(serialize(pd.DataFrame({"a": [1, 2]}))), "r")
+    assert read_schema(source).names == ["a"]
+    assert read_table(source, columns=["a"]).num_rows == 2
+
+
+@pytest.mark.parametrize("compression", ["none", "lz4", "zstd"])
+def test_compression_round_trip(compression):
+    df = pd.DataFrame({"a": [1.5] * 10_000, "b": ["company"] * 10_000})
+    with storage_options(compression=compression):
+        payload = serialize(df)
+    pd.testing.assert_frame_equal(deserialize(pa.BufferReader(payload)), df)
+    assert payload_compression(read_schema(pa.BufferReader(payload))) == compression
+    if compression != "none":
+        with storage_options(compression="none"):
+            assert len(payload) * 3 < len(serialize(df))
+
+
+def test_choose_compression_auto():
+    config = StorageConfig(compression_min_bytes=1000)
+    assert choose_compression(pa.table({"a": [1.0] * 10}), config) is None
+    assert choose_compression(pa.table({"a": [1.0] * 1000}), config) == "lz4"
+    assert choose_compression(pa.table({"a": ["abcdefgh"] * 1000}), config) == "zstd"
+
+
+def test_record_batch_reader_converts_dataframe_in_batches():
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [None, None, "x"]})
+    df.attrs["sdt"] = {"columns": {"a": {"unit": "kg"}}}
+    reader = record_batch_reader(df, batch_size=2)
+    assert not pa.types.is_null(reader.schema.field("b").type)
+    assert [batch.num_rows for batch in reader] == [2, 1]
+    assert column_metadata_from_schema(reader.schema) == {"a": {"unit": "kg"}}
+
+
+@pytest.mark.parametrize("storage_mode", list(StorageMode))
+def test_save_record_batch_stream(local_db, storage_mode):
+    batches = (
+        pa.record_batch(
+            {
+                "https://example.com/power": [float(i)] * 3,
+                "https://example.com/name": ["a"] * 3,
+            }
+        )
+        for i in range(4)
+    )
+    with storage_options(storage_mode=storage_mode, record_batch_size=2):
+        dataset = make_dataset(dataframe=batches)
+        dataset.save()
+
+    # The consumed stream is replaced by the stored dataframe
+    df = dataset.dataframe
+    assert len(df) == 12
+    assert df.attrs["sdt"]["columns"]["https://example.com/power"] == COLUMNS[0]
+    assert len(dataset.read(batches=slice(0, 2))) == 3
+
+
+def test_is_record_batch_stream():
+    batch = pa.record_batch({"a": [1]})
+    assert is_record_batch_stream(iter([batch]))
+    assert is_record_batch_stream(pa.RecordBatchReader.from_batches(batch.schema, []))
+    assert not is_record_batch_stream([batch])
+    assert not is_record_batch_stream("abc")
+
+
+@pytest.mark.parametrize("value", ["abc", {"a": [1]}, [{"a": 1}], iter([{"a": 1}])])
+def test_save_unsupported_dataframe(local_db, value):
+    with pytest.raises(TypeError):
+        make_dataset(dataframe=value).save()
+
+
+@pytest.mark.parametrize("storage_mode", list(StorageMode))
+def test_spooled_payload(local_db, storage_mode):
+    with storage_options(spool_min_bytes=0, storage_mode=storage_mode):
+        assert isinstance(serialize_payload(make_dataset().dataframe), mmap.mmap)
+        make_dataset().save()
+        Dataset.bulk_save([make_dataset(name="bulk")])
+    for dataset in Dataset.select():
+        assert list(dataset.dataframe["https://example.com/power"]) == [1.0, 2.5]
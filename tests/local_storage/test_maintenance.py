@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sentier_data_tools.local_storage.binding import use_database
+from sentier_data_tools.local_storage.config import StorageMode, storage_options
+from sentier_data_tools.local_storage.db import (
+    STORE_MODELS,
+    DataframePayload,
+    Dataset,
+    LocalDatabase,
+)
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.maintenance import (
+    analyze,
+    incremental_vacuum,
+    reset_store,
+    store_statistics,
+)
+from tests.local_storage.test_fields import make_dataset
+
+
+@pytest.fixture
+def local_store(tmp_path):
+    db = LocalDatabase(tmp_path / "store.db", check_same_thread=False)
+    with db.bind_ctx(STORE_MODELS):
+        yield db
+    db.close_store()
+
+
+def large_dataframe() -> pd.DataFrame:
+    return pd.DataFrame(
+        np.random.default_rng(1).random((20_000, 4)), columns=list("abcd")
+    )
+
+
+def test_reset_store_swaps_file(local_store, tmp_path):
+    with storage_options(storage_mode=StorageMode.FILE):
+        make_dataset().save()
+    assert (tmp_path / "dataframes").exists()
+
+    reset_store()
+    assert local_store.deferred
+    assert Dataset.select().count() == 0
+    assert not (tmp_path / "dataframes").exists()
+    make_dataset().save()
+    assert Dataset.select().count() == 1
+
+
+def test_reset_store_other_database(local_store, tmp_path):
+    other = LocalDatabase(tmp_path / "other" / "store.db", check_same_thread=False)
+    with storage_options(storage_mode=StorageMode.FILE):
+        make_dataset().save()
+        with use_database(other):
+            make_dataset().save()
+
+    reset_store(other)
+    assert (tmp_path / "dataframes").exists()
+    assert not (tmp_path / "other" / "dataframes").exists()
+    assert Dataset.get().dataframe.shape == (2, 2)
+
+
+def test_reset_store_drops_tables(local_db):
+    make_dataset().save()
+    reset_store(local_db)
+    assert Dataset.select().count() == 0
+    assert DataframePayload.select().count() == 0
+
+
+def test_incremental_vacuum(local_store):
+    for index in range(3):
+        make_dataset(name=str(index), dataframe=large_dataframe()).save()
+    Dataset.delete().execute()
+    assert local_store.pragma("freelist_count") > 0
+    assert incremental_vacuum(max_pages=5) == 5
+    assert incremental_vacuum() > 0
+    assert local_store.pragma("freelist_count") == 0
+
+
+def test_analyze(local_store):
+    make_dataset().save()
+    analyze(limit=100)
+    assert local_store.execute_sql("SELECT count(*) FROM sqlite_stat1").fetchone()[0]
+
+
+def test_store_statistics(local_store):
+    make_dataset(dataframe=large_dataframe()).save()
+    with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        make_dataset(name="shared", kind=DatasetKind.BOM).save()
+        make_dataset(name="copy", kind=DatasetKind.BOM).save()
+
+    statistics = store_statistics()
+    assert statistics.row_counts["dataframepayload"] == 1
+    assert statistics.row_counts["dataset"] == 3
+    parameters, bom = statistics.payload_bytes
+    assert parameters.kind == DatasetKind.PARAMETERS
+    assert parameters.inline_bytes > 20_000 * 4 * 8 * 0.5
+    assert bom.datasets == 2
+    assert bom.inline_bytes == 0
+    assert bom.referenced_bytes == 2 * DataframePayload.get().size
+    assert statistics.file_bytes >= parameters.inline_bytes
+    assert 0 <= statistics.fragmentation < 1
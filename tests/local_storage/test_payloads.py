@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+from playhouse.signals import post_save
+
+from sentier_data_tools.local_storage.binding import use_database
+from sentier_data_tools.local_storage.config import StorageMode, storage_options
+from sentier_data_tools.local_storage.db import (
+    DataframePayload,
+    Dataset,
+    LocalDatabase,
+    collect_garbage,
+)
+from sentier_data_tools.local_storage.fields import CONTENT_DIRECTORY
+from sentier_data_tools.local_storage.serialization import HASH_REFERENCE_PREFIX
+from tests.local_storage.test_fields import make_dataset
+
+
+def test_content_addressed_payloads_are_shared(local_db):
+    with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        first = make_dataset()
+        first.save()
+        second = make_dataset(name="copy")
+        second.save()
+
+    assert first._raw_dataframe().startswith(HASH_REFERENCE_PREFIX)
+    assert first._raw_dataframe() == second._raw_dataframe()
+    payload = DataframePayload.get()
+    assert payload.refcount == 2
+
+    loaded = Dataset.get(Dataset.name == "copy")
+    assert list(loaded.dataframe["https://example.com/power"]) == [1.0, 2.5]
+    assert list(loaded.read(columns=["https://example.com/name"]).columns) == [
+        "https://example.com/name"
+    ]
+
+    first.delete_instance()
+    assert DataframePayload.get().refcount == 1
+    second.delete_instance()
+    assert DataframePayload.select().count() == 0
+
+
+def test_replacing_dataframe_releases_payload(local_db):
+    with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        dataset = make_dataset()
+        dataset.save()
+        dataset.dataframe = pd.DataFrame({"https://example.com/power": [3.0]})
+        dataset.save()
+
+    assert DataframePayload.select().count() == 1
+    assert list(Dataset.get().dataframe["https://example.com/power"]) == [3.0]
+
+
+def test_file_payloads_are_counted(local_db, tmp_path):
+    with storage_options(storage_mode=StorageMode.FILE):
+        first = make_dataset()
+        first.save()
+        make_dataset(name="copy").save()
+
+    directory = tmp_path / CONTENT_DIRECTORY
+    assert len(list(directory.iterdir())) == 1
+    assert DataframePayload.get().refcount == 2
+
+    first.delete_instance()
+    assert len(list(directory.iterdir())) == 1
+    Dataset.delete().execute()
+    statistics = collect_garbage()
+    assert statistics.payloads_deleted == 1
+    assert statistics.files_deleted == 1
+    assert not list(directory.iterdir())
+
+
+def test_collect_garbage_recounts_references(local_db):
+    with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        for name in ("a", "b", "c"):
+            make_dataset(name=name).save()
+    make_dataset(name="inline").save()
+    Dataset.delete().where(Dataset.name.in_(["a", "b"])).execute()
+
+    statistics = collect_garbage()
+    assert statistics.payloads_deleted == 0
+    assert DataframePayload.get().refcount == 1
+
+
+def test_bulk_save_content_addressed_in_memory():
+    db = LocalDatabase(":memory:", check_same_thread=False)
+    datasets = [
+        make_dataset(name=str(index), dataframe=pd.DataFrame({"x": [index % 4]}))
+        for index in range(40)
+    ]
+    with use_database(db), storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        Dataset.bulk_save(datasets, batch_size=2, workers=4)
+        assert [payload.refcount for payload in DataframePayload.select()] == [10] * 4
+        assert list(Dataset.get(Dataset.name == "5").dataframe["x"]) == [1]
+    db.close_store()
+
+
+def test_bulk_save_rolls_back_references(local_db):
+    @post_save(sender=Dataset)
+    def fail(model_class, instance, created):
+        raise RuntimeError
+
+    try:
+        with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+            with pytest.raises(RuntimeError):
+                Dataset.bulk_save([make_dataset(), make_dataset(name="copy")])
+    finally:
+        post_save.disconnect(name="fail", sender=Dataset)
+
+    assert Dataset.select().count() == 0
+    assert DataframePayload.select().count() == 0
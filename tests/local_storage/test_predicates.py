@@ -0,0 +1,50 @@
+import pyarrow as pa
+import pytest
+
+from sentier_data_tools.local_storage.predicates import (
+    could_match,
+    parse_predicates,
+    predicates_expression,
+)
+
+
+def test_parse_predicates():
+    assert parse_predicates({"a": 1, "b": ["x", "y"], "c": (">=", 2.5)}) == [
+        ("a", "==", 1),
+        ("b", "in", ["x", "y"]),
+        ("c", ">=", 2.5),
+    ]
+    with pytest.raises(ValueError):
+        parse_predicates({"a": ("~", 1)})
+
+
+def test_predicates_expression():
+    table = pa.table({"a": [1, 2, 3], "b": ["x", "y", "x"]})
+    expression = predicates_expression(parse_predicates({"a": ("<", 3), "b": ["x"]}))
+    assert table.filter(expression)["a"].to_pylist() == [1]
+    assert predicates_expression([]) is None
+
+
+@pytest.mark.parametrize(
+    "op, value, expected",
+    [
+        ("==", 5, True),
+        ("==", 11, False),
+        ("in", [0, 20], False),
+        ("in", [0, 10], True),
+        ("in", [None], True),
+        ("<", 1, False),
+        ("<=", 1, True),
+        (">", 10, False),
+        (">=", 10, True),
+        ("!=", 1, True),
+        ("==", "x", True),
+    ],
+)
+def test_could_match(op, value, expected):
+    assert could_match(op, value, count=10, minimum=1, maximum=10) is expected
+
+
+def test_could_match_only_nulls():
+    assert not could_match("==", 1, count=0, minimum=None, maximum=None)
+    assert could_match("in", [1, None], count=0, minimum=None, maximum=None)
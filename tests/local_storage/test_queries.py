@@ -0,0 +1,71 @@
+from sentier_data_tools.local_storage.db import Dataset, initialize_local_database
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.queries import (
+    explain_query_plan,
+    standard_queries,
+)
+from tests.local_storage.test_fields import make_dataset
+
+POWER = "https://example.com/power"
+
+
+def test_standard_queries_use_indexes(local_db):
+    for label, query in standard_queries().items():
+        plan = " ".join(explain_query_plan(query))
+        assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, label
+
+
+def test_latest(local_db):
+    for name, version in [("a", 1), ("a", 3), ("a", 2), ("b", 1)]:
+        make_dataset(name=name, version=version).save()
+    assert sorted((ds.name, ds.version) for ds in Dataset.latest()) == [
+        ("a", 3),
+        ("b", 1),
+    ]
+    assert [ds.version for ds in Dataset.latest(Dataset.name == "a")] == [3]
+
+
+def test_with_metadata(local_db):
+    contributor = {"title": "Jane Doe", "path": "https://example.com/jane"}
+    make_dataset(
+        name="bom",
+        kind=DatasetKind.BOM,
+        metadata={"determining_value": POWER, "contributors": [contributor]},
+    ).save()
+    make_dataset(name="other", metadata={"homepage": "https://example.com"}).save()
+
+    query = Dataset.with_metadata(
+        Dataset.kind == DatasetKind.BOM, determining_value=POWER
+    )
+    assert [ds.name for ds in query] == ["bom"]
+    assert "USING INDEX dataset_kind_determining_value" in " ".join(
+        explain_query_plan(query)
+    )
+    assert Dataset.get(Dataset.name == "other").homepage == "https://example.com"
+    assert [ds.name for ds in Dataset.with_metadata(contributor="Jane Doe")] == ["bom"]
+    assert not Dataset.with_metadata(contributor="https://example.com/joe").count()
+    assert [
+        ds.name for ds in Dataset.with_metadata(homepage="https://example.com")
+    ] == ["other"]
+
+
+def test_save_with_changed_metadata(local_db):
+    make_dataset(metadata={"determining_value": "a"}).save()
+    dataset = Dataset.get()
+    dataset.metadata = {"determining_value": "b"}
+    dataset.save()
+    assert Dataset.get().determining_value == "b"
+
+
+def test_generated_columns_added_to_existing_store(local_db):
+    make_dataset(metadata={"determining_value": POWER}).save()
+    for statement in [
+        "DROP INDEX dataset_kind_determining_value",
+        "DROP INDEX dataset_homepage",
+        "ALTER TABLE dataset DROP COLUMN determining_value",
+        "ALTER TABLE dataset DROP COLUMN homepage",
+    ]:
+        local_db.execute_sql(statement)
+
+    initialize_local_database(local_db)
+    assert Dataset.with_metadata(determining_value=POWER).count() == 1
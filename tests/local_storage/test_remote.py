@@ -0,0 +1,153 @@
+import json
+import re
+import threading
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sentier_data_tools.local_storage.datasource import CATALOG_NAME, ParquetDataSource
+from sentier_data_tools.local_storage.remote import (
+    ChunkCache,
+    RangeFile,
+    RemoteDataSource,
+)
+from sentier_data_tools.local_storage.serialization import serialize
+from tests.local_storage.test_datasource import PRODUCT, make_record
+from tests.local_storage.test_fields import COLUMNS
+
+CHUNK_SIZE = 4096
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serve files with support for single `Range: bytes=start-end` requests, which
+    `SimpleHTTPRequestHandler` ignores. Requests are logged in `server.log`."""
+
+    def send_head(self):
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        self.server.log.append((self.command, self.path, match and match.group(0)))
+        if match is None or self.command != "GET":
+            return super().send_head()
+        path = self.translate_path(self.path)
+        with open(path, "rb") as file:
+            data = file.read()
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(data) - 1), len(data) - 1)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start : end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    directory = tmp_path / "served"
+    directory.mkdir()
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(RangeRequestHandler, directory=str(directory))
+    )
+    server.log = []
+    server.directory = directory
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wide_dataframe(columns: int = 8, rows: int = 10_000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        rng.random((rows, columns)),
+        columns=[f"https://example.com/{i}" for i in range(columns)],
+    )
+
+
+def bytes_fetched(server) -> int:
+    total = 0
+    for _, _, header in server.log:
+        if header:
+            start, end = header.removeprefix("bytes=").split("-")
+            total += int(end) - int(start) + 1
+    return total
+
+
+def test_query_and_load(server, tmp_path):
+    local = ParquetDataSource(server.directory)
+    local.bulk_save([make_record(name="a"), make_record(name="b", product=None)])
+    local.write_catalog()
+
+    source = RemoteDataSource(server.url, tmp_path / "cache", chunk_size=CHUNK_SIZE)
+    assert [record.name for record in source.query(product=PRODUCT)] == ["a"]
+    (record,) = source.query(product=PRODUCT)
+    assert record.dataframe.shape == (2, 2)
+    assert record.dataframe.attrs["sdt"]["columns"]["https://example.com/power"] == (
+        COLUMNS[0]
+    )
+    with pytest.raises(NotImplementedError):
+        source.save(make_record())
+
+
+def test_only_needed_columns_fetched(server, tmp_path):
+    local = ParquetDataSource(server.directory)
+    local.save(make_record(dataframe=wide_dataframe(), columns=[]))
+    local.write_catalog()
+    size = next(server.directory.glob("*.parquet")).stat().st_size
+
+    source = RemoteDataSource(server.url, tmp_path / "cache", chunk_size=CHUNK_SIZE)
+    (record,) = source.query()
+    df = record.read(columns=["https://example.com/3"])
+    assert list(df.columns) == ["https://example.com/3"]
+    assert len(df) == 10_000
+    assert bytes_fetched(server) < size / 4
+
+
+def test_arrow_ipc_files(server, tmp_path):
+    (server.directory / "frame.arrow").write_bytes(serialize(wide_dataframe()))
+    entry = {"file": "frame.arrow"} | make_record().model_dump(
+        mode="json", exclude={"key"}
+    )
+    (server.directory / CATALOG_NAME).write_text(json.dumps([entry]))
+    size = (server.directory / "frame.arrow").stat().st_size
+
+    source = RemoteDataSource(server.url, tmp_path / "cache", chunk_size=CHUNK_SIZE)
+    (record,) = source.query()
+    df = record.read(columns=["https://example.com/0", "https://example.com/7"])
+    assert df.equals(wide_dataframe()[df.columns])
+    assert bytes_fetched(server) < size / 2
+
+
+def test_chunks_cached_on_disk(server, tmp_path):
+    (server.directory / "data.bin").write_bytes(bytes(range(256)) * 100)
+    cache = ChunkCache(tmp_path / "cache")
+
+    file = RangeFile(server.url + "data.bin", cache, chunk_size=1000)
+    file.seek(-10, 2)
+    assert file.read() == bytes(range(246, 256))
+    file.seek(1500)
+    assert file.read(1000) == (bytes(range(256)) * 100)[1500:2500]
+    assert [header for _, _, header in server.log if header] == [
+        "bytes=25000-25599",
+        "bytes=1000-2999",
+    ]
+
+    # Another reader, e.g. in a new process, reads from the cache
+    server.log.clear()
+    file = RangeFile(server.url + "data.bin", cache, chunk_size=1000)
+    file.seek(2000)
+    assert file.read(500) == (bytes(range(256)) * 100)[2000:2500]
+    assert [command for command, _, _ in server.log] == ["HEAD"]
+    assert cache.size() == 2600
+
+    # A changed file gets a new cache token
+    (server.directory / "data.bin").write_bytes(b"x" * 100)
+    file = RangeFile(server.url + "data.bin", cache, chunk_size=1000)
+    assert file.read() == b"x" * 100
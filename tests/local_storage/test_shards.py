@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from sentier_data_tools.local_storage.column_index import datasets_with_column
+from sentier_data_tools.local_storage.db import Dataset
+from sentier_data_tools.local_storage.fields import DatasetKind
+from sentier_data_tools.local_storage.shards import ShardedStore, product_namespace
+from tests.local_storage.test_fields import make_dataset
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ShardedStore(tmp_path / "shards")
+    yield store
+    store.close()
+
+
+def test_datasets_routed_by_kind(store, tmp_path):
+    statistics = store.bulk_save(
+        [
+            make_dataset(name="a"),
+            make_dataset(name="b", kind=DatasetKind.BROAD),
+            make_dataset(name="c", kind=DatasetKind.BROAD),
+        ]
+    )
+    assert {name: obj.count for name, obj in statistics.items()} == {
+        "parameters": 1,
+        "broad": 2,
+    }
+    assert (tmp_path / "shards" / "broad" / "datasets.db").exists()
+    assert store.shards() == ["broad", "parameters"]
+
+    assert sorted(ds.name for ds in store.select()) == ["a", "b", "c"]
+    broad = store.select(Dataset.name == "b", kind=DatasetKind.BROAD)
+    assert [ds.name for ds in broad] == ["b"]
+    # Dataframes are loaded from the dataset's shard
+    assert broad[0].dataframe.shape == (2, 2)
+
+
+def test_save_stays_in_shard(store, local_db):
+    dataset = make_dataset(kind=DatasetKind.BOM)
+    store.save(dataset)
+    dataset.dataframe = pd.DataFrame({"x": [1.0]})
+    dataset.save()
+
+    (stored,) = store.select(kind=DatasetKind.BOM)
+    assert list(stored.dataframe.columns) == ["x"]
+    # The process-wide binding is not changed
+    assert Dataset.select().count() == 0
+
+
+def test_fan_out(store):
+    store.bulk_save([make_dataset(kind=kind) for kind in DatasetKind])
+    results = store.fan_out(lambda: datasets_with_column("https://example.com/power"))
+    assert len(results) == len(DatasetKind)
+    assert sum(ds.read().shape[0] for ds in results) == 2 * len(DatasetKind)
+
+
+def test_datasets_routed_by_product_namespace(tmp_path):
+    store = ShardedStore(tmp_path, partition="product", product_shards=4)
+    assert product_namespace("https://example.com/products/a") == (
+        "https://example.com/products/"
+    )
+    assert store.shard_name(
+        DatasetKind.BOM, "https://example.com/products/a"
+    ) == store.shard_name(DatasetKind.PARAMETERS, "https://example.com/products/b")
+    assert store.shard_name(DatasetKind.BOM) == "no-product"
+
+    store.save(make_dataset(product="https://example.com/products/a"))
+    store.save(make_dataset(product=None))
+    assert len(store.shards()) == 2
+    assert len(store.select(product="https://example.com/products/a")[0].dataframe) == 2
+    store.close()
+
+
+def test_queries_return_connections(tmp_path):
+    store = ShardedStore(tmp_path, max_connections=2)
+    store.bulk_save([make_dataset(kind=kind) for kind in DatasetKind])
+    for _ in range(5):
+        assert len(store.select()) == len(DatasetKind)
+    for name in store.shards():
+        assert not store.database(name)._in_use
+    store.close()
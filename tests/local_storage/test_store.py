@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sentier_data_tools.local_storage.config import StorageMode, storage_options
+from sentier_data_tools.local_storage.db import (
+    STORE_ENVIRONMENT_VARIABLE,
+    STORE_MODELS,
+    Dataset,
+    LocalDatabase,
+    configure_local_database,
+)
+from tests.local_storage.test_fields import make_dataset
+
+
+def test_import_has_no_side_effects(tmp_path):
+    env = os.environ | {"XDG_DATA_HOME": str(tmp_path), "HOME": str(tmp_path)}
+    env.pop(STORE_ENVIRONMENT_VARIABLE, None)
+    subprocess.run(
+        [sys.executable, "-c", "import sentier_data_tools"], env=env, check=True
+    )
+    assert not list(tmp_path.iterdir())
+
+
+def test_store_opened_on_first_use(tmp_path):
+    path = tmp_path / "nested" / "store.db"
+    db = LocalDatabase(path, check_same_thread=False)
+    assert db.deferred and not path.parent.exists()
+    with db.bind_ctx(STORE_MODELS):
+        assert Dataset.select().count() == 0
+        make_dataset().save()
+    assert path.exists()
+    db.close_store()
+
+
+def test_fresh_store_used_from_threads(tmp_path):
+    # Threads must wait until the first one has created the tables
+    for trial in range(10):
+        db = LocalDatabase(tmp_path / f"store-{trial}.db", check_same_thread=False)
+
+        def count(_):
+            with db.connection_context():
+                return Dataset.select().count()
+
+        with db.bind_ctx(STORE_MODELS), ThreadPoolExecutor(max_workers=8) as executor:
+            assert list(executor.map(count, range(8))) == [0] * 8
+        db.close_store()
+
+
+def test_fresh_store_bulk_save(tmp_path):
+    db = LocalDatabase(tmp_path / "store.db", check_same_thread=False)
+    with storage_options(storage_mode=StorageMode.CONTENT_ADDRESSED):
+        with db.bind_ctx(STORE_MODELS):
+            datasets = [make_dataset(name=str(i)) for i in range(20)]
+            assert Dataset.bulk_save(datasets, workers=4).count == 20
+            assert Dataset.select().count() == 20
+    db.close_store()
+
+
+def test_store_location_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv(STORE_ENVIRONMENT_VARIABLE, str(tmp_path / "env.db"))
+    db = LocalDatabase(check_same_thread=False)
+    db.open_store()
+    assert db.database == str(tmp_path / "env.db")
+    db.close_store()
+
+
+def test_in_memory_store():
+    db = LocalDatabase(":memory:", check_same_thread=False)
+    with db.bind_ctx(STORE_MODELS):
+        make_dataset().save()
+
+        def read(_):
+            with db.connection_context():
+                return Dataset.select().get().read().shape
+
+        # Pooled connections from other threads see the same database
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(read, range(2))) == [(2, 2)] * 2
+    assert db.in_memory
+
+    configure_local_database(location=":memory:", db=db)
+    with db.bind_ctx(STORE_MODELS):
+        assert Dataset.select().count() == 0
+    db.close_store()
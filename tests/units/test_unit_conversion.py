@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from sentier_data_tools.unit_conversion import (
+    ConversionTable,
+    UnitMismatchError,
+    normalize_to_canonical_units,
+    unit_aware_operation,
+)
+
+KW = "https://vocab.sentier.dev/units/unit/KiloW"
+MW = "https://vocab.sentier.dev/units/unit/MegaW"
+W = "https://vocab.sentier.dev/units/unit/W"
+
+
+def test_unit_aware_operation_same_unit():
+    result = unit_aware_operation(pd.Series([1.0, 2.0]), KW, pd.Series([3.0, 4.0]), KW)
+    assert result.tolist() == [4.0, 6.0]
+
+
+def test_unit_aware_operation_mismatch():
+    with pytest.raises(UnitMismatchError):
+        unit_aware_operation(pd.Series([1.0]), KW, pd.Series([1.0]), MW)
+    with pytest.raises(UnitMismatchError):
+        unit_aware_operation(pd.Series([1.0]), KW, pd.Series([1.0]), None, convert=True)
+
+
+@patch("sentier_data_tools.unit_conversion.get_conversion_factor", return_value=1000.0)
+def test_unit_aware_operation_convert(mock_factor):
+    result = unit_aware_operation(
+        pd.Series([1.0]), KW, pd.Series([2.0]), MW, convert=True
+    )
+    assert result.tolist() == [2001.0]
+
+
+def test_normalize_to_canonical_units():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": [5, 6], "c": ["x", "y"]})
+    df.attrs["sdt"] = {"columns": {"a": {"unit": MW}, "b": {"unit": KW}, "c": {}}}
+    table = ConversionTable({MW: (W, 1e6), KW: (W, 1e3)})
+    result = normalize_to_canonical_units(df, table)
+    assert result["a"].tolist() == [1e6, 2e6]
+    assert result["b"].tolist() == [5e3, 6e3]
+    assert result["c"].tolist() == ["x", "y"]
+    assert result.attrs["sdt"]["columns"]["a"] == {
+        "unit": W,
+        "original_unit": MW,
+        "conversion_factor": 1e6,
+    }
+    assert df.attrs["sdt"]["columns"]["a"] == {"unit": MW}
+
+
+@patch("sentier_data_tools.unit_conversion.get_canonical_unit", side_effect=KeyError)
+def test_conversion_table_unknown_unit(mock_canonical):
+    table = ConversionTable()
+    assert table["https://www.w3.org/2001/XMLSchema#string"] is None
+    assert table["https://www.w3.org/2001/XMLSchema#string"] is None
+    assert mock_canonical.call_count == 1